@@ -0,0 +1,272 @@
+"""
+Benchmarks for parser and long schema generation on synthetically scaled ARC files.
+
+ARC is scaled by appending renamed copies of its rows (`demog_height` ->
+`x2_demog_height`, ...), so each copy keeps the real mix of types, forms, list
+files, `_units` groups and preset columns. The unit registry is extended with the
+matching renamed entries so that unit fields in the copies resolve.
+
+`generate_parser`, `generate_long_schema` and `toml_writer.dumps` are timed
+separately, then each is run once more under `tracemalloc` to record its peak
+memory. Results are written as JSON, which can be compared between commits:
+
+    python -m benchmarks.bench_generation --output before.json
+    git checkout my-branch
+    python -m benchmarks.bench_generation --output after.json --compare before.json
+
+Must be run from the repository root.
+"""
+
+import argparse
+import copy
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+import pandas as pd
+
+from schemas import toml_writer
+from schemas.draft_parser import build_parser, generate_parser
+from schemas.isaric_schema import generate_long_schema
+from schemas.list_cache import list_cache
+from units.utils import ConversionEntry, ConversionRegistry, default_registry
+
+# Variables which the generators hard-code by name, so can't be copied
+HARD_CODED_FIELDS = ["medi_dose", "medi_units", "medi_units_oth"]
+
+DEFAULT_SCALES = [1, 10, 100]
+
+
+def copy_prefix(copy_number: int) -> str:
+    """Prefix added to variable names in the `copy_number`th copy of ARC (from 2)."""
+    return f"x{copy_number}_"
+
+
+def scale_arc(arc: pd.DataFrame, scale: int) -> pd.DataFrame:
+    """
+    ARC with `scale - 1` renamed copies of its rows appended.
+
+    Example:
+        >>> scale_arc(arc, 3).Variable.tolist()
+        ['subjid', ..., 'x2_subjid', ..., 'x3_subjid', ...]
+    """
+    copyable = arc[~arc.Variable.isin(HARD_CODED_FIELDS)]
+    copies = [arc]
+    for n in range(2, scale + 1):
+        renamed = copyable.copy()
+        renamed["Variable"] = copy_prefix(n) + renamed["Variable"]
+        copies.append(renamed)
+    return pd.concat(copies, ignore_index=True)
+
+
+def scaled_registry_entries(
+    registry: ConversionRegistry, scale: int
+) -> dict[str, ConversionEntry]:
+    """
+    Copies of every entry in `registry` renamed as in `scale_arc`, keyed by the
+    renamed field name.
+    """
+    with open("units/unit_conversion.json", "r") as f:
+        raw_entries = json.load(f)
+
+    entries = {}
+    for n in range(2, scale + 1):
+        prefix = copy_prefix(n)
+        for raw in raw_entries:
+            if raw["field_name"] not in registry.conversion_entries:
+                continue
+            item = copy.deepcopy(raw)
+            item["field_name"] = prefix + item["field_name"]
+            item["units_field_name"] = prefix + item["units_field_name"]
+            for unit in item["units"]:
+                if unit.get("unit_field_name"):
+                    unit["unit_field_name"] = prefix + unit["unit_field_name"]
+            for rule in item["conversion_rules"]:
+                if rule.get("denominator_field_name"):
+                    rule["denominator_field_name"] = (
+                        prefix + rule["denominator_field_name"]
+                    )
+            entries[item["field_name"]] = ConversionEntry.from_dict(item)
+    return entries
+
+
+def time_call(func: Callable[[], Any], repeat: int) -> dict[str, float]:
+    """Wall time of `func` over `repeat` runs, plus its peak memory over one more."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_memory_mb": peak / 2**20,
+    }
+
+
+def run_scale(arc: pd.DataFrame, scale: int, repeat: int, workdir: Path) -> dict:
+    """Benchmark each generation stage on ARC scaled by `scale`."""
+    scaled = scale_arc(arc, scale)
+    arc_path = workdir / f"ARC_x{scale}.csv"
+    scaled.to_csv(arc_path, index=False)
+
+    registry = default_registry()
+    original_entries = registry.conversion_entries
+    registry.conversion_entries = {
+        **original_entries,
+        **scaled_registry_entries(registry, scale),
+    }
+    try:
+        parser = build_parser("bench", scaled)
+        stages = {
+            "generate_parser": time_call(
+                lambda: generate_parser(
+                    "bench",
+                    arc_path=arc_path,
+                    filename=str(workdir / f"parser_x{scale}"),
+                ),
+                repeat,
+            ),
+            "generate_long_schema": time_call(
+                lambda: generate_long_schema(
+                    "bench",
+                    output_path=workdir / f"schema_x{scale}.json",
+                    arc_path=arc_path,
+                ),
+                repeat,
+            ),
+            "toml_writer.dumps": time_call(lambda: toml_writer.dumps(parser), repeat),
+        }
+    finally:
+        registry.conversion_entries = original_entries
+
+    return {
+        "scale": scale,
+        "arc_rows": len(scaled),
+        "long_rules": len(parser["long"]),
+        "parser_bytes": (workdir / f"parser_x{scale}.toml").stat().st_size,
+        "schema_bytes": (workdir / f"schema_x{scale}.json").stat().st_size,
+        "stages": stages,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    scales: list[int] = DEFAULT_SCALES, repeat: int = 3, arc_path: str = "ARC.csv"
+) -> dict:
+    """Run the benchmarks at each of `scales`, returning the results."""
+    arc = pd.read_csv(arc_path)
+    # Parse the list files up front, so the first timed run isn't penalised
+    list_cache.clear()
+    build_parser("bench", arc)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run_scale(arc, scale, repeat, Path(tmp)) for scale in scales]
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict) -> list[str]:
+    """
+    Lines comparing the median time and peak memory of each stage in `current` to
+    those in `baseline`, for scales present in both.
+    """
+    baseline_by_scale = {r["scale"]: r for r in baseline["results"]}
+    lines = []
+    for result in current["results"]:
+        old = baseline_by_scale.get(result["scale"])
+        if old is None:
+            continue
+        for stage, new_stats in result["stages"].items():
+            old_stats = old["stages"].get(stage)
+            if old_stats is None:
+                continue
+            time_ratio = new_stats["median_s"] / old_stats["median_s"]
+            memory_ratio = new_stats["peak_memory_mb"] / old_stats["peak_memory_mb"]
+            lines.append(
+                f"x{result['scale']:<4} {stage:<22} "
+                f"time {time_ratio:5.2f}x  memory {memory_ratio:5.2f}x"
+            )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark parser and schema generation on scaled ARC files."
+    )
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SCALES,
+        help="Multiples of the ARC row count to benchmark (default: 1 10 100)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of timed runs of each stage (default: 3)",
+    )
+    parser.add_argument(
+        "--arc-path",
+        default="ARC.csv",
+        help="Path to the ARC CSV file to scale (default: ARC.csv)",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="File to write the JSON results to (default: stdout)",
+    )
+    parser.add_argument(
+        "--compare",
+        default=None,
+        help="JSON results of a previous run to compare against",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scales, repeat=args.repeat, arc_path=args.arc_path)
+
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        print("\n".join(compare(baseline, results)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Variable-indexed view of the ARC data dictionary, shared by the schema and parser
+generators.
+"""
+
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import pandas as pd
+
+
+class ArcCatalog:
+    """
+    Index of ARC rows keyed by `Variable`.
+
+    Built once from the ARC dataframe, it gives constant-time access to any column
+    of any variable, plus the variables using each list file (in ARC order).
+    This replaces repeated `arc[arc.Variable == var][column].item()` lookups,
+    each of which is a full scan of the ARC frame.
+
+    Example:
+        >>> catalog = ArcCatalog.from_csv("ARC.csv")
+        >>> catalog.get("medi_dose", "Form")
+        'medication'
+        >>> catalog.by_list["demographics_Country"]
+        ['demog_country']
+    """
+
+    def __init__(self, arc: pd.DataFrame):
+        if arc["Variable"].duplicated().any():
+            duplicates = arc.loc[arc["Variable"].duplicated(), "Variable"].tolist()
+            raise ValueError(f"ARC contains duplicate variables: {duplicates}")
+
+        self.frame = arc
+        self.variables: list[str] = arc["Variable"].to_list()
+        self._index = {var: i for i, var in enumerate(self.variables)}
+        self._columns = {col: arc[col].to_list() for col in arc.columns}
+
+        self.by_list: dict[str, list[str]] = (
+            self._group("List") if "List" in arc.columns else {}
+        )
+
+    @classmethod
+    def from_csv(cls, path: str | Path = "ARC.csv") -> "ArcCatalog":
+        return cls(pd.read_csv(path))
+
+    def _group(self, column: str) -> dict[str, list[str]]:
+        groups = {}
+        for var, key in zip(self.variables, self._columns[column]):
+            if pd.isna(key):
+                continue
+            groups.setdefault(key, []).append(var)
+        return groups
+
+    def __len__(self) -> int:
+        return len(self.variables)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.variables)
+
+    def __contains__(self, variable: str) -> bool:
+        return variable in self._index
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self._columns)
+
+    def get(self, variable: str, column: str) -> Any:
+        """Return the value of `column` for `variable`. Raises KeyError if either is unknown."""
+        try:
+            return self._columns[column][self._index[variable]]
+        except KeyError:
+            if variable not in self._index:
+                raise KeyError(f"Variable {variable!r} is not in ARC") from None
+            raise KeyError(f"Column {column!r} is not in ARC") from None
+
+    def row(self, variable: str) -> dict[str, Any]:
+        """Return every column of the ARC row for `variable` as a dictionary."""
+        if variable not in self._index:
+            raise KeyError(f"Variable {variable!r} is not in ARC")
+        i = self._index[variable]
+        return {col: values[i] for col, values in self._columns.items()}
+
+
+class PrefixIndex:
+    """
+    Sorted index of variable names, for finding every variable that starts with a
+    prefix in O(log n) (e.g. the unit-specific fields `demog_height_cm` and
+    `demog_height_in` of `demog_height`).
+
+    Example:
+        >>> index = PrefixIndex(["demog_height", "demog_height_units", "demog_height_cm"])
+        >>> index.with_prefix("demog_height_")
+        ['demog_height_units', 'demog_height_cm']
+    """
+
+    def __init__(self, variables: Iterable[str]):
+        self._order = {var: i for i, var in enumerate(variables)}
+        self._sorted = sorted(self._order)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def with_prefix(self, prefix: str) -> list[str]:
+        """Variables starting with `prefix`, in their original order."""
+        if not prefix:
+            return list(self._order)
+        # Every string starting with `prefix` sorts before `upper`
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        lo = bisect_left(self._sorted, prefix)
+        hi = bisect_left(self._sorted, upper, lo)
+        return sorted(self._sorted[lo:hi], key=self._order.__getitem__)
@@ -0,0 +1,166 @@
+"""
+Builds the long table schema and the parser for an ARC version in one process.
+
+Running `isaric_schema.py` and then `draft_parser.py` reads ARC, the core schema,
+the list files and the unit registry twice. `build_all` loads them once, and
+passes the same ARC frame (as an `ArcCatalog`) and core schema to
+`generate_long_schema` and `generate_parser`. Every list file ARC uses (found with
+`ArcCatalog.by_list`) is read into the process-wide list cache up front, and the
+unit registry is loaded, so both generators use the same copies. Each generator
+still selects the variables of each type from the ARC frame itself. The two
+generators then run in parallel threads.
+
+    python schemas/build.py v1.5.0 --cache-dir .parser-cache
+"""
+
+import argparse
+import json
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from schemas.arc_catalog import ArcCatalog
+from schemas.draft_parser import generate_parser
+from schemas.isaric_schema import generate_long_schema
+from schemas.list_cache import list_cache, list_path
+from units.utils import default_registry
+
+
+def load_inputs(arc_path: str | Path = "ARC.csv") -> tuple[ArcCatalog, dict]:
+    """
+    Load the inputs shared by the generators: the ARC catalog at `arc_path` and
+    the core schema. The unit registry and every list file ARC uses are loaded
+    into their process-wide caches.
+    """
+    catalog = ArcCatalog.from_csv(arc_path)
+    with open("schemas/isaric-core.json", "r") as f:
+        template_core = json.load(f)
+
+    default_registry()
+    for list_name in catalog.by_list:
+        if list_path(list_name, list_cache.root).exists():
+            list_cache.get(list_name)
+    return catalog, template_core
+
+
+def build_all(
+    version: str,
+    arc_path: str | Path = "ARC.csv",
+    schema_path: str | Path | None = None,
+    parser_filename: str | None = None,
+    cache_dir: str | Path | None = None,
+    parallel: bool = True,
+) -> dict[str, float]:
+    """
+    Generates the long schema and the parser for the version of ARC at `arc_path`,
+    loading the inputs once (see `load_inputs`).
+
+    `schema_path` and `parser_filename` default to the paths used by
+    `generate_long_schema` and `generate_parser`, and `cache_dir` is the parser's
+    per-variable rule cache. If `parallel` is True, the schema and parser are
+    generated in two threads, otherwise one after the other.
+
+    Returns the wall time in seconds taken to load the inputs ("load") and
+    generate each output ("schema", "parser").
+    """
+    timings = {}
+    start = time.perf_counter()
+    catalog, template_core = load_inputs(arc_path)
+    timings["load"] = time.perf_counter() - start
+
+    def timed(name, generate, *args, **kwargs):
+        start = time.perf_counter()
+        generate(*args, **kwargs)
+        timings[name] = time.perf_counter() - start
+
+    jobs = [
+        (
+            "schema",
+            generate_long_schema,
+            {
+                "output_path": schema_path,
+                "catalog": catalog,
+                "template_core": template_core,
+            },
+        ),
+        (
+            "parser",
+            generate_parser,
+            {
+                "filename": parser_filename,
+                "cache_dir": cache_dir,
+                "catalog": catalog,
+                "template_core": template_core,
+            },
+        ),
+    ]
+    if parallel:
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = [
+                executor.submit(timed, name, generate, version, **kwargs)
+                for name, generate, kwargs in jobs
+            ]
+            for future in futures:
+                future.result()
+    else:
+        for name, generate, kwargs in jobs:
+            timed(name, generate, version, **kwargs)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate the ISARIC long table schema and ADTL parser from ARC."
+    )
+    parser.add_argument(
+        "tag",
+        nargs="?",
+        help="ARC version tag (default: inferred from git describe --tags)",
+    )
+    parser.add_argument(
+        "--arc-path",
+        default="ARC.csv",
+        help="Path to the ARC CSV file (default: ARC.csv)",
+    )
+    parser.add_argument(
+        "--schema-path",
+        default=None,
+        help="Schema output file (default: schemas/arc_{tag}_isaric_long.schema.json)",
+    )
+    parser.add_argument(
+        "--parser-filename",
+        default=None,
+        help="Parser output filename without extension (default: schemas/global_arc_{tag}_parser)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Directory for the parser's per-variable rule cache",
+    )
+    parser.add_argument(
+        "--serial",
+        action="store_true",
+        help="Generate the schema and then the parser, rather than in parallel threads",
+    )
+    args = parser.parse_args()
+
+    tag = (
+        args.tag
+        or subprocess.check_output(["git", "describe", "--tags"], text=True).strip()
+    )
+    print(f"Running build script with tag: {tag}")
+    timings = build_all(
+        tag,
+        arc_path=args.arc_path,
+        schema_path=args.schema_path,
+        parser_filename=args.parser_filename,
+        cache_dir=args.cache_dir,
+        parallel=not args.serial,
+    )
+    for name, seconds in timings.items():
+        print(f"{name}: {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
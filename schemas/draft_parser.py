@@ -3,24 +3,33 @@ Generate a template parser for transforming ARC data into the ISARIC format.
 """
 
 import argparse
+import dataclasses
 import json
+import re
 import subprocess
-from typing import Any
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, Mapping, Sequence
 
 import pandas as pd
 
 from schemas import toml_writer as tomli_w
-from units.utils import ConversionRegistry
+from schemas.arc_catalog import ArcCatalog, PrefixIndex
+from schemas.list_cache import list_cache
+from schemas.parser_artifact import compile_parser
+from schemas.parser_cache import FragmentCache, fragment_key
+from schemas.profiling import NULL_PROFILER, ProfileCallback, Profiler, write_profile
+from units.utils import default_registry
 from schemas.codes import missing_codes as mc
 
 # Type aliases
 Rule = dict[str, Any]
 RuleList = list[Rule]
-
-# Create a ConversionRegistry instance for looking up unit values
-_unit_registry = ConversionRegistry().load_from_json(
-    "units/unit_conversion.json", "units/unit_conversion.schema.json"
-)
+# ARC rows for the row rule functions: a dataframe, or a mapping of the columns
+# they use to equal-length sequences of values (e.g. one variable, see
+# `variable_rules`)
+ArcRows = pd.DataFrame | Mapping[str, Sequence[Any]]
 
 missing_codes = {code.lower(): code for code in mc}
 missing_codes_multilist = {**missing_codes, "88": "OTH"}
@@ -61,6 +70,8 @@ def read_list_file(
     """
     Read a list file and return the values as a dictionary.
 
+    List files are parsed once and memoized in `schemas.list_cache.list_cache`.
+
     Args:
         list_name: Name of the list in format "category_Name" (e.g., "conditions_Symptoms").
         selected: If True, only include rows where Selected=1.
@@ -69,125 +80,131 @@ def read_list_file(
     Returns:
         Dictionary mapping Value column to the first column's values.
     """
-    file = f"Lists/{'/'.join(list_name.split('_'))}.csv"
-    df = pd.read_csv(file)
-
-    if preset and preset in df.columns:
-        df = df[df[preset] == 1]
-    elif selected:
-        df = df[(df["Selected"] == 1) | (df["Selected"] == "1")]
-
-    value_dict = pd.Series(df.iloc[:, 0].to_list(), index=df["Value"]).to_dict()
-    return {str(k): v.rstrip(" ") for k, v in value_dict.items()}
+    return list_cache.get(list_name).as_dict(selected=selected, preset=preset)
 
 
-def attrs_with_units(arc: pd.DataFrame) -> tuple[RuleList, pd.DataFrame]:
+def unit_groups(arc: pd.DataFrame) -> dict[str, list[str]]:
     """
-    Generate rules for attributes that have associated unit fields.
+    Map each variable with a "_units" field to its unit-specific fields, in ARC order.
 
-    Identifies variables with "_units" suffixes and creates rules
-    that handle unit conversion. Should be called with the full ARC dataframe
-    (i.e. not inside `make_long_row`).
+    Example:
+        demog_height, demog_height_units, demog_height_cm, demog_height_in
+        -> {"demog_height": ["demog_height_cm", "demog_height_in"]}
     """
-    rules = []
     arc_filter = arc["Variable"].str.endswith("_units")
     vars_with_units = arc[arc_filter]["Variable"].str.removesuffix("_units")
-    arc_vars_to_remove = (
-        vars_with_units.copy().to_list() + arc[arc_filter]["Variable"].to_list()
-    )
+    index = PrefixIndex(arc["Variable"])
 
+    groups = {}
     for var in vars_with_units:
-        unit_options = arc[arc["Variable"].str.startswith(var + "_")][
-            "Variable"
-        ].to_list()
-        arc_vars_to_remove += unit_options
+        unit_options = index.with_prefix(var + "_")
         # Remove the unit field itself from the options list
         unit_options.remove(var + "_units")
+        groups[var] = unit_options
+    return groups
 
-        for opt in unit_options:
-            rule = {
-                "attribute": opt,
-                # Have to construct an if rule here as it's dependent on both there being data present,
-                # *and* the unit being correct.
-                "if": {
-                    "all": [
-                        {opt: {"!=": ""}, "can_skip": True},
-                        {var: {"!=": ""}, "can_skip": True},
-                        {
-                            f"{var}_units": _unit_registry.get_unit_value_from_unit_field_name(
-                                var, opt
-                            )
-                        },
-                    ]
+
+def unit_rule(var: str, opt: str, form: str) -> Rule:
+    """
+    Generate the rule for `opt`, a unit-specific field of `var` (e.g. `demog_height_cm`
+    for `demog_height`).
+    """
+    return {
+        "attribute": opt,
+        # Have to construct an if rule here as it's dependent on both there being data present,
+        # *and* the unit being correct.
+        "if": {
+            "all": [
+                {opt: {"!=": ""}, "can_skip": True},
+                {var: {"!=": ""}, "can_skip": True},
+                {
+                    f"{var}_units": default_registry().get_unit_value_from_unit_field_name(
+                        var, opt
+                    )
                 },
-                # Either a the field exists with the unit in the name, or data is present as `name, name_units` columns where
-                # the being entered in this unit-specific column is dependent on the units selected.
-                "value_num": {
-                    "combinedType": "firstNonNull",
-                    "fields": [
-                        {
-                            "field": opt,
-                            "apply": {"function": "values_strip_missing"},
-                            "can_skip": True,
-                        },
-                        {
-                            "field": var,
-                            "apply": {"function": "values_strip_missing"},
-                            "can_skip": True,
-                        },
-                    ],
+            ]
+        },
+        # Either a the field exists with the unit in the name, or data is present as `name, name_units` columns where
+        # the being entered in this unit-specific column is dependent on the units selected.
+        "value_num": {
+            "combinedType": "firstNonNull",
+            "fields": [
+                {
+                    "field": opt,
+                    "apply": {"function": "values_strip_missing"},
+                    "can_skip": True,
                 },
-                "attribute_unit": (
-                    _unit_registry.get_unit_label_from_unit_field_name(var, opt)
-                ),
-                "attribute_status": {
-                    "combinedType": "firstNonNull",
-                    "fields": [
-                        {
-                            "field": opt,
-                            "apply": {"function": "attribute_status_fill"},
-                            "can_skip": True,
-                        },
-                        {
-                            "field": var,
-                            "apply": {"function": "attribute_status_fill"},
-                            "can_skip": True,
-                        },
-                    ],
+                {
+                    "field": var,
+                    "apply": {"function": "values_strip_missing"},
+                    "can_skip": True,
                 },
-                "ref": arc[arc.Variable == var]["Form"].item(),
-            }
+            ],
+        },
+        "attribute_unit": (
+            default_registry().get_unit_label_from_unit_field_name(var, opt)
+        ),
+        "attribute_status": {
+            "combinedType": "firstNonNull",
+            "fields": [
+                {
+                    "field": opt,
+                    "apply": {"function": "attribute_status_fill"},
+                    "can_skip": True,
+                },
+                {
+                    "field": var,
+                    "apply": {"function": "attribute_status_fill"},
+                    "can_skip": True,
+                },
+            ],
+        },
+        "ref": form,
+    }
 
-            rules.append(rule)
 
-    return rules, arc[~arc["Variable"].isin(arc_vars_to_remove)]
+def attrs_with_units(
+    arc: pd.DataFrame, catalog: ArcCatalog | None = None
+) -> tuple[RuleList, pd.DataFrame]:
+    """
+    Generate rules for attributes that have associated unit fields.
 
+    Identifies variables with "_units" suffixes and creates rules
+    that handle unit conversion. Should be called with the full ARC dataframe
+    (i.e. not per ARC type). `catalog` is used to look up each variable's
+    form, and is built from `arc` if not provided.
+    """
+    if catalog is None:
+        catalog = ArcCatalog(arc)
+    rules = []
+    groups = unit_groups(arc)
+    arc_vars_to_remove = list(groups) + [f"{var}_units" for var in groups]
 
-def make_long_row(
-    arc: pd.DataFrame, types: list[str], rule_func: callable, preset: str | None = None
-) -> RuleList:
-    """Filter ARC dataframe by types and apply a rule generation function."""
-    arc_filter = arc["Type"].isin(types)
-    filtered_arc = arc[arc_filter]
-    return rule_func(filtered_arc, preset=preset)
+    for var, unit_options in groups.items():
+        arc_vars_to_remove += unit_options
+
+        for opt in unit_options:
+            rules.append(unit_rule(var, opt, catalog.get(var, "Form")))
+
+    return rules, arc[~arc["Variable"].isin(arc_vars_to_remove)]
 
 
-def attrs_with_enums(arc: pd.DataFrame, preset: str | None = None) -> RuleList:
+def attrs_with_enums(arc: ArcRows, preset: str | None = None) -> RuleList:
     """Generate rules for radio button (enum) fields."""
     rules = []
 
-    for _, row in arc.iterrows():
+    for var, form, options in zip(arc["Variable"], arc["Form"], arc["Answer Options"]):
         rule = {
-            "attribute": row["Variable"],
+            "attribute": var,
             "value": {
-                "field": row["Variable"],
-                "values": get_value_options(row["Answer Options"]),
+                "field": var,
+                "values": get_value_options(options),
             },
             "attribute_status": {
-                "field": row["Variable"],
+                "field": var,
                 "apply": {"function": "attribute_status_fill"},
             },
-            "ref": row["Form"],
+            "ref": form,
         }
 
         rules.append(rule)
@@ -195,35 +212,33 @@ def attrs_with_enums(arc: pd.DataFrame, preset: str | None = None) -> RuleList:
     return rules
 
 
-def attrs_with_checkboxes(arc: pd.DataFrame, preset: str | None = None) -> RuleList:
+def attrs_with_checkboxes(arc: ArcRows, preset: str | None = None) -> RuleList:
     """Generate rules for checkbox fields with multiple selectable options."""
     rules = []
 
-    for _, row in arc.iterrows():
-        options = get_value_options(row["Answer Options"])
-
-        for k, v in options.items():
+    for var, form, options in zip(arc["Variable"], arc["Form"], arc["Answer Options"]):
+        for k, v in get_value_options(options).items():
             rule = {
-                "attribute": row["Variable"],
+                "attribute": var,
                 "value": {
-                    "field": row["Variable"] + f"___{k}",
+                    "field": f"{var}___{k}",
                     "values": {"1": v},
                 },
                 "attribute_status": "VAL",
-                "ref": row["Form"],
+                "ref": form,
             }
 
             rules.append(rule)
 
         for k, v in missing_codes.items():
             rule = {
-                "attribute": row["Variable"],
+                "attribute": var,
                 "attribute_status": {
-                    "field": row["Variable"] + f"___{k}",
+                    "field": f"{var}___{k}",
                     "values": {"1": v},
                 },
-                "if": {row["Variable"] + f"___{k}": 1},
-                "ref": row["Form"],
+                "if": {f"{var}___{k}": 1},
+                "ref": form,
             }
 
             rules.append(rule)
@@ -231,39 +246,39 @@ def attrs_with_checkboxes(arc: pd.DataFrame, preset: str | None = None) -> RuleL
     return rules
 
 
-def attrs_with_lists(arc: pd.DataFrame, preset: str | None = None) -> RuleList:
+def attrs_with_lists(arc: ArcRows, preset: str | None = None) -> RuleList:
     """Generate rules for list-type fields with item selection."""
     rules = []
 
-    for _, row in arc.iterrows():
-        field_base = f"{row['Variable']}_"
+    for var, form, list_name in zip(arc["Variable"], arc["Form"], arc["List"]):
+        field_base = f"{var}_"
         rule = [
             {
-                "attribute": row["Variable"],
+                "attribute": var,
                 "value": {
                     "field": field_base + "{n}item",
-                    "values": read_list_file(row["List"], selected=True),
+                    "values": read_list_file(list_name, selected=True),
                     "can_skip": True,
                 },
                 "attribute_status": {
                     "field": field_base + "{n}item",
                     "apply": {"function": "attribute_status_fill"},
                 },
-                "ref": row["Form"],
+                "ref": form,
                 "for": {"n": {"range": [0, 4]}},
             },
             {
-                "attribute": row["Variable"],
+                "attribute": var,
                 "value": {
                     "field": field_base + "{n}otherl2",
-                    "values": read_list_file(row["List"]),
+                    "values": read_list_file(list_name),
                     "can_skip": True,
                 },
                 "attribute_status": {
                     "field": field_base + "{n}otherl2",
                     "apply": {"function": "attribute_status_fill"},
                 },
-                "ref": row["Form"],
+                "ref": form,
                 "for": {"n": {"range": [0, 4]}},
             },
         ]
@@ -273,49 +288,49 @@ def attrs_with_lists(arc: pd.DataFrame, preset: str | None = None) -> RuleList:
     return rules
 
 
-def attrs_with_userlists(arc: pd.DataFrame, preset: str | None = None) -> RuleList:
+def attrs_with_userlists(arc: ArcRows, preset: str | None = None) -> RuleList:
     """Generate rules for user_list type fields (single-select with other option)."""
     rules = []
 
-    for _, row in arc.iterrows():
+    for var, form, list_name in zip(arc["Variable"], arc["Form"], arc["List"]):
         row_rules = [
             {
-                "attribute": row["Variable"],
+                "attribute": var,
                 "value": {
-                    "field": row["Variable"],
-                    "values": read_list_file(row["List"], selected=True),
+                    "field": var,
+                    "values": read_list_file(list_name, selected=True),
                 },
                 "attribute_status": {
-                    "field": row["Variable"],
+                    "field": var,
                     "apply": {"function": "attribute_status_fill"},
                 },
-                "ref": row["Form"],
+                "ref": form,
             },
             {
-                "attribute": row["Variable"],
+                "attribute": var,
                 "value": {
-                    "field": f"{row['Variable']}_otherl2",
-                    "values": read_list_file(row["List"]),
+                    "field": f"{var}_otherl2",
+                    "values": read_list_file(list_name),
                     "can_skip": True,
                 },
                 "attribute_status": {
-                    "field": f"{row['Variable']}_otherl2",
+                    "field": f"{var}_otherl2",
                     "apply": {"function": "attribute_status_fill"},
                 },
-                "ref": row["Form"],
+                "ref": form,
             },
             {
-                "attribute": row["Variable"],
+                "attribute": var,
                 "value": {
                     # free-text field, no value mapping
-                    "field": f"{row['Variable']}_otherl3",
+                    "field": f"{var}_otherl3",
                     "can_skip": True,
                 },
                 "attribute_status": {
-                    "field": f"{row['Variable']}_otherl3",
+                    "field": f"{var}_otherl3",
                     "apply": {"function": "attribute_status_fill"},
                 },
-                "ref": row["Form"],
+                "ref": form,
             },
         ]
 
@@ -324,22 +339,22 @@ def attrs_with_userlists(arc: pd.DataFrame, preset: str | None = None) -> RuleLi
     return rules
 
 
-def attrs_with_multilists(arc: pd.DataFrame, preset: str | None = None) -> RuleList:
+def attrs_with_multilists(arc: ArcRows, preset: str | None = None) -> RuleList:
     """Generate rules for multi_list type fields (checkbox-style from list)."""
     rules = []
 
-    for _, row in arc.iterrows():
-        values = read_list_file(row["List"], preset=preset, selected=True)
+    for var, form, list_name in zip(arc["Variable"], arc["Form"], arc["List"]):
+        values = read_list_file(list_name, preset=preset, selected=True)
         for i, v in values.items():
             rule = {
-                "attribute": row["Variable"],
+                "attribute": var,
                 "value": {
-                    "field": f"{row['Variable']}___{i}",
+                    "field": f"{var}___{i}",
                     "values": {"1": v},
                     "can_skip": True,
                 },
                 "attribute_status": "VAL",
-                "ref": row["Form"],
+                "ref": form,
             }
 
             rules.append(rule)
@@ -347,13 +362,13 @@ def attrs_with_multilists(arc: pd.DataFrame, preset: str | None = None) -> RuleL
         # add in 'missing' code options
         for k, v in missing_codes.items():
             rule = {
-                "attribute": row["Variable"],
+                "attribute": var,
                 "attribute_status": {
-                    "field": f"{row['Variable']}___{k}",
+                    "field": f"{var}___{k}",
                     "values": {"1": v},
                 },
-                "if": {f"{row['Variable']}___{k}": 1},
-                "ref": row["Form"],
+                "if": {f"{var}___{k}": 1},
+                "ref": form,
             }
 
             rules.append(rule)
@@ -361,33 +376,33 @@ def attrs_with_multilists(arc: pd.DataFrame, preset: str | None = None) -> RuleL
         # if 88, 'other' is selected, more columns are filled as well as the errors...
         # the variable___ syntax is only for the 'top level' fields, the rest are 'variable_otherl2___{n}'
         # Then there's a free-text option as level 3...
-        full_value_set = read_list_file(row["List"])
+        full_value_set = read_list_file(list_name)
         other_rules = [
             {
-                "attribute": row["Variable"],
+                "attribute": var,
                 "value": {
-                    "field": f"{row['Variable']}_otherl2",
+                    "field": f"{var}_otherl2",
                     "values": full_value_set,
                     "can_skip": True,
                 },
                 "attribute_status": {
-                    "field": f"{row['Variable']}_otherl2",
+                    "field": f"{var}_otherl2",
                     "apply": {"function": "attribute_status_fill"},
                 },
-                "ref": row["Form"],
+                "ref": form,
             },
             {
-                "attribute": row["Variable"],
+                "attribute": var,
                 "value": {
                     # free-text field, no value mapping
-                    "field": f"{row['Variable']}_otherl3",
+                    "field": f"{var}_otherl3",
                     "can_skip": True,
                 },
                 "attribute_status": {
-                    "field": f"{row['Variable']}_otherl3",
+                    "field": f"{var}_otherl3",
                     "apply": {"function": "attribute_status_fill"},
                 },
-                "ref": row["Form"],
+                "ref": form,
             },
         ]
 
@@ -396,50 +411,303 @@ def attrs_with_multilists(arc: pd.DataFrame, preset: str | None = None) -> RuleL
     return rules
 
 
-def numeric_attrs(arc: pd.DataFrame, preset: str | None = None) -> RuleList:
+def numeric_attrs(arc: ArcRows, preset: str | None = None) -> RuleList:
     """Generate rules for numeric (number/calc) fields."""
     rules = []
 
-    for _, row in arc.iterrows():
+    for var, form in zip(arc["Variable"], arc["Form"]):
         rule = {
-            "attribute": row["Variable"],
+            "attribute": var,
             "value_num": {
-                "field": row["Variable"],
-                "if": if_all_not_missing(row["Variable"]),
+                "field": var,
+                "if": if_all_not_missing(var),
             },
             "attribute_status": {
-                "field": row["Variable"],
+                "field": var,
                 "apply": {"function": "attribute_status_fill"},
             },
-            "ref": row["Form"],
+            "ref": form,
         }
 
         rules.append(rule)
     return rules
 
 
-def generic_str_attrs(arc: pd.DataFrame, preset: str | None = None) -> RuleList:
+def generic_str_attrs(arc: ArcRows, preset: str | None = None) -> RuleList:
     """Generate rules for string-type fields (date, text, notes, etc.)."""
     rules = []
 
-    for _, row in arc.iterrows():
+    for var, form in zip(arc["Variable"], arc["Form"]):
         rule = {
-            "attribute": row["Variable"],
+            "attribute": var,
             "value": {
-                "field": row["Variable"],
-                "if": if_all_not_missing(row["Variable"]),
+                "field": var,
+                "if": if_all_not_missing(var),
             },
             "attribute_status": {
-                "field": row["Variable"],
+                "field": var,
                 "apply": {"function": "attribute_status_fill"},
             },
-            "ref": row["Form"],
+            "ref": form,
         }
 
         rules.append(rule)
     return rules
 
 
+ROW_RULES = {
+    "enums": attrs_with_enums,
+    "checkboxes": attrs_with_checkboxes,
+    "lists": attrs_with_lists,
+    "user_lists": attrs_with_userlists,
+    "multi_lists": attrs_with_multilists,
+    "numeric": numeric_attrs,
+    "strings": generic_str_attrs,
+}
+
+ROW_TYPES = {
+    "enums": ["radio"],
+    "checkboxes": ["checkbox"],
+    # user_list is single-select, multi_list is ___, list is an entry point where additional single-entry columns have an '_{n}item' suffix.
+    "lists": ["list"],
+    "user_lists": ["user_list"],
+    "multi_lists": ["multi_list"],
+    "numeric": ["number", "calc"],
+    "strings": ["date_dmy", "datetime_dmy", "time", "text", "notes"],
+}
+
+# ARC columns which the long table rules are generated from
+RULE_COLUMNS = ["Variable", "Type", "Form", "Answer Options", "List"]
+
+
+def _fragment_key(
+    var: str, catalog: ArcCatalog, unit_base: str | None, preset: str | None
+) -> str:
+    """Key for the rules of `var` in the fragment cache, see `iter_long_rules`."""
+
+    def row(v):
+        return [catalog.get(v, col) for col in RULE_COLUMNS if col in catalog.columns]
+
+    if unit_base is not None:
+        entry = default_registry().conversion_entries.get(unit_base)
+        return fragment_key(
+            "units",
+            row(unit_base),
+            row(var),
+            dataclasses.asdict(entry) if entry else None,
+        )
+
+    list_name = catalog.get(var, "List") if "List" in catalog.columns else None
+    list_hash = None if pd.isna(list_name) else list_cache.get(list_name).sha256
+    multi_list = catalog.get(var, "Type") == "multi_list"
+    return fragment_key(row(var), list_hash, preset if multi_list else None)
+
+
+def variable_rules(
+    var: str, catalog: ArcCatalog, preset: str | None = None
+) -> RuleList:
+    """
+    Generate the long table rules for a single variable, using the row rule function
+    for its ARC type. Variables of other types (e.g. "dropdown") have no rules.
+    """
+    var_type = catalog.get(var, "Type")
+    for attr_type, types in ROW_TYPES.items():
+        if var_type in types:
+            # A one-row mapping of columns (see `ArcRows`), which is much cheaper
+            # to build than a one-row dataframe
+            row = {
+                col: [catalog.get(var, col)]
+                for col in RULE_COLUMNS
+                if col in catalog.columns
+            }
+            return ROW_RULES[attr_type](row, preset=preset)
+    return []
+
+
+# ARC types whose rules map values with a list file, and the list views they use
+LIST_VALUE_VIEWS = {
+    "list": ["all", "selected"],
+    "user_list": ["all", "selected"],
+    "multi_list": ["all"],
+}
+
+
+def list_value_defs(arc: pd.DataFrame) -> dict[str, dict[str, dict]]:
+    """
+    Definitions for the list file value maps used by more than one long table rule
+    of `arc`, for `adtl.defs`. The full map of a list is named `values_<list>`, and
+    the map of its selected values `values_<list>_selected`, unless every value is
+    selected.
+
+    Example:
+        >>> list_value_defs(arc)["values_conditions_Comorbidities"]
+        {'values': {'1': 'Acute-on-chronic renal failure', ...}}
+    """
+    if "List" not in arc.columns:
+        return {}
+
+    maps: dict[str, dict] = {}
+    uses: dict[str, int] = {}
+    for var_type, list_name in zip(arc["Type"], arc["List"]):
+        if var_type not in LIST_VALUE_VIEWS:
+            continue
+        full_name = f"values_{list_name}"
+        if full_name not in maps:
+            maps[full_name] = read_list_file(list_name)
+            selected = read_list_file(list_name, selected=True)
+            if selected != maps[full_name]:
+                maps[f"{full_name}_selected"] = selected
+        for view in LIST_VALUE_VIEWS[var_type]:
+            name = f"{full_name}_{view}" if view == "selected" else full_name
+            name = name if name in maps else full_name
+            uses[name] = uses.get(name, 0) + 1
+
+    return {
+        name: {"values": maps[name]} for name, n in uses.items() if n > 1 and maps[name]
+    }
+
+
+def share_list_values(
+    rules: RuleList, list_name: str, defs: dict[str, dict[str, dict]]
+) -> RuleList:
+    """
+    Replace the value maps of `rules` which match a definition of `list_name` in
+    `defs` (see `list_value_defs`) with a reference to it, which adtl expands when
+    the parser is loaded. The rules themselves are not modified.
+    """
+    names = [
+        name
+        for name in (f"values_{list_name}", f"values_{list_name}_selected")
+        if name in defs
+    ]
+    shared = []
+    for rule in rules:
+        value = rule.get("value")
+        if isinstance(value, dict) and isinstance(value.get("values"), dict):
+            ref = next((n for n in names if defs[n]["values"] == value["values"]), None)
+            if ref is not None:
+                value = {
+                    ("ref" if k == "values" else k): (ref if k == "values" else v)
+                    for k, v in value.items()
+                }
+                rule = {**rule, "value": value}
+        shared.append(rule)
+    return shared
+
+
+def iter_long_rules(
+    arc_long: pd.DataFrame,
+    catalog: ArcCatalog,
+    preset: str | None = None,
+    cache: FragmentCache | None = None,
+    profiler: Profiler = NULL_PROFILER,
+    value_defs: dict[str, dict[str, dict]] | None = None,
+) -> Iterator[Rule]:
+    """
+    Generate the long table rules variable by variable, in ARC order, so that only
+    one variable's rules need to be held in memory at a time.
+
+    If a fragment `cache` is given, rules are only generated for variables whose
+    ARC row, list file or unit registry entry has changed since they were cached,
+    and the new rules are added to the cache.
+
+    Time spent building rules is recorded in `profiler` under the name of the
+    function which builds them (e.g. `attrs_with_units`, `attrs_with_enums`).
+
+    If `value_defs` is given, list file value maps found there are replaced with
+    references to them (see `share_list_values`).
+    """
+    hard_coded_fields = ["medi_dose", "medi_units", "medi_units_oth"]
+    with profiler.stage("attrs_with_units"):
+        groups = unit_groups(arc_long[~arc_long.Variable.isin(hard_coded_fields)])
+        unit_base = {opt: var for var, opts in groups.items() for opt in opts}
+        unit_vars = set(groups) | {f"{var}_units" for var in groups}
+
+    for var in arc_long["Variable"]:
+        if var == "medi_dose":
+            profiler.count("rules.medi_dose_rule")
+            yield medi_dose_rule(catalog)
+            continue
+        if var in hard_coded_fields or (var in unit_vars and var not in unit_base):
+            continue
+
+        key = None
+        rules = None
+        if cache is not None:
+            with profiler.stage("fragment_cache"):
+                key = _fragment_key(var, catalog, unit_base.get(var), preset)
+                rules = cache.get(key)
+
+        if rules is None:
+            if var in unit_base:
+                base = unit_base[var]
+                builder = "attrs_with_units"
+                with profiler.stage(builder):
+                    rules = [unit_rule(base, var, catalog.get(base, "Form"))]
+            else:
+                builder = _rule_builder_name(catalog.get(var, "Type"))
+                with profiler.stage(builder):
+                    rules = variable_rules(var, catalog, preset=preset)
+            profiler.count(f"rules.{builder}", len(rules))
+            if cache is not None:
+                cache.put(key, rules)
+        else:
+            profiler.count("rules.fragment_cache", len(rules))
+
+        if value_defs and var not in unit_base:
+            list_name = catalog.get(var, "List")
+            if catalog.get(var, "Type") in LIST_VALUE_VIEWS and not pd.isna(list_name):
+                with profiler.stage("shared_values"):
+                    rules = share_list_values(rules, list_name, value_defs)
+
+        yield from rules
+
+
+def _rule_builder_name(var_type: str) -> str:
+    """Name of the row rule function for ARC type `var_type`, for profiling."""
+    for attr_type, types in ROW_TYPES.items():
+        if var_type in types:
+            return ROW_RULES[attr_type].__name__
+    return "unsupported_types"
+
+
+def medi_dose_rule(catalog: ArcCatalog) -> Rule:
+    """
+    Rule for `medi_dose`, hard-coded as its unit (`medi_units`) should behave
+    differently to other '_units' fields.
+    """
+    unit_options = get_value_options(catalog.get("medi_units", "Answer Options"))
+    return {
+        "attribute": "medi_dose",
+        "value_num": {
+            "field": "medi_dose",
+            "if": if_all_not_missing("medi_dose"),
+        },
+        "attribute_unit": {
+            "combinedType": "firstNonNull",
+            "fields": [
+                {
+                    "field": "medi_units_oth",
+                    "if": {
+                        "medi_units": int(
+                            next((k for k, v in unit_options.items() if v == "Other"))
+                        )
+                    },
+                },
+                {
+                    "field": "medi_units",
+                    "values": unit_options,
+                },
+            ],
+        },
+        "attribute_status": {
+            "field": "medi_dose",
+            "apply": {"function": "attribute_status_fill"},
+        },
+        "ref": catalog.get("medi_dose", "Form"),
+    }
+
+
 def form_definitions() -> dict[str, dict[str, Any]]:
     """Return definitions for TOML file, based on the 'Form' names in arc. All should have a
     phase and date field mapping, those which are repeatable forms (e.g. medications)
@@ -557,6 +825,14 @@ def generate_parser(
     arc_path: str = "ARC.csv",
     filename: str | None = None,
     preset: str | None = None,
+    cache_dir: str | Path | None = None,
+    profile: ProfileCallback | None = None,
+    compression: str | None = None,
+    workers: int | None = None,
+    shared_values: bool = False,
+    artifact: bool = False,
+    catalog: ArcCatalog | None = None,
+    template_core: dict | None = None,
 ):
     """
     Generates a generic parser file for use with ADTL based on the current version of ARC,
@@ -575,15 +851,129 @@ def generate_parser(
     Several fields are also marked as "TODO: FILL THIS IN", mostly in the core table.
     These are dataset-specific variables not collected in the current version of ARC,
     so the generated file should be edited to reflect the appropriate mappings for your dataset.
+
+    If `cache_dir` is provided, the rules generated for each variable are cached there,
+    and later runs only regenerate the rules for variables which have changed.
+
+    If `profile` is provided, it is called at the end with a dictionary of the wall
+    time spent in each stage of generation, and counters such as the number of rules
+    built by each stage, list file reads and bytes written (see `Profiler.report`).
+
+    If `compression` is "gzip" or "xz", the parser is compressed, and the filename
+    suffixed with ".gz" or ".xz" (see `parser_path`).
+
+    If `workers` is more than one, the long table rules are rendered in parallel
+    over that many processes (see `toml_writer.dumps`).
+
+    If `shared_values` is True, list file value maps are written once under
+    `adtl.defs` and referenced from the rules (see `build_parser`).
+
+    If `artifact` is True, a binary copy of the parser is also written alongside it,
+    for quicker loading with `parser_artifact.load_parser`.
+
+    An already loaded ARC `catalog` and core schema `template_core` can be given in
+    place of reading them from file, e.g. to share them with `generate_long_schema`.
     """
+    profiler = Profiler() if profile is not None else NULL_PROFILER
+    list_reads, list_hits = list_cache.reads, list_cache.hits
+
+    with profiler.stage("load_arc"):
+        arc = catalog.frame if catalog is not None else pd.read_csv(arc_path)
+        fragment_cache = FragmentCache(cache_dir) if cache_dir is not None else None
+    profiler.count("arc_rows", len(arc))
+
+    parser = build_parser(
+        version,
+        arc,
+        preset=preset,
+        template_core=template_core,
+        fragment_cache=fragment_cache,
+        stream=True,
+        profiler=profiler,
+        shared_values=shared_values,
+        catalog=catalog,
+    )
 
-    arc = pd.read_csv(arc_path)
+    # Generate new long table parser
+    if filename is None:
+        filename = f"schemas/global_arc_{version}_parser"
 
-    if preset is not None:
-        arc = arc[arc[preset] == 1]
+    path = parser_path(filename, compression)
+    with profiler.stage("toml_dump"), open(path, "wb") as f:
+        tomli_w.dump(parser, f, compression=compression, workers=workers)
+
+    if artifact:
+        with profiler.stage("artifact"):
+            compile_parser(path)
+
+    if fragment_cache is not None:
+        with profiler.stage("fragment_cache"):
+            fragment_cache.save()
+        profiler.count("fragment_cache_hits", fragment_cache.hits)
+        profiler.count("fragment_cache_misses", fragment_cache.misses)
+
+    if profile is not None:
+        profiler.count("list_file_reads", list_cache.reads - list_reads)
+        profiler.count("list_cache_hits", list_cache.hits - list_hits)
+        profiler.count("bytes_written", Path(path).stat().st_size)
+        profile(profiler.report())
+
+
+def parser_path(filename: str, compression: str | None = None) -> str:
+    """
+    Path of the parser file written for `filename` (without extension).
+
+    Example:
+        >>> parser_path("schemas/global_arc_v1.5.0_parser", compression="gzip")
+        'schemas/global_arc_v1.5.0_parser.toml.gz'
+    """
+    if compression is None:
+        return f"{filename}.toml"
+    return f"{filename}.toml{tomli_w.COMPRESSION_SUFFIXES[compression]}"
 
-    with open("schemas/isaric-core.json", "r") as f:
-        template_core = json.load(f)
+
+def build_parser(
+    version: str,
+    arc: pd.DataFrame,
+    preset: str | None = None,
+    template_core: dict | None = None,
+    fragment_cache: FragmentCache | None = None,
+    stream: bool = False,
+    profiler: Profiler = NULL_PROFILER,
+    shared_values: bool = False,
+    catalog: ArcCatalog | None = None,
+) -> dict[str, Any]:
+    """
+    Build the parser for `generate_parser` from an already loaded ARC dataframe,
+    returning it as a dictionary.
+
+    Hard-coded fields (e.g. `medi_units`, `demog_age_units`) are looked up in the
+    full ARC, so they are still available when the `preset` does not include them.
+
+    If `fragment_cache` is given, only the long table rules for variables which have
+    changed since they were cached are regenerated.
+
+    If `stream` is True, `parser["long"]` is a generator which builds the long table
+    rules as it is consumed (e.g. by `toml_writer.dump`), rather than a list.
+    The time spent in each stage is recorded in `profiler`.
+
+    If `shared_values` is True, each list file value map used by the long table is
+    written once to `adtl.defs` (see `list_value_defs`), and the rules reference it
+    instead of repeating it. adtl expands the references when loading the parser,
+    so the parser behaves the same, but is smaller and quicker to load.
+
+    `catalog` is the `ArcCatalog` of the full `arc`, if already built.
+    """
+    with profiler.stage("load_arc"):
+        if catalog is None:
+            catalog = ArcCatalog(arc)
+
+        if preset is not None:
+            arc = arc[arc[preset] == 1]
+
+        if template_core is None:
+            with open("schemas/isaric-core.json", "r") as f:
+                template_core = json.load(f)
 
     parser = {
         "adtl": {
@@ -612,107 +1002,68 @@ def generate_parser(
     }
 
     # Build the core table
+    with profiler.stage("core_table"):
+        core_fields = list(template_core["properties"].keys())
 
-    core_fields = list(template_core["properties"].keys())
+        arc_core_vars = arc[arc.Variable.isin(core_fields)]["Variable"].tolist()
 
-    arc_core_vars = arc[arc.Variable.isin(core_fields)]["Variable"].tolist()
-
-    parser["core"] = {
-        k: {
-            "field": k,
-            "if": if_all_not_missing(k),
+        parser["core"] = {
+            k: {
+                "field": k,
+                "if": if_all_not_missing(k),
+            }
+            if k in arc_core_vars
+            else "TODO: FILL THIS IN"
+            for k in core_fields
         }
-        if k in arc_core_vars
-        else "TODO: FILL THIS IN"
-        for k in core_fields
-    }
 
-    for var in arc_core_vars:
-        if opts := get_value_options(arc[arc.Variable == var]["Answer Options"].item()):
-            parser["core"][var]["values"] = opts
-        elif arc[arc.Variable == var]["Type"].item() in ["user_list"]:
-            # Outcome options
-            values = read_list_file(arc[arc.Variable == var]["List"].item())
-            parser["core"][var] = {
-                "combinedType": "firstNonNull",
-                "fields": [
-                    {
-                        "field": f"{var}_otherl3",
-                        "if": {"all": [{var: 88}, {f"{var}_otherl2": 88}]},
-                        "can_skip": True,
-                    },
-                    {
-                        "field": f"{var}_otherl2",
-                        "values": values,
-                        "if": {var: 88},
-                        "can_skip": True,
-                    },
-                    {"field": var, "values": values, "if": if_all_not_missing(var)},
-                ],
-            }
+        for var in arc_core_vars:
+            if opts := get_value_options(catalog.get(var, "Answer Options")):
+                parser["core"][var]["values"] = opts
+            elif catalog.get(var, "Type") in ["user_list"]:
+                # Outcome options
+                values = read_list_file(catalog.get(var, "List"))
+                parser["core"][var] = {
+                    "combinedType": "firstNonNull",
+                    "fields": [
+                        {
+                            "field": f"{var}_otherl3",
+                            "if": {"all": [{var: 88}, {f"{var}_otherl2": 88}]},
+                            "can_skip": True,
+                        },
+                        {
+                            "field": f"{var}_otherl2",
+                            "values": values,
+                            "if": {var: 88},
+                            "can_skip": True,
+                        },
+                        {"field": var, "values": values, "if": if_all_not_missing(var)},
+                    ],
+                }
 
-    # Hard-code demog_age_days as it isn't present in ARC
-    parser["core"]["demog_age_days"] = {
-        "combinedType": "firstNonNull",
-        "fields": [
-            {
-                "field": "demog_calcage_days",
-            },
-            {
-                "field": "demog_age",
-                "unit": "days",
-                "source_unit": {
-                    "field": "demog_age_units",
-                    "values": get_value_options(
-                        arc[arc.Variable == "demog_age_units"]["Answer Options"].item(),
-                        lower_case=True,
-                    ),
+        # Hard-code demog_age_days as it isn't present in ARC
+        parser["core"]["demog_age_days"] = {
+            "combinedType": "firstNonNull",
+            "fields": [
+                {
+                    "field": "demog_calcage_days",
                 },
-            },
-        ],
-    }
-
-    core_fields += ["demog_age", "demog_age_units", "demog_calcage_days"]
-
-    # Hard-code the medi_dose field as it should behave differently to other '_units' fields
-    unit_options = get_value_options(
-        arc[arc.Variable == "medi_units"]["Answer Options"].item()
-    )
-    parser["long"] = [
-        {
-            "attribute": "medi_dose",
-            "value_num": {
-                "field": "medi_dose",
-                "if": if_all_not_missing("medi_dose"),
-            },
-            "attribute_unit": {
-                "combinedType": "firstNonNull",
-                "fields": [
-                    {
-                        "field": "medi_units_oth",
-                        "if": {
-                            "medi_units": int(
-                                next(
-                                    (k for k, v in unit_options.items() if v == "Other")
-                                )
-                            )
-                        },
-                    },
-                    {
-                        "field": "medi_units",
-                        "values": unit_options,
+                {
+                    "field": "demog_age",
+                    "unit": "days",
+                    "source_unit": {
+                        "field": "demog_age_units",
+                        "values": get_value_options(
+                            catalog.get("demog_age_units", "Answer Options"),
+                            lower_case=True,
+                        ),
                     },
-                ],
-            },
-            "attribute_status": {
-                "field": "medi_dose",
-                "apply": {"function": "attribute_status_fill"},
-            },
-            "ref": arc[arc.Variable == "medi_dose"]["Form"].item(),
+                },
+            ],
         }
-    ]
 
-    hard_coded_fields = core_fields + ["medi_dose", "medi_units", "medi_units_oth"]
+        core_fields += ["demog_age", "demog_age_units", "demog_calcage_days"]
+    profiler.count("core_fields", len(parser["core"]))
 
     # setup for long schema
     # Drop the core properties from the long schema
@@ -720,48 +1071,146 @@ def generate_parser(
     arc_long = arc[~arc.Variable.isin(core_fields)]
     arc_long = arc_long[~(arc_long.Type.isin(["descriptive", "file"]))]
 
-    row_rules = {
-        "enums": attrs_with_enums,
-        "checkboxes": attrs_with_checkboxes,
-        "lists": attrs_with_lists,
-        "user_lists": attrs_with_userlists,
-        "multi_lists": attrs_with_multilists,
-        "numeric": numeric_attrs,
-        "strings": generic_str_attrs,
-    }
+    value_defs = None
+    if shared_values:
+        with profiler.stage("shared_values"):
+            value_defs = list_value_defs(arc_long)
+            parser["adtl"]["defs"].update(value_defs)
+        profiler.count("shared_value_defs", len(value_defs))
+
+    parser["long"] = iter_long_rules(
+        arc_long,
+        catalog,
+        preset=preset,
+        cache=fragment_cache,
+        profiler=profiler,
+        value_defs=value_defs,
+    )
+    if not stream:
+        parser["long"] = list(parser["long"])
 
-    row_types = {
-        "enums": ["radio"],
-        "checkboxes": ["checkbox"],
-        # user_list is single-select, multi_list is ___, list is an entry point where additional single-entry columns have an '_{n}item' suffix.
-        "lists": ["list"],
-        "user_lists": ["user_list"],
-        "multi_lists": ["multi_list"],
-        "numeric": ["number", "calc"],
-        "strings": ["date_dmy", "datetime_dmy", "time", "text", "notes"],
-    }
+    return parser
 
-    arc_remaining = arc_long[~arc_long.Variable.isin(hard_coded_fields)]
-    unit_rules, arc_no_units = attrs_with_units(arc_remaining)
-    parser["long"] += unit_rules
 
-    # Iterate through the variable types to construct the long table rules
-    for attr_type in row_rules.keys():
-        rules = make_long_row(
-            arc_no_units, row_types[attr_type], row_rules[attr_type], preset=preset
-        )
-        parser["long"] += rules
+def preset_columns(arc: pd.DataFrame) -> list[str]:
+    """Names of the `preset_*` columns in ARC."""
+    return [col for col in arc.columns if col.startswith("preset_")]
 
-    # Sort the long table to match the ARC file
-    order_index = {k: i for i, k in enumerate(arc_long["Variable"])}
-    parser["long"] = sorted(parser["long"], key=lambda d: order_index[d["attribute"]])
 
-    # Generate new long table parser
-    if filename is None:
-        filename = f"schemas/global_arc_{version}_parser"
+def preset_filename(version: str, preset: str) -> str:
+    """
+    Default output filename (without extension) for the parser of a single preset.
+
+    Example:
+        >>> preset_filename("v1.5.0", "preset_ARChetype Disease CRF_Covid")
+        'global_arc_v1.5.0_archetype_disease_crf_covid_parser'
+    """
+    slug = re.sub(r"[^a-z0-9]+", "_", preset.removeprefix("preset_").lower())
+    return f"global_arc_{version}_{slug.strip('_')}_parser"
+
+
+# Inputs shared by all presets, set once per worker process by `_init_preset_worker`
+_preset_inputs: dict[str, Any] = {}
+
+
+def _init_preset_worker(
+    version: str,
+    arc: pd.DataFrame,
+    template_core: dict,
+    compression: str | None = None,
+    shared_values: bool = False,
+    artifact: bool = False,
+):
+    _preset_inputs.update(
+        version=version,
+        arc=arc,
+        template_core=template_core,
+        compression=compression,
+        shared_values=shared_values,
+        artifact=artifact,
+    )
 
-    with open(f"{filename}.toml", "wb") as f:
-        tomli_w.dump(parser, f)
+
+def _write_preset_parser(preset: str, filename: str) -> tuple[str, float]:
+    start = time.perf_counter()
+    parser = build_parser(
+        _preset_inputs["version"],
+        _preset_inputs["arc"],
+        preset=preset,
+        template_core=_preset_inputs["template_core"],
+        stream=True,
+        shared_values=_preset_inputs["shared_values"],
+    )
+    compression = _preset_inputs["compression"]
+    path = parser_path(filename, compression)
+    with open(path, "wb") as f:
+        tomli_w.dump(parser, f, compression=compression)
+    if _preset_inputs["artifact"]:
+        compile_parser(path)
+    return preset, time.perf_counter() - start
+
+
+def generate_all_presets(
+    version: str,
+    arc_path: str = "ARC.csv",
+    output_dir: str | Path = "schemas",
+    presets: list[str] | None = None,
+    max_workers: int | None = None,
+    compression: str | None = None,
+    shared_values: bool = False,
+    artifact: bool = False,
+) -> dict[str, float]:
+    """
+    Generates one parser per ARC preset (see `generate_parser`), written to
+    `output_dir` with filenames from `preset_filename`.
+
+    ARC, the core template and the list files are loaded once, then the parsers are
+    built and written in parallel over a pool of `max_workers` processes.
+    By default every `preset_*` column in ARC is built.
+    If `compression` is "gzip" or "xz", the parsers are compressed, if
+    `shared_values` is True, list value maps are shared, and if `artifact` is True,
+    binary copies of the parsers are also written (see `generate_parser`).
+
+    Returns the wall time in seconds taken to build and write each preset's parser.
+    """
+    arc = pd.read_csv(arc_path)
+    if presets is None:
+        presets = preset_columns(arc)
+
+    with open("schemas/isaric-core.json", "r") as f:
+        template_core = json.load(f)
+
+    # Warm the list cache so forked workers inherit the parsed list files
+    for list_name in ArcCatalog(arc).by_list:
+        list_cache.get(list_name)
+
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    timings = {}
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_preset_worker,
+        initargs=(
+            version,
+            arc,
+            template_core,
+            compression,
+            shared_values,
+            artifact,
+        ),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _write_preset_parser,
+                preset,
+                str(Path(output_dir, preset_filename(version, preset))),
+            )
+            for preset in presets
+        ]
+        for future in futures:
+            preset, seconds = future.result()
+            timings[preset] = seconds
+
+    return timings
 
 
 def main():
@@ -781,20 +1230,95 @@ def main():
         default=None,
         help="Output filename without extension (default: schemas/global_arc_{tag}_parser)",
     )
-    parser.add_argument(
+    presets = parser.add_mutually_exclusive_group()
+    presets.add_argument(
         "--preset",
         default=None,
         help="Preset name to filter variables (e.g. 'preset_ARChetype Disease CRF_Covid'). Must be an existing header in ARC.",
     )
+    presets.add_argument(
+        "--all-presets",
+        action="store_true",
+        help="Generate one parser per preset column in ARC, in parallel",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="schemas",
+        help="Output directory for --all-presets (default: schemas)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help=(
+            "Number of worker processes, building the presets for --all-presets "
+            "(default: number of CPUs), otherwise rendering the long table "
+            "(default: 1)"
+        ),
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Directory for the per-variable rule cache, to only regenerate rules for changed variables",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=list(tomli_w.COMPRESSION_SUFFIXES),
+        default=None,
+        help="Compress the parser file(s), e.g. for archiving",
+    )
+    parser.add_argument(
+        "--shared-values",
+        action="store_true",
+        help="Write each list value map once under adtl.defs, referenced from the rules",
+    )
+    parser.add_argument(
+        "--artifact",
+        action="store_true",
+        help="Also write a binary copy of the parser(s) (.toml.pkl), which loads faster",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="FILE",
+        help="Write per-stage timings and counters as JSON to FILE (default: stderr)",
+    )
     args = parser.parse_args()
+    if args.profile is not None and args.all_presets:
+        parser.error("--profile can't be used with --all-presets")
 
     tag = (
         args.tag
         or subprocess.check_output(["git", "describe", "--tags"], text=True).strip()
     )
     print(f"Running parser script with tag: {tag}")
+    if args.all_presets:
+        timings = generate_all_presets(
+            tag,
+            arc_path=args.arc_path,
+            output_dir=args.output_dir,
+            max_workers=args.workers,
+            compression=args.compress,
+            shared_values=args.shared_values,
+            artifact=args.artifact,
+        )
+        for preset, seconds in timings.items():
+            print(f"{preset}: {seconds:.2f}s")
+        return
+
     generate_parser(
-        tag, arc_path=args.arc_path, filename=args.filename, preset=args.preset
+        tag,
+        arc_path=args.arc_path,
+        filename=args.filename,
+        preset=args.preset,
+        cache_dir=args.cache_dir,
+        profile=write_profile(args.profile) if args.profile is not None else None,
+        compression=args.compress,
+        workers=args.workers,
+        shared_values=args.shared_values,
+        artifact=args.artifact,
     )
 
 
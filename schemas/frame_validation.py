@@ -0,0 +1,301 @@
+"""
+Vectorized validation of whole long tables, as pandas DataFrames.
+
+Validating a long table row by row with jsonschema is slow for millions of rows.
+`LongFrameValidator` instead applies each rule of the long schema, which
+`isaric_schema.generate_long_schema` builds from the ARC metadata (answer options
+and list files, minimum/maximum, unit registry and date/time types), to all the
+rows for its attributes at once, using pandas and NumPy operations.
+
+Rows are treated as the JSON objects of their non-missing cells, i.e. NaN and
+None mean the key is absent, as when the table is read from CSV. With that, a
+row has violations exactly when jsonschema finds it invalid against the schema.
+"""
+
+import numbers
+import re
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from schemas.isaric_schema import long_schema_validator
+
+VIOLATION_COLUMNS = ["row", "attribute", "field", "check"]
+
+# Keywords which don't affect validation
+ANNOTATIONS = {"$schema", "title", "description"}
+OBJECT_KEYWORDS = {"type", "properties", "required", "additionalProperties"}
+OBJECT_KEYWORDS |= {"if", "then", "else"} | ANNOTATIONS
+VALUE_KEYWORDS = {"type", "enum", "const", "minimum", "maximum", "format", "pattern"}
+VALUE_KEYWORDS |= {"anyOf"} | ANNOTATIONS
+
+DATE_RE = r"(\d{4})-(\d{2})-(\d{2})"
+TIME_RE = r"(\d{2}):(\d{2}):(\d{2})(?:\.\d+)?(?:[Zz]|[+-](\d{2}):(\d{2}))"
+FORMAT_RES = {
+    "date": re.compile(DATE_RE),
+    "date-time": re.compile(DATE_RE + "[Tt]" + TIME_RE),
+    "time": re.compile(TIME_RE),
+}
+
+
+def _json_type(value: Any) -> str:
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, numbers.Number):
+        return "number"
+    return "other"
+
+
+def json_types(values: pd.Series) -> pd.Series:
+    """The JSON Schema type ("string", "number", ...) of each of `values`."""
+    if pd.api.types.is_bool_dtype(values):
+        return pd.Series("boolean", index=values.index)
+    if pd.api.types.is_numeric_dtype(values):
+        return pd.Series("number", index=values.index)
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred == "string":
+        return pd.Series("string", index=values.index)
+    return values.map(_json_type)
+
+
+def _days_in_month(year: np.ndarray, month: np.ndarray) -> np.ndarray:
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    days = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    return days[np.clip(month, 0, 12)] + ((month == 2) & leap)
+
+
+def matches_format(values: pd.Series, format: str) -> pd.Series:
+    """
+    Whether each string in `values` is a valid RFC 3339 "date", "date-time" or
+    "time", as checked by jsonschema's format checker (which needs the
+    rfc3339-validator package for "date-time" and "time").
+    """
+    parts = values.str.extract(f"^{FORMAT_RES[format].pattern}$").astype(float)
+    valid = parts[0].notna()
+    if format in ["date", "date-time"]:
+        year, month, day = (parts[i].fillna(0).astype(int) for i in range(3))
+        valid &= month.between(1, 12) & day.between(1, 31)
+        valid &= day <= _days_in_month(year.to_numpy(), month.to_numpy())
+        parts = parts.iloc[:, 3:].set_axis(range(parts.shape[1] - 3), axis=1)
+    if format in ["date-time", "time"]:
+        valid &= parts[0].le(23) & parts[1].le(59) & parts[2].le(60)
+        valid &= parts[3].isna() | (parts[3].le(23) & parts[4].le(59))
+    return valid
+
+
+class LongFrameValidator:
+    """
+    Validates a DataFrame of long table rows against the long schema.
+
+    Built from the base schema and per-attribute rules of a `LongSchemaValidator`
+    (see `long_frame_validator`). Only the JSON Schema keywords the generated
+    schema uses are supported, and a `ValueError` is raised for any others.
+
+    If `check_formats` is True, "date", "date-time" and "time" formats are also
+    checked (see `matches_format`); like jsonschema, formats are otherwise not
+    checked.
+    """
+
+    def __init__(
+        self,
+        base: dict,
+        rules: list[dict],
+        attributes: dict[str, int],
+        check_formats: bool = False,
+    ):
+        for schema in [base, *rules]:
+            self._check_supported(schema)
+        self.base = base
+        self.rules = rules
+        self.attributes = attributes
+        self.check_formats = check_formats
+
+    @staticmethod
+    def _check_supported(schema: dict):
+        unsupported = set(schema) - OBJECT_KEYWORDS
+        if schema.get("type", "object") != "object":
+            unsupported.add("type")
+        if schema.get("additionalProperties", False) is not False:
+            unsupported.add("additionalProperties")
+        props = list(schema.get("properties", {}).values())
+        while props:
+            prop = props.pop()
+            unsupported |= set(prop) - VALUE_KEYWORDS
+            props += prop.get("anyOf", [])
+        for key in ["if", "then", "else"]:
+            if key in schema:
+                LongFrameValidator._check_supported(schema[key])
+        if unsupported:
+            raise ValueError(
+                f"Unsupported JSON Schema keywords: {', '.join(sorted(unsupported))}"
+            )
+
+    def validate(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Violations in `frame`, one row per failed check, with columns:
+            row: position of the row in `frame`
+            attribute: its attribute
+            field: the column which failed the check (None if the attribute has
+                no rule)
+            check: the JSON Schema keyword which failed, or "attribute" if the
+                attribute has no rule
+        """
+        frame = frame.reset_index(drop=True)
+        violations = [self._object_violations(self.base, frame)]
+
+        if "attribute" in frame.columns:
+            rule_index = frame["attribute"].map(
+                lambda a: self.attributes.get(a) if isinstance(a, str) else None
+            )
+            unknown = frame["attribute"].notna() & rule_index.isna()
+            violations.append(
+                pd.DataFrame(
+                    {"row": frame.index[unknown], "field": None, "check": "attribute"}
+                )
+            )
+            for i, group in frame.groupby(rule_index):
+                violations.append(self._object_violations(self.rules[int(i)], group))
+
+        result = pd.concat(
+            [v for v in violations if len(v)]
+            or [pd.DataFrame(columns=VIOLATION_COLUMNS)],
+            ignore_index=True,
+        )
+        result["row"] = result["row"].astype(int)
+        result["attribute"] = (
+            frame["attribute"].to_numpy()[result["row"]]
+            if "attribute" in frame.columns
+            else None
+        )
+        result = result.sort_values("row", kind="stable", ignore_index=True)
+        return result[VIOLATION_COLUMNS]
+
+    def is_valid(self, frame: pd.DataFrame) -> pd.Series:
+        """Whether each row of `frame` is valid, indexed like `frame`."""
+        invalid = np.zeros(len(frame), dtype=bool)
+        invalid[self.validate(frame)["row"].unique()] = True
+        return pd.Series(~invalid, index=frame.index)
+
+    def _object_violations(self, schema: dict, frame: pd.DataFrame) -> pd.DataFrame:
+        """Violations of the object `schema` by the rows of `frame`."""
+        found = []
+
+        def add(mask: pd.Series, field: str, check: str):
+            if mask.any():
+                found.append(
+                    pd.DataFrame(
+                        {"row": frame.index[mask], "field": field, "check": check}
+                    )
+                )
+
+        properties = schema.get("properties", {})
+        for field in schema.get("required", []):
+            add(~self._present(frame, field), field, "required")
+        if schema.get("additionalProperties", True) is False:
+            for field in frame.columns.difference(list(properties)):
+                add(frame[field].notna(), field, "additionalProperties")
+        for field, prop in properties.items():
+            if field in frame.columns:
+                for check, mask in self._value_violations(prop, frame[field]):
+                    add(mask, field, check)
+
+        if "if" in schema:
+            failed = frame.index.isin(
+                self._object_violations(schema["if"], frame)["row"]
+            )
+            if "then" in schema:
+                found.append(self._object_violations(schema["then"], frame[~failed]))
+            if "else" in schema:
+                found.append(self._object_violations(schema["else"], frame[failed]))
+
+        found = [f for f in found if len(f)]
+        if not found:
+            return pd.DataFrame(columns=["row", "field", "check"])
+        return pd.concat(found, ignore_index=True)
+
+    @staticmethod
+    def _present(frame: pd.DataFrame, field: str) -> pd.Series:
+        if field not in frame.columns:
+            return pd.Series(False, index=frame.index)
+        return frame[field].notna()
+
+    def _value_violations(self, prop: dict, column: pd.Series):
+        """(keyword, mask) for each check in `prop` failed by `column`."""
+        values = column[column.notna()]
+        if values.empty:
+            return
+        types = json_types(values)
+        for check, mask in self._value_failures(prop, values, types):
+            yield check, mask.reindex(column.index, fill_value=False)
+
+    def _value_failures(self, prop: dict, values: pd.Series, types: pd.Series):
+        """(keyword, mask) for each check in `prop` failed by the (present) `values`."""
+        if "type" in prop:
+            allowed = prop["type"] if isinstance(prop["type"], list) else [prop["type"]]
+            valid = types.isin(allowed)
+            if "integer" in allowed:
+                numbers = pd.to_numeric(values[types == "number"])
+                valid |= (numbers % 1 == 0).reindex(values.index, fill_value=False)
+            yield "type", ~valid
+        if "enum" in prop:
+            yield "enum", ~values.isin(prop["enum"])
+        if "const" in prop:
+            yield "const", ~values.isin([prop["const"]])
+        if "minimum" in prop or "maximum" in prop:
+            numbers = pd.to_numeric(values[types == "number"])
+            if "minimum" in prop:
+                yield "minimum", (numbers < prop["minimum"]).reindex(
+                    values.index, fill_value=False
+                )
+            if "maximum" in prop:
+                yield "maximum", (numbers > prop["maximum"]).reindex(
+                    values.index, fill_value=False
+                )
+        if "pattern" in prop:
+            strings = values[types == "string"].astype(str)
+            yield "pattern", (~strings.str.contains(prop["pattern"])).reindex(
+                values.index, fill_value=False
+            )
+        if self.check_formats and prop.get("format") in FORMAT_RES:
+            strings = values[types == "string"].astype(str)
+            yield "format", (~matches_format(strings, prop["format"])).reindex(
+                values.index, fill_value=False
+            )
+        if "anyOf" in prop:
+            failed = pd.Series(True, index=values.index)
+            for branch in prop["anyOf"]:
+                branch_failed = pd.Series(False, index=values.index)
+                for _, mask in self._value_failures(branch, values, types):
+                    branch_failed |= mask
+                failed &= branch_failed
+            yield "anyOf", failed
+
+
+def long_frame_validator(
+    version: str,
+    schema_path: str | Path | None = None,
+    cache_dir: str | Path | None = None,
+    check_formats: bool = False,
+) -> LongFrameValidator:
+    """
+    A `LongFrameValidator` for the long schema of ARC `version` (or at
+    `schema_path`), reusing the checked and cached schema of
+    `isaric_schema.long_schema_validator`.
+
+    Example:
+        >>> validator = long_frame_validator("v1.5.0")
+        >>> validator.validate(pd.read_csv("long.csv"))
+           row        attribute      field    check
+        0   12  demog_height_cm  value_num  maximum
+    """
+    validator = long_schema_validator(version, schema_path, cache_dir)
+    return LongFrameValidator(
+        validator.base.schema,
+        [rule.schema for rule in validator.rules],
+        validator.attributes,
+        check_formats=check_formats,
+    )
@@ -4,19 +4,30 @@ Auto-generates a long schema matching the ISARIC format with the latest ARC vari
 To be run via a github-action when the ARC version is updated.
 """
 
+import argparse
+import hashlib
+import os
 import pandas as pd
 import json
 import numpy as np
+import re
+import tempfile
 from pathlib import Path
-import sys
 import subprocess
+from collections import Counter
+from typing import Any, Iterator
 
-from units.utils import ConversionRegistry
-from schemas.codes import status_codes
+from jsonschema import Draft7Validator, ValidationError
 
-# Create a ConversionRegistry instance for looking up unit values
-_conversion_registry = ConversionRegistry().load_from_json(
-    "units/unit_conversion.json", "units/unit_conversion.schema.json"
+from units.utils import default_registry
+from schemas.arc_catalog import ArcCatalog, PrefixIndex
+from schemas.list_cache import list_cache, list_path
+from schemas.codes import status_codes
+from schemas.profiling import (
+    NULL_PROFILER,
+    ProfileCallback,
+    Profiler,
+    write_profile,
 )
 
 
@@ -89,11 +100,9 @@ def attrs_with_lists(arc, types: list[str]):
             "if": {"properties": {"attribute_status": {"const": "VAL"}}},
             "then": {"required": ["value"]},
         }
-        file_name = (list_file + ".csv").split("_")
-        path = Path(*["Lists"] + file_name)
-        if not path.exists():
+        if not list_path(list_file, list_cache.root).exists():
             raise FileNotFoundError(f"List file {list_file} does not exist.")
-        list_enums = [x.strip() for x in pd.read_csv(path).iloc[:, 0].unique().tolist()]
+        list_enums = list(list_cache.get(list_file).enums)
 
         rule["properties"]["value"] = {"type": "string", "enum": list_enums}
 
@@ -109,11 +118,12 @@ def attrs_with_units(arc):
         vars_with_units.copy().to_list() + arc[arc_filter]["Variable"].to_list()
     )
 
+    index = PrefixIndex(arc["Variable"])
+
     for var in vars_with_units:
-        unit_options = arc[
-            arc["Variable"].str.startswith(var + "_")
-            & ~arc["Variable"].str.endswith("_units")
-        ]["Variable"].to_list()
+        unit_options = [
+            v for v in index.with_prefix(var + "_") if not v.endswith("_units")
+        ]
         arc_vars_to_remove += unit_options
 
         rs = [
@@ -121,7 +131,7 @@ def attrs_with_units(arc):
                 "properties": {
                     "attribute": {"const": unit_var},
                     "attribute_unit": {
-                        "const": _conversion_registry.get_unit_label_from_unit_field_name(
+                        "const": default_registry().get_unit_label_from_unit_field_name(
                             unit_var.rsplit("_", 1)[0], unit_var
                         )
                     },
@@ -232,47 +242,248 @@ def generic_str_attrs(arc, types: list[str]):
     return [rule], arc[~arc_filter]
 
 
-def generate_long_schema(version, output_path: Path = None):
-    arc = pd.read_csv("ARC.csv")
-
-    with open("schemas/isaric-core.json", "r") as f:
-        template_core = json.load(f)
-
-    with open("schemas/template-isaric-long.json", "r") as f:
-        template_long = json.load(f)
+DEFINITIONS_REF = "#/definitions/"
+
+
+def share_enums(rules: list[dict]) -> tuple[list[dict], dict[str, dict]]:
+    """
+    Move each property schema with an `enum` (e.g. the `value` options of a list)
+    which is used by more than one rule to a shared definition, named after the
+    first attribute using it.
+
+    Returns copies of `rules` which `$ref` the shared definitions, and the
+    definitions, to be written under the schema's `definitions`.
+
+    Example:
+        >>> yes_no = {"type": "string", "enum": ["Yes", "No"]}
+        >>> share_enums([
+        ...     {"properties": {"attribute": {"const": "a"}, "value": yes_no}},
+        ...     {"properties": {"attribute": {"const": "b"}, "value": yes_no}},
+        ... ])
+        ([{'properties': {'attribute': {'const': 'a'},
+                          'value': {'$ref': '#/definitions/values_a'}}},
+          {'properties': {'attribute': {'const': 'b'},
+                          'value': {'$ref': '#/definitions/values_a'}}}],
+         {'values_a': {'type': 'string', 'enum': ['Yes', 'No']}})
+    """
+
+    def key(prop: dict) -> str:
+        return json.dumps(prop, sort_keys=True)
+
+    def shareable(rule: dict) -> Iterator[tuple[str, dict]]:
+        for field, prop in rule["properties"].items():
+            if field != "attribute" and "enum" in prop:
+                yield field, prop
+
+    counts = Counter(key(prop) for rule in rules for _, prop in shareable(rule))
+    names: dict[str, str] = {}
+    definitions: dict[str, dict] = {}
+    shared_rules = []
+    for rule in rules:
+        properties = dict(rule["properties"])
+        for field, prop in shareable(rule):
+            prop_key = key(prop)
+            if counts[prop_key] < 2:
+                continue
+            if prop_key not in names:
+                name = rule["properties"]["attribute"]
+                first = name["const"] if "const" in name else name["enum"][0]
+                names[prop_key] = f"{field}s_{first}"
+                definitions[names[prop_key]] = prop
+            properties[field] = {"$ref": DEFINITIONS_REF + names[prop_key]}
+        shared_rules.append({**rule, "properties": properties})
+    return shared_rules, definitions
+
+
+def inline_definitions(schema: Any, definitions: dict[str, dict]) -> Any:
+    """
+    Copy of `schema` with each `$ref` to one of the schema's `definitions` replaced
+    by the definition itself, which is shared rather than copied.
+    """
+    if isinstance(schema, dict):
+        ref = schema.get("$ref")
+        if isinstance(ref, str) and ref.startswith(DEFINITIONS_REF):
+            return definitions[ref.removeprefix(DEFINITIONS_REF)]
+        return {k: inline_definitions(v, definitions) for k, v in schema.items()}
+    if isinstance(schema, list):
+        return [inline_definitions(v, definitions) for v in schema]
+    return schema
+
+
+def attribute_prefix(attribute: str) -> str:
+    """The ARC section of `attribute`, e.g. "demog" for "demog_height"."""
+    return attribute.split("_", 1)[0]
+
+
+def dispatch_on_attribute(rules: list[dict]) -> list[dict]:
+    """
+    Rewrite the `oneOf` rules of the long schema as an equivalent `allOf`, which
+    dispatches each row on its attribute using if/then.
+
+    A `oneOf` validates a row against every rule, collecting the errors from all
+    but one. Instead, the attributes are grouped by ARC section (their prefix,
+    see `attribute_prefix`): a row is only checked against the rules for its
+    section, and the section must be one with rules. Within a section, each
+    `if` only compares the attribute, and its `then` is the rest of the rule,
+    restricted to the attributes of the rule in that section.
+
+    The two are equivalent as each attribute has exactly one rule.
+
+    Example:
+        >>> dispatch_on_attribute([
+        ...     {"properties": {"attribute": {"const": "a_b"}, "value": {"type": "string"}}}
+        ... ])
+        [{'properties': {'attribute': {'pattern': '^(?:a)(?:_|$)'}}},
+         {'if': {'properties': {'attribute': {'pattern': '^a(?:_|$)'}}},
+          'then': {'properties': {'attribute': {'enum': ['a_b']}},
+                   'allOf': [{'if': {'properties': {'attribute': {'const': 'a_b'}}},
+                              'then': {'properties': {'value': {'type': 'string'}}}}]}}]
+    """
+    # Attributes of each rule, by section then rule
+    sections: dict[str, dict[int, list[str]]] = {}
+    counts = Counter()
+    for i, rule in enumerate(rules):
+        name = rule["properties"]["attribute"]
+        attributes = [name["const"]] if "const" in name else name["enum"]
+        counts.update(attributes)
+        for attribute in attributes:
+            sections.setdefault(attribute_prefix(attribute), {}).setdefault(
+                i, []
+            ).append(attribute)
+
+    duplicates = sorted(a for a, n in counts.items() if n > 1)
+    if duplicates:
+        raise ValueError(
+            "Can't dispatch on attribute, as these attributes have more than one "
+            f"rule: {', '.join(repr(a) for a in duplicates)}"
+        )
 
-    # Drop the core properties from the long schema,
-    # plus the 'demog_age' variables which map to `demog_age_days``
-    arc_long = arc[
-        ~arc.Variable.isin(
-            list(template_core["properties"].keys()) + ["demog_age", "demog_age_units"]
+    def then(rule: dict) -> dict:
+        properties = {k: v for k, v in rule["properties"].items() if k != "attribute"}
+        then = {"properties": properties} if properties else {}
+        then.update((k, v) for k, v in rule.items() if k != "properties")
+        return then
+
+    prefixes = "|".join(re.escape(prefix) for prefix in sections)
+    dispatched = [{"properties": {"attribute": {"pattern": f"^(?:{prefixes})(?:_|$)"}}}]
+    for prefix, section_rules in sections.items():
+        checks = []
+        for i, attributes in section_rules.items():
+            name = (
+                {"const": attributes[0]}
+                if len(attributes) == 1
+                else {"enum": attributes}
+            )
+            checks.append(
+                {"if": {"properties": {"attribute": name}}, "then": then(rules[i])}
+            )
+        section_attributes = [a for names in section_rules.values() for a in names]
+        dispatched.append(
+            {
+                "if": {
+                    "properties": {
+                        "attribute": {"pattern": f"^{re.escape(prefix)}(?:_|$)"}
+                    }
+                },
+                "then": {
+                    "properties": {"attribute": {"enum": section_attributes}},
+                    "allOf": checks,
+                },
+            }
         )
-    ]
-    # Don't include descriptive, file types or NaN's (unwanted as stored attributes)
-    arc_long = arc_long[~(arc_long.Type.isin(["descriptive", "file", np.nan]))]
+    return dispatched
+
+
+def generate_long_schema(
+    version,
+    output_path: Path = None,
+    arc_path: str | Path = "ARC.csv",
+    profile: ProfileCallback | None = None,
+    dispatch: bool = False,
+    catalog: ArcCatalog | None = None,
+    template_core: dict | None = None,
+    shared_enums: bool = False,
+    compact: bool = False,
+):
+    """
+    Generates the long table schema for the version of ARC at `arc_path`.
+
+    An already loaded ARC `catalog` and core schema `template_core` can be given in
+    place of reading them from file, e.g. to share them with `generate_parser`.
+
+    By default each rule is a branch of a top-level `oneOf`. If `dispatch` is True,
+    the rules are instead written as an `allOf` of if/then blocks keyed on the
+    attribute (see `dispatch_on_attribute`), which accepts the same rows but is
+    much quicker to validate against.
+
+    If `shared_enums` is True, enums used by several rules (e.g. the same answer
+    options) are written once under `definitions`, and referenced from the rules
+    (see `share_enums`). If `compact` is True, the schema is written without
+    indentation or spaces.
+
+    If `profile` is provided, it is called at the end with a dictionary of the wall
+    time spent in each stage of generation, and counters such as the number of rules
+    built by each stage, list file reads and bytes written (see `Profiler.report`).
+    """
+    profiler = Profiler() if profile is not None else NULL_PROFILER
+    list_reads, list_hits = list_cache.reads, list_cache.hits
+
+    with profiler.stage("load_arc"):
+        if catalog is None:
+            catalog = ArcCatalog.from_csv(arc_path)
+        arc = catalog.frame
+
+        if template_core is None:
+            with open("schemas/isaric-core.json", "r") as f:
+                template_core = json.load(f)
+
+        with open("schemas/template-isaric-long.json", "r") as f:
+            template_long = json.load(f)
+
+        # Drop the core properties from the long schema,
+        # plus the 'demog_age' variables which map to `demog_age_days``
+        arc_long = arc[
+            ~arc.Variable.isin(
+                list(template_core["properties"].keys())
+                + ["demog_age", "demog_age_units"]
+            )
+        ]
+        # Don't include descriptive, file types or NaN's (unwanted as stored attributes)
+        arc_long = arc_long[~(arc_long.Type.isin(["descriptive", "file", np.nan]))]
+    profiler.count("arc_rows", len(arc))
+
+    def build(rule_function, arc, *args):
+        with profiler.stage(rule_function.__name__):
+            rules, arc_remaining = rule_function(arc, *args)
+        profiler.count(f"rules.{rule_function.__name__}", len(rules))
+        return rules, arc_remaining
 
     # medications dosage, which has units field that behaves differently
-    medi_unit_rule, arc_long_med_unit = medications_dosage(arc_long)
+    medi_unit_rule, arc_long_med_unit = build(medications_dosage, arc_long)
 
     # Generate rules for each type of attribute
-    units_rules, arc_long_no_units = attrs_with_units(arc_long_med_unit)
+    units_rules, arc_long_no_units = build(attrs_with_units, arc_long_med_unit)
 
-    enum_rules, arc_no_enums = attrs_with_enums(
-        arc_long_no_units, ["radio", "checkbox"]
+    enum_rules, arc_no_enums = build(
+        attrs_with_enums, arc_long_no_units, ["radio", "checkbox"]
     )
 
-    list_rules, arc_no_lists = attrs_with_lists(
-        arc_no_enums, ["list", "user_list", "multi_list"]
+    list_rules, arc_no_lists = build(
+        attrs_with_lists, arc_no_enums, ["list", "user_list", "multi_list"]
     )
 
-    numeric_rules, arc_no_numbers = numeric_attrs(arc_no_lists, ["number", "calc"])
+    numeric_rules, arc_no_numbers = build(
+        numeric_attrs, arc_no_lists, ["number", "calc"]
+    )
 
-    date_rules, arc_no_dates = date_attrs(arc_no_numbers, ["date_dmy", "datetime_dmy"])
+    date_rules, arc_no_dates = build(
+        date_attrs, arc_no_numbers, ["date_dmy", "datetime_dmy"]
+    )
 
-    time_rules, arc_no_times = time_attrs(arc_no_dates, ["time"])
+    time_rules, arc_no_times = build(time_attrs, arc_no_dates, ["time"])
 
-    other_str_rules, arc_no_other_str = generic_str_attrs(
-        arc_no_times, ["text", "notes"]
+    other_str_rules, arc_no_other_str = build(
+        generic_str_attrs, arc_no_times, ["text", "notes"]
     )
 
     # Combine all rules into one list
@@ -297,7 +508,18 @@ def generate_long_schema(version, output_path: Path = None):
             " need to be added to the schema generation script.",
         )
 
-    template_long["oneOf"] = one_of_rules
+    if shared_enums:
+        with profiler.stage("share_enums"):
+            one_of_rules, definitions = share_enums(one_of_rules)
+        template_long["definitions"] = definitions
+        profiler.count("shared_enums", len(definitions))
+
+    if dispatch:
+        with profiler.stage("dispatch_on_attribute"):
+            del template_long["oneOf"]
+            template_long["allOf"] = dispatch_on_attribute(one_of_rules)
+    else:
+        template_long["oneOf"] = one_of_rules
 
     # Make sure the attribute_status enum is up to date with the codes in `schemas/codes.py`
     template_long["properties"]["attribute_status"]["enum"] = status_codes
@@ -305,17 +527,228 @@ def generate_long_schema(version, output_path: Path = None):
     # Generate new long schema
     if output_path is None:
         output_path = Path(f"schemas/arc_{version}_isaric_long.schema.json")
-    with open(output_path, "w") as f:
-        json.dump(template_long, f, indent=4)
+    with profiler.stage("json_dump"), open(output_path, "w") as f:
+        if compact:
+            json.dump(template_long, f, separators=(",", ":"))
+        else:
+            json.dump(template_long, f, indent=4)
 
+    if profile is not None:
+        profiler.count("list_file_reads", list_cache.reads - list_reads)
+        profiler.count("list_cache_hits", list_cache.hits - list_hits)
+        profiler.count("bytes_written", Path(output_path).stat().st_size)
+        profile(profiler.report())
 
-def main():
-    if len(sys.argv) > 1:
-        tag = sys.argv[1]
+
+VALIDATOR_CACHE_FORMAT = 1
+
+
+def attribute_rules(schema: dict) -> tuple[dict, list[dict], dict[str, int]]:
+    """
+    Split the long `schema` into the schema every row must match, the schema of
+    each rule, and the index of the rule for each attribute.
+
+    Works with both the `oneOf` schema and the attribute-dispatched schema (see
+    `dispatch_on_attribute`). References to shared `definitions` (see
+    `share_enums`) are inlined, so each rule can be used on its own.
+    """
+    definitions = schema.get("definitions", {})
+    schema = inline_definitions(schema, definitions)
+    base = {
+        k: v for k, v in schema.items() if k not in ["oneOf", "allOf", "definitions"]
+    }
+    if "oneOf" in schema:
+        named_rules = [
+            (rule["properties"]["attribute"], rule) for rule in schema["oneOf"]
+        ]
     else:
-        tag = subprocess.check_output(["git", "describe", "--tags"], text=True).strip()
+        named_rules = [
+            (check["if"]["properties"]["attribute"], check["then"])
+            for section in schema["allOf"]
+            if "if" in section
+            for check in section["then"]["allOf"]
+        ]
+
+    rules = []
+    attributes = {}
+    for name, rule in named_rules:
+        for attribute in [name["const"]] if "const" in name else name["enum"]:
+            if attribute in attributes:
+                raise ValueError(f"Attribute {attribute!r} has more than one rule")
+            attributes[attribute] = len(rules)
+        rules.append(rule)
+    return base, rules, attributes
+
+
+class LongSchemaValidator:
+    """
+    Validates rows of the long table against the long schema, only checking each
+    row against the rule for its attribute.
+
+    This accepts the same rows as a `jsonschema.Draft7Validator` for the whole
+    schema, as each attribute has exactly one rule. Use `long_schema_validator`
+    to create one for an ARC version.
+
+    Example:
+        >>> validator = long_schema_validator("v1.5.0")
+        >>> validator.is_valid({"subjid": "1", "attribute": "demog_height_cm", ...})
+        True
+    """
+
+    def __init__(self, base: dict, rules: list[dict], attributes: dict[str, int]):
+        self.base = Draft7Validator(base)
+        self.rules = [Draft7Validator(rule) for rule in rules]
+        self.attributes = attributes
+
+    def _rule(self, row: dict[str, Any]) -> Draft7Validator | None:
+        attribute = row.get("attribute") if isinstance(row, dict) else None
+        if not isinstance(attribute, str):
+            return None
+        index = self.attributes.get(attribute)
+        return self.rules[index] if index is not None else None
+
+    def is_valid(self, row: dict[str, Any]) -> bool:
+        rule = self._rule(row)
+        return rule is not None and self.base.is_valid(row) and rule.is_valid(row)
+
+    def iter_errors(self, row: dict[str, Any]) -> Iterator[ValidationError]:
+        """Errors in `row`, from the shared properties and then its attribute's rule."""
+        yield from self.base.iter_errors(row)
+        rule = self._rule(row)
+        if rule is not None:
+            yield from rule.iter_errors(row)
+        elif isinstance(row, dict) and "attribute" in row:
+            yield ValidationError(
+                f"{row['attribute']!r} is not an attribute in the long schema",
+                validator="attribute",
+                path=["attribute"],
+            )
+
+    def validate(self, row: dict[str, Any]):
+        """Raise the first `jsonschema.ValidationError` in `row`, if any."""
+        for error in self.iter_errors(row):
+            raise error
+
+
+# Validators already built in this process, by schema hash
+_validators: dict[str, LongSchemaValidator] = {}
+
+
+def long_schema_validator(
+    version: str,
+    schema_path: str | Path | None = None,
+    cache_dir: str | Path | None = None,
+) -> LongSchemaValidator:
+    """
+    A `LongSchemaValidator` for the long schema of ARC `version` (or at
+    `schema_path`).
+
+    The schema is checked against the JSON Schema meta-schema and split into
+    per-attribute rules once. The result is kept for the rest of the process and,
+    if `cache_dir` is given, saved there keyed by the SHA-256 of the schema file,
+    so later runs with the same schema skip both steps.
+    """
+    if schema_path is None:
+        schema_path = Path(f"schemas/arc_{version}_isaric_long.schema.json")
+    data = Path(schema_path).read_bytes()
+    sha256 = hashlib.sha256(data).hexdigest()
+    if sha256 in _validators:
+        return _validators[sha256]
+
+    cache_path = (
+        Path(cache_dir) / f"long_schema_{sha256}.json"
+        if cache_dir is not None
+        else None
+    )
+    compiled = None
+    if cache_path is not None:
+        try:
+            with open(cache_path, "r") as f:
+                compiled = json.load(f)
+        except (OSError, ValueError):
+            pass
+    if compiled is None or compiled.get("format") != VALIDATOR_CACHE_FORMAT:
+        schema = json.loads(data)
+        Draft7Validator.check_schema(schema)
+        base, rules, attributes = attribute_rules(schema)
+        compiled = {
+            "format": VALIDATOR_CACHE_FORMAT,
+            "base": base,
+            "rules": rules,
+            "attributes": attributes,
+        }
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=cache_path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(compiled, f)
+            os.replace(tmp, cache_path)
+
+    validator = LongSchemaValidator(
+        compiled["base"], compiled["rules"], compiled["attributes"]
+    )
+    _validators[sha256] = validator
+    return validator
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate the ISARIC long table schema from ARC."
+    )
+    parser.add_argument(
+        "tag",
+        nargs="?",
+        help="ARC version tag (default: inferred from git describe --tags)",
+    )
+    parser.add_argument(
+        "--arc-path",
+        default="ARC.csv",
+        help="Path to the ARC CSV file (default: ARC.csv)",
+    )
+    parser.add_argument(
+        "--output-path",
+        default=None,
+        help="Output file (default: schemas/arc_{tag}_isaric_long.schema.json)",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="FILE",
+        help="Write per-stage timings and counters as JSON to FILE (default: stderr)",
+    )
+    parser.add_argument(
+        "--dispatch",
+        action="store_true",
+        help="Dispatch on the attribute with if/then rules, rather than a oneOf",
+    )
+    parser.add_argument(
+        "--shared-enums",
+        action="store_true",
+        help="Write enums used by several rules once under definitions, referenced from the rules",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Write the schema without indentation",
+    )
+    args = parser.parse_args()
+
+    tag = (
+        args.tag
+        or subprocess.check_output(["git", "describe", "--tags"], text=True).strip()
+    )
     print(f"Running schema script with tag: {tag}")
-    generate_long_schema(tag)
+    generate_long_schema(
+        tag,
+        output_path=args.output_path,
+        arc_path=args.arc_path,
+        profile=write_profile(args.profile) if args.profile is not None else None,
+        dispatch=args.dispatch,
+        shared_enums=args.shared_enums,
+        compact=args.compact,
+    )
 
 
 if __name__ == "__main__":
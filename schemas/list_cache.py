@@ -0,0 +1,149 @@
+"""
+Shared, memoized reader for the ARC `Lists/*.csv` files.
+
+Each list file is parsed once into a `ListTable`, a compact columnar copy of the
+columns the generators use, with the `selected` and `preset_*` views precomputed
+as row-index slices. Tables are held in a least-recently-used cache and re-read
+if the file changes on disk.
+"""
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+Pairs = tuple[tuple[str, str], ...]
+
+
+def list_path(list_name: str, root: str | Path = "Lists") -> Path:
+    """
+    Path of the CSV file for `list_name`.
+
+    Example:
+        >>> list_path("conditions_Symptoms")
+        PosixPath('Lists/conditions/Symptoms.csv')
+    """
+    return Path(root, *f"{list_name}.csv".split("_"))
+
+
+@dataclass(frozen=True)
+class ListTable:
+    """Columnar contents of a single list file."""
+
+    keys: tuple[str, ...]
+    labels: tuple[str, ...]
+    selected: tuple[int, ...]
+    presets: dict[str, tuple[int, ...]]
+    enums: tuple[str, ...]
+    sha256: str
+    _views: dict[tuple[bool, str | None], Pairs] = field(
+        default_factory=dict, repr=False, compare=False
+    )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ListTable":
+        df = pd.read_csv(io.BytesIO(data))
+        selected = (df["Selected"] == 1) | (df["Selected"] == "1")
+        presets = {col: tuple(df.index[df[col] == 1]) for col in df.columns}
+        first_column = df.iloc[:, 0]
+        return cls(
+            keys=tuple(str(k) for k in df["Value"].to_list()),
+            labels=tuple(v.rstrip(" ") for v in first_column.to_list()),
+            selected=tuple(df.index[selected]),
+            presets=presets,
+            enums=tuple(x.strip() for x in first_column.unique().tolist()),
+            sha256=hashlib.sha256(data).hexdigest(),
+        )
+
+    def rows(self, selected: bool = False, preset: str | None = None) -> Pairs:
+        """
+        (Value, label) pairs for the requested view, following the same precedence
+        as `draft_parser.read_list_file`: `preset` (if it is a column of the file),
+        then `selected`, then every row.
+        """
+        if preset is not None and preset in self.presets:
+            view = (False, preset)
+            index = self.presets[preset]
+        elif selected:
+            view = (True, None)
+            index = self.selected
+        else:
+            view = (False, None)
+            index = range(len(self.keys))
+
+        if view not in self._views:
+            self._views[view] = tuple((self.keys[i], self.labels[i]) for i in index)
+        return self._views[view]
+
+    def as_dict(self, selected: bool = False, preset: str | None = None) -> dict:
+        """A new `{Value: label}` dictionary for the requested view."""
+        return dict(self.rows(selected=selected, preset=preset))
+
+
+class ListCache:
+    """
+    Least-recently-used cache of `ListTable`s, keyed by list name.
+
+    A cached table is only reused while the file's modification time and size are
+    unchanged; if those differ but the content hash matches, the table is kept.
+    The cache can be shared between threads.
+    """
+
+    def __init__(self, root: str | Path = "Lists", maxsize: int = 32):
+        self.root = Path(root)
+        self.maxsize = maxsize
+        self._tables: OrderedDict[str, tuple[tuple[int, int], ListTable]] = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.reads = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def __contains__(self, list_name: str) -> bool:
+        return list_name in self._tables
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+            self.hits = 0
+            self.reads = 0
+
+    def get(self, list_name: str) -> ListTable:
+        with self._lock:
+            return self._get(list_name)
+
+    def _get(self, list_name: str) -> ListTable:
+        path = list_path(list_name, self.root)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        cached = self._tables.get(list_name)
+        if cached is not None and cached[0] == signature:
+            self._tables.move_to_end(list_name)
+            self.hits += 1
+            return cached[1]
+
+        data = path.read_bytes()
+        self.reads += 1
+        if cached is not None and cached[1].sha256 == hashlib.sha256(data).hexdigest():
+            table = cached[1]
+        else:
+            table = ListTable.from_bytes(data)
+
+        self._tables[list_name] = (signature, table)
+        self._tables.move_to_end(list_name)
+        while len(self._tables) > self.maxsize:
+            self._tables.popitem(last=False)
+        return table
+
+
+# Process-wide cache used by the parser and schema generators
+list_cache = ListCache()
@@ -0,0 +1,120 @@
+"""
+Precompiled binary copies of generated parser files.
+
+Loading a generated parser means parsing hundreds of kilobytes of TOML, which
+is slow when many worker processes each load it. `compile_parser` writes the
+parsed rule tree next to the TOML as a pickle (`<parser>.toml.pkl`). Strings are
+interned first, so each repeated string (field names, functions, value labels)
+is stored and loaded once. `load_parser` uses the pickle only if it was compiled
+from the current TOML file, checked by SHA-256, and otherwise parses the TOML.
+
+The pickle holds exactly what `tomllib` returns for the TOML, so it can be used
+in its place. As with any pickle, only load artifacts from trusted sources.
+"""
+
+import gzip
+import hashlib
+import lzma
+import os
+import pickle
+import sys
+import tempfile
+import tomllib
+from pathlib import Path
+from typing import Any
+
+ARTIFACT_FORMAT = 1
+ARTIFACT_SUFFIX = ".pkl"
+
+# Decompressors for the compressed parser suffixes written by `toml_writer.dump`
+DECOMPRESSORS = {".gz": gzip.decompress, ".xz": lzma.decompress}
+
+
+def artifact_path(toml_path: str | Path) -> Path:
+    """
+    Default path of the artifact compiled from `toml_path`.
+
+    Example:
+        >>> artifact_path("schemas/global_arc_v1.5.0_parser.toml")
+        PosixPath('schemas/global_arc_v1.5.0_parser.toml.pkl')
+    """
+    toml_path = Path(toml_path)
+    return toml_path.with_name(toml_path.name + ARTIFACT_SUFFIX)
+
+
+def intern_strings(obj: Any) -> Any:
+    """Copy of the parsed TOML `obj`, with every key and string value interned."""
+    if isinstance(obj, str):
+        return sys.intern(obj)
+    if isinstance(obj, dict):
+        return {sys.intern(k): intern_strings(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [intern_strings(v) for v in obj]
+    return obj
+
+
+def _parse_toml(path: Path, data: bytes) -> dict[str, Any]:
+    decompress = DECOMPRESSORS.get(path.suffix)
+    if decompress is not None:
+        data = decompress(data)
+    return tomllib.loads(data.decode())
+
+
+def compile_parser(toml_path: str | Path, path: str | Path | None = None) -> Path:
+    """
+    Compile the parser file `toml_path` (optionally ".gz" or ".xz" compressed) to a
+    binary artifact at `path` (default: `artifact_path(toml_path)`), returning
+    the artifact path.
+
+    The artifact is two pickles: a header with the format version and the SHA-256
+    of the TOML file, then the parser itself, so `load_parser` can check the
+    header without unpickling the rules.
+    """
+    toml_path = Path(toml_path)
+    path = Path(path) if path is not None else artifact_path(toml_path)
+
+    data = toml_path.read_bytes()
+    header = {
+        "format": ARTIFACT_FORMAT,
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+    parser = intern_strings(_parse_toml(toml_path, data))
+
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(parser, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    return path
+
+
+def load_parser(
+    toml_path: str | Path, path: str | Path | None = None
+) -> dict[str, Any]:
+    """
+    Load the parser file `toml_path`, as from `tomllib.load`.
+
+    The artifact at `path` (default: `artifact_path(toml_path)`) is used if it
+    exists, is of the current format, and was compiled from the current contents
+    of `toml_path`; otherwise the TOML is parsed.
+
+    Example:
+        >>> parser = load_parser("schemas/global_arc_v1.5.0_parser.toml")
+        >>> parser["adtl"]["name"]
+        'ARC-isaric'
+    """
+    toml_path = Path(toml_path)
+    path = Path(path) if path is not None else artifact_path(toml_path)
+
+    data = toml_path.read_bytes()
+    try:
+        with open(path, "rb") as f:
+            header = pickle.load(f)
+            if header == {
+                "format": ARTIFACT_FORMAT,
+                "sha256": hashlib.sha256(data).hexdigest(),
+            }:
+                return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+    return _parse_toml(toml_path, data)
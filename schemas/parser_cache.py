@@ -0,0 +1,115 @@
+"""
+On-disk cache of generated parser rules, stored per ARC variable.
+
+Each variable's rules (its "fragment") are keyed by a hash of everything they are
+generated from: the variable's ARC row(s), the list file and unit registry entry it
+uses, and the generator code itself. When regenerating a parser, only variables
+whose key is not in the cache need their rules rebuilding.
+
+Each fragment is written to its own file as soon as it is generated, so fragments
+are never all held in memory at once.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any
+
+Rule = dict[str, Any]
+RuleList = list[Rule]
+
+CACHE_DIRNAME = "parser_fragments"
+CACHE_FORMAT = 2
+
+# Source files of the generator and the modules it builds rules with; any change
+# to these invalidates every fragment
+SCHEMAS_DIR = Path(__file__).parent
+GENERATOR_FILES = [
+    SCHEMAS_DIR / "draft_parser.py",
+    SCHEMAS_DIR / "codes.py",
+    SCHEMAS_DIR / "arc_catalog.py",
+    SCHEMAS_DIR / "list_cache.py",
+    SCHEMAS_DIR / "parser_cache.py",
+    SCHEMAS_DIR / "toml_writer.py",
+    SCHEMAS_DIR.parent / "units" / "utils.py",
+]
+
+
+def _generator_hash() -> str:
+    digest = hashlib.sha256(str(CACHE_FORMAT).encode())
+    for path in GENERATOR_FILES:
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def fragment_key(*parts: Any) -> str:
+    """Stable hash of the JSON representation of `parts`."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class FragmentCache:
+    """
+    Fragments of the generated parser, stored one JSON file per fragment in the
+    `parser_fragments` directory of `cache_dir`.
+
+    Fragments are written by `put` straight away. Each fragment's file is named by
+    its key and the generator hash, so fragments from other versions of the
+    generator are never used. Files are touched when used, and `save` drops the
+    least recently used once there are more than `max_entries`, so a single cache
+    directory can be shared between presets and ARC versions.
+    """
+
+    def __init__(self, cache_dir: str | Path, max_entries: int = 50_000):
+        self.path = Path(cache_dir) / CACHE_DIRNAME
+        self.max_entries = max_entries
+        self.generator = _generator_hash()
+        self.hits = 0
+        self.misses = 0
+
+    def _fragment_path(self, key: str) -> Path:
+        return self.path / f"{fragment_key(self.generator, key)}.json"
+
+    def __len__(self) -> int:
+        return len(list(self.path.glob("*.json")))
+
+    def __contains__(self, key: str) -> bool:
+        return self._fragment_path(key).exists()
+
+    def get(self, key: str) -> RuleList | None:
+        path = self._fragment_path(key)
+        try:
+            with open(path, "r") as f:
+                rules = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return rules
+
+    def put(self, key: str, rules: RuleList):
+        """Write the fragment for `key`, replacing any previous file atomically."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(rules, f)
+        os.replace(tmp, self._fragment_path(key))
+
+    def save(self):
+        """Drop the least recently used fragments beyond `max_entries`."""
+        try:
+            entries = list(os.scandir(self.path))
+        except OSError:
+            return
+        fragments = [e for e in entries if e.name.endswith(".json")]
+        if len(fragments) <= self.max_entries:
+            return
+        fragments.sort(key=lambda e: e.stat().st_mtime_ns)
+        for entry in fragments[: len(fragments) - self.max_entries]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
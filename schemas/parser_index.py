@@ -0,0 +1,179 @@
+"""
+Lazy, attribute-indexed reader for generated parser TOML files.
+
+Parsing a whole generated parser to look at one attribute's rules is slow, so
+`LazyParser` instead indexes the byte range of every `[[long]]` table by its
+`attribute`, and only parses the tables for the attributes requested. The index
+is cached next to the parser file (`<parser>.toml.index.json`) and rebuilt if the
+parser changes.
+
+This relies on the layout written by `toml_writer`, in which strings never span
+lines, so every line starting with `[` is a table header.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import tomllib
+from pathlib import Path
+from typing import Any
+
+Rule = dict[str, Any]
+
+INDEX_FORMAT = 1
+INDEX_SUFFIX = ".index.json"
+
+# Table or array of tables header, capturing the dotted table name
+HEADER_RE = re.compile(rb"^\[\[?([^\[\]\n]+)\]\]?$", re.MULTILINE)
+ATTRIBUTE_RE = re.compile(rb"^attribute = (.*)$", re.MULTILINE)
+
+
+def build_index(data: bytes) -> dict[str, Any]:
+    """
+    Index the `[[long]]` tables of the parser TOML `data`.
+
+    Returns the byte offset of the first `[[long]]` table ("long_start") and
+    a mapping of each attribute to the `[start, end)` byte ranges of its tables
+    ("long"), with attributes and ranges in file order.
+    """
+    long_tables: list[tuple[int, int]] = []
+    table_start = None
+    for match in HEADER_RE.finditer(data):
+        header, name = match.group(0), match.group(1)
+        if table_start is not None and (
+            header == b"[[long]]" or not name.startswith(b"long.")
+        ):
+            long_tables.append((table_start, match.start()))
+            table_start = None
+        if header == b"[[long]]":
+            table_start = match.start()
+    if table_start is not None:
+        long_tables.append((table_start, len(data)))
+
+    index: dict[str, list[list[int]]] = {}
+    for start, end in long_tables:
+        # the attribute is a key of the table itself, before any sub-table header
+        header_end = data.index(b"\n", start) + 1
+        sub_table = HEADER_RE.search(data, header_end, end)
+        match = ATTRIBUTE_RE.search(
+            data, header_end, sub_table.start() if sub_table else end
+        )
+        if match is None:
+            raise ValueError(f"[[long]] table at byte {start} has no attribute")
+        attribute = tomllib.loads(match.group(0).decode())["attribute"]
+        index.setdefault(attribute, []).append([start, end])
+
+    return {
+        "long_start": long_tables[0][0] if long_tables else len(data),
+        "long": index,
+    }
+
+
+class LazyParser:
+    """
+    A generated parser file, parsed one attribute at a time.
+
+    The index of `[[long]]` tables is loaded from `index_path` (default: the
+    parser path with ".index.json" appended) if it matches the parser file, and
+    otherwise built and, if `write_index` is True and the directory is writable,
+    saved there.
+
+    Example:
+        >>> parser = LazyParser("schemas/global_arc_v1.5.0_parser.toml")
+        >>> parser.rules("demog_height_cm")[0]["attribute_unit"]
+        'cm'
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        index_path: str | Path | None = None,
+        write_index: bool = True,
+    ):
+        self.path = Path(path)
+        self.index_path = (
+            Path(index_path)
+            if index_path is not None
+            else self.path.with_name(self.path.name + INDEX_SUFFIX)
+        )
+        self._rules: dict[str, list[Rule]] = {}
+        self._index = self._load_index(write_index)
+
+    def _signature(self) -> list[int]:
+        stat = os.stat(self.path)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _load_index(self, write_index: bool) -> dict[str, Any]:
+        signature = self._signature()
+        cached = None
+        try:
+            with open(self.index_path, "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if cached is not None and cached.get("format") == INDEX_FORMAT:
+            if cached["signature"] == signature:
+                return cached
+
+        data = self.path.read_bytes()
+        sha256 = hashlib.sha256(data).hexdigest()
+        if cached is not None and cached.get("sha256") == sha256:
+            # touched but unchanged
+            index = cached
+        else:
+            index = {"format": INDEX_FORMAT, "sha256": sha256, **build_index(data)}
+        index["signature"] = signature
+
+        if write_index:
+            try:
+                fd, tmp = tempfile.mkstemp(dir=self.index_path.parent, suffix=".tmp")
+                with os.fdopen(fd, "w") as f:
+                    json.dump(index, f)
+                os.replace(tmp, self.index_path)
+            except OSError:
+                pass
+        return index
+
+    @property
+    def attributes(self) -> list[str]:
+        """Attributes with rules in the long table, in file order."""
+        return list(self._index["long"])
+
+    def __len__(self) -> int:
+        return len(self._index["long"])
+
+    def __contains__(self, attribute: str) -> bool:
+        return attribute in self._index["long"]
+
+    def ranges(self, attribute: str) -> list[tuple[int, int]]:
+        """Byte ranges (`[start, end)`) of the `[[long]]` tables for `attribute`."""
+        try:
+            return [tuple(r) for r in self._index["long"][attribute]]
+        except KeyError:
+            raise KeyError(f"No rules for attribute {attribute!r}") from None
+
+    def _read(self, ranges: list[tuple[int, int]]) -> str:
+        with open(self.path, "rb") as f:
+            chunks = []
+            for start, end in ranges:
+                f.seek(start)
+                chunks.append(f.read(end - start).decode())
+        return "\n".join(chunks)
+
+    def rules(self, attribute: str) -> list[Rule]:
+        """The long table rules for `attribute`, parsed on first access."""
+        if attribute not in self._rules:
+            toml = self._read(self.ranges(attribute))
+            self._rules[attribute] = tomllib.loads(toml)["long"]
+        return self._rules[attribute]
+
+    def header(self) -> dict[str, Any]:
+        """Everything before the long table (i.e. the `adtl` and `core` tables)."""
+        return tomllib.loads(self._read([(0, self._index["long_start"])]))
+
+    def load(self) -> dict[str, Any]:
+        """The whole parser, as from `tomllib.load`."""
+        with open(self.path, "rb") as f:
+            return tomllib.load(f)
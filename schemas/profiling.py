@@ -0,0 +1,82 @@
+"""
+Opt-in instrumentation for the parser and schema generators.
+
+A `Profiler` records the wall time spent in each named stage of generation, and
+counters such as the number of rules built by each stage. Stages may be nested
+(e.g. rules built while the TOML writer consumes them), in which case each stage
+is only credited with the time not spent in the stages nested inside it, so the
+stage times add up to the total.
+"""
+
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Iterator
+
+ProfileCallback = Callable[[dict[str, Any]], None]
+
+
+class Profiler:
+    """Wall time per stage, and named counters, for one generation run."""
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+        # Time spent in nested stages, for each currently open stage
+        self._nested: list[float] = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._nested.pop()
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - nested
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self) -> dict[str, Any]:
+        """JSON serialisable summary of the run so far."""
+        return {
+            "total_s": time.perf_counter() - self._start,
+            "stages_s": dict(self.stages),
+            "counters": dict(self.counters),
+        }
+
+
+class NullProfiler(Profiler):
+    """Profiler which records nothing, used when profiling is not requested."""
+
+    def stage(self, name: str):
+        return nullcontext()
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def write_profile(path: str) -> ProfileCallback:
+    """
+    Callback writing a profiling report as JSON to `path`, or to stderr if `path`
+    is "-", for the `--profile` option of the generator scripts.
+    """
+
+    def callback(report: dict[str, Any]):
+        if path == "-":
+            json.dump(report, sys.stderr, indent=2)
+            sys.stderr.write("\n")
+        else:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+
+    return callback
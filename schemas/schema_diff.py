@@ -0,0 +1,239 @@
+"""
+Rule-level differences between two long schemas, e.g. for two ARC versions.
+
+Each attribute's rule (see `isaric_schema.attribute_rules`) is flattened into its
+constraints, keyed by their path in the rule (e.g. "/properties/value/enum"), and
+the constraints of each attribute are compared between the schemas. The
+attributes whose rules differ are the only ones whose rows need validating again
+when moving a dataset to the new schema, unless the properties shared by every
+row changed too (`SchemaDiff.base`).
+
+    python schemas/schema_diff.py schemas/arc_v1.4.0_isaric_long.schema.json \\
+        schemas/arc_v1.5.0_isaric_long.schema.json
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from schemas.frame_validation import ANNOTATIONS
+from schemas.isaric_schema import attribute_rules, generate_long_schema
+
+Constraints = dict[str, Any]
+
+# keywords whose values map names to schemas, rather than keywords to values
+NAME_MAPS = {"properties", "patternProperties", "definitions", "dependencies"}
+
+
+def constraints(schema: dict, path: str = "", names: bool = False) -> Constraints:
+    """
+    Flatten `schema` into its constraints, keyed by their path. Objects are
+    flattened, while lists (e.g. `enum`, `required`) are single constraints;
+    annotations such as descriptions, and empty objects, are left out.
+
+    The keys of the objects under NAME_MAPS (e.g. `properties`) are names rather
+    than keywords, so a property called "description" is kept; `names` is True
+    while flattening such an object.
+
+    Example:
+        >>> constraints({"properties": {"value": {"type": "string", "enum": ["a"]}}})
+        {'/properties/value/type': 'string', '/properties/value/enum': ['a']}
+    """
+    flat = {}
+    for key, value in schema.items():
+        if not names and key in ANNOTATIONS:
+            continue
+        key_path = f"{path}/{key}"
+        if isinstance(value, dict):
+            flat.update(
+                constraints(value, key_path, names=not names and key in NAME_MAPS)
+            )
+        else:
+            flat[key_path] = value
+    return flat
+
+
+def attribute_constraints(schema: dict) -> tuple[Constraints, dict[str, Constraints]]:
+    """
+    The constraints of the properties shared by every row of the long `schema`,
+    and of the rule for each attribute, other than the attribute name itself.
+
+    Works with both the `oneOf` and attribute-dispatched schemas, as the rules are
+    normalised to the same form.
+    """
+    base, rules, attributes = attribute_rules(schema)
+    by_rule = []
+    for rule in rules:
+        properties = {
+            k: v for k, v in rule.get("properties", {}).items() if k != "attribute"
+        }
+        rest = {k: v for k, v in rule.items() if k != "properties"}
+        by_rule.append(constraints({"properties": properties, **rest}))
+    return constraints(base), {a: by_rule[i] for a, i in attributes.items()}
+
+
+def diff_constraints(old: Constraints, new: Constraints) -> dict[str, dict]:
+    """
+    The constraints only in `new` ("added"), only in `old` ("removed"), and in
+    both with different values ("changed"), with the old and new values.
+
+    Where a changed constraint is a list in both (e.g. an `enum`), the items added
+    to and removed from it are also given.
+    """
+    changed = {}
+    for path in old.keys() & new.keys():
+        if old[path] == new[path]:
+            continue
+        change = {"old": old[path], "new": new[path]}
+        if isinstance(old[path], list) and isinstance(new[path], list):
+            change["added"] = [v for v in new[path] if v not in old[path]]
+            change["removed"] = [v for v in old[path] if v not in new[path]]
+        changed[path] = change
+    diff = {
+        "added": {p: v for p, v in new.items() if p not in old},
+        "removed": {p: v for p, v in old.items() if p not in new},
+        "changed": dict(sorted(changed.items())),
+    }
+    return {k: v for k, v in diff.items() if v}
+
+
+@dataclass
+class SchemaDiff:
+    """
+    Differences between an old and new long schema:
+        base: changes to the properties shared by every row
+            (see `diff_constraints`)
+        added: attributes only in the new schema, with their constraints
+        removed: attributes only in the old schema, with their constraints
+        changed: attributes in both whose rules differ, with their changes
+            (see `diff_constraints`)
+    """
+
+    base: dict[str, dict] = field(default_factory=dict)
+    added: dict[str, Constraints] = field(default_factory=dict)
+    removed: dict[str, Constraints] = field(default_factory=dict)
+    changed: dict[str, dict[str, dict]] = field(default_factory=dict)
+
+    @property
+    def changed_attributes(self) -> set[str]:
+        """
+        Attributes whose rows may be valid against one schema but not the other:
+        those added, removed or with a changed rule.
+        """
+        return set(self.added) | set(self.removed) | set(self.changed)
+
+    def needs_revalidation(self, attributes: pd.Series) -> pd.Series:
+        """
+        Whether each row, with the given `attributes`, needs validating again
+        against the new schema. This is every row if the shared properties
+        changed, and otherwise the rows with a changed attribute.
+
+        Example:
+            >>> frame = pd.read_csv("long.csv")
+            >>> recheck = frame[diff.needs_revalidation(frame["attribute"])]
+        """
+        if self.base:
+            return pd.Series(True, index=attributes.index)
+        return attributes.isin(self.changed_attributes)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "base": self.base,
+            "added": dict(sorted(self.added.items())),
+            "removed": dict(sorted(self.removed.items())),
+            "changed": dict(sorted(self.changed.items())),
+        }
+
+
+def diff_schemas(old: dict, new: dict) -> SchemaDiff:
+    """Compare the long schemas `old` and `new` attribute by attribute."""
+    old_base, old_rules = attribute_constraints(old)
+    new_base, new_rules = attribute_constraints(new)
+    changed = {}
+    for attribute in old_rules.keys() & new_rules.keys():
+        diff = diff_constraints(old_rules[attribute], new_rules[attribute])
+        if diff:
+            changed[attribute] = diff
+    return SchemaDiff(
+        base=diff_constraints(old_base, new_base),
+        added={a: c for a, c in new_rules.items() if a not in old_rules},
+        removed={a: c for a, c in old_rules.items() if a not in new_rules},
+        changed=changed,
+    )
+
+
+def diff_schema_files(old_path: str | Path, new_path: str | Path) -> SchemaDiff:
+    """Compare the long schemas at `old_path` and `new_path`."""
+    with open(old_path, "r") as f:
+        old = json.load(f)
+    with open(new_path, "r") as f:
+        new = json.load(f)
+    return diff_schemas(old, new)
+
+
+def diff_arc(old_arc_path: str | Path, new_arc_path: str | Path) -> SchemaDiff:
+    """
+    Compare the long schemas generated from the ARC files at `old_arc_path` and
+    `new_arc_path` (see `generate_long_schema`).
+
+    Both schemas are generated with the current list files and unit registry, so
+    only changes to the ARC files themselves are found.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for name, arc_path in [("old", old_arc_path), ("new", new_arc_path)]:
+            path = Path(tmp, f"{name}.schema.json")
+            generate_long_schema(name, output_path=path, arc_path=arc_path)
+            paths.append(path)
+        return diff_schema_files(*paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two long schemas (or ARC files) attribute by attribute."
+    )
+    parser.add_argument("old", help="Old long schema (or ARC CSV file, with --arc)")
+    parser.add_argument("new", help="New long schema (or ARC CSV file, with --arc)")
+    parser.add_argument(
+        "--arc",
+        action="store_true",
+        help="Compare the schemas generated from two ARC CSV files",
+    )
+    parser.add_argument(
+        "--attributes-only",
+        action="store_true",
+        help="Only list the attributes whose rows need validating again, one per line",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="File to write the JSON report to (default: stdout)",
+    )
+    args = parser.parse_args()
+
+    diff = (diff_arc if args.arc else diff_schema_files)(args.old, args.new)
+    if args.attributes_only:
+        report = "".join(f"{a}\n" for a in sorted(diff.changed_attributes))
+    else:
+        report = json.dumps(diff.to_dict(), indent=2) + "\n"
+    if args.output is None:
+        sys.stdout.write(report)
+    else:
+        with open(args.output, "w") as f:
+            f.write(report)
+    print(
+        f"{len(diff.added)} added, {len(diff.removed)} removed and "
+        f"{len(diff.changed)} changed attributes"
+        + (", and the shared properties changed" if diff.base else ""),
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -32,13 +32,23 @@
 
 from __future__ import annotations
 
+import gzip
+import io
 import json
-from collections.abc import Generator, Mapping
+import lzma
+from json.encoder import encode_basestring_ascii
+import re
+from collections import OrderedDict, deque
+from collections.abc import Generator, Hashable, Iterator, Mapping
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import nullcontext
 from datetime import date, datetime, time
 from decimal import Decimal
+from functools import lru_cache
+from itertools import chain, islice
 import string
 from types import MappingProxyType
-from typing import IO, Any, NamedTuple
+from typing import IO, Any, ContextManager, NamedTuple
 
 ASCII_CTRL = frozenset(chr(i) for i in range(32)) | frozenset(chr(127))
 ILLEGAL_BASIC_STR_CHARS = frozenset('"\\') | ASCII_CTRL - frozenset("\t")
@@ -46,6 +56,16 @@ BARE_KEY_CHARS = frozenset(string.ascii_letters + string.digits + "-_")
 ARRAY_TYPES = (list, tuple)
 ARRAY_INDENT = " " * 4
 MAX_LINE_LENGTH = 100
+# Maximum number of rendered inline tables to cache during a dump
+INLINE_TABLE_CACHE_SIZE = 4096
+# Number of characters rendered by `dump` before writing them to the file
+DEFAULT_BUFFER_SIZE = 1 << 16
+# File suffixes for the compression formats supported by `dump`
+COMPRESSION_SUFFIXES = MappingProxyType({"gzip": ".gz", "xz": ".xz"})
+# Number of tables in each chunk of an array of tables rendered in parallel
+AOT_CHUNK_SIZE = 256
+# Maximum number of chunks queued for parallel rendering at once
+AOT_MAX_PENDING_CHUNKS = 16
 
 COMPACT_ESCAPES = MappingProxyType(
     {
@@ -58,24 +78,119 @@ COMPACT_ESCAPES = MappingProxyType(
     }
 )
 
+# Matches any character which must be escaped in a basic string
+ILLEGAL_BASIC_STR_RE = re.compile(
+    "[" + "".join(sorted(re.escape(c) for c in ILLEGAL_BASIC_STR_CHARS)) + "]"
+)
+BASIC_STR_ESCAPES = str.maketrans(
+    {
+        char: COMPACT_ESCAPES.get(char, "\\u" + hex(ord(char))[2:].rjust(4, "0"))
+        for char in ILLEGAL_BASIC_STR_CHARS
+    }
+)
+# Line feeds are written as-is in multi-line strings
+MULTILINE_BASIC_STR_ESCAPES = {**BASIC_STR_ESCAPES, ord("\n"): "\n"}
+
 
 def dump(
-    __obj: dict[str, Any], __fp: IO[bytes], *, multiline_strings: bool = False
+    __obj: dict[str, Any],
+    __fp: IO[bytes],
+    *,
+    multiline_strings: bool = False,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    compression: str | None = None,
+    workers: int | None = None,
 ) -> None:
-    ctx = Context(multiline_strings, {})
-    for chunk in gen_table_chunks(__obj, ctx, name=""):
-        __fp.write(chunk.encode())
+    """Write `__obj` as TOML to the binary file `__fp`.
+
+    Output is buffered, and written to `__fp` once at least `buffer_size`
+    characters have been rendered. If `compression` is one of COMPRESSION_SUFFIXES
+    ("gzip" or "xz"), the output is compressed in that format; gzip output has no
+    timestamp, so is reproducible. If `workers` is more than one, arrays of tables
+    are rendered in parallel over that many processes (see `dumps`)."""
+    if compression is None:
+        _dump_buffered(__obj, __fp, multiline_strings, buffer_size, workers)
+        return
+    if compression == "gzip":
+        compressed = gzip.GzipFile(fileobj=__fp, mode="wb", mtime=0)
+    elif compression == "xz":
+        compressed = lzma.LZMAFile(__fp, mode="wb")
+    else:
+        raise ValueError(
+            f"Unknown compression {compression!r}, "
+            f"expected one of {', '.join(COMPRESSION_SUFFIXES)}"
+        )
+    with compressed:
+        _dump_buffered(__obj, compressed, multiline_strings, buffer_size, workers)
+
+
+def _dump_buffered(
+    obj: dict[str, Any],
+    fp: IO[bytes],
+    multiline_strings: bool,
+    buffer_size: int,
+    workers: int | None,
+) -> None:
+    with _executor(workers) as executor:
+        ctx = Context(multiline_strings, InlineTableCache.new(), {}, executor)
+        buffer: list[str] = []
+        buffered = 0
+        for chunk in gen_table_chunks(obj, ctx, name=""):
+            buffer.append(chunk)
+            buffered += len(chunk)
+            if buffered >= buffer_size:
+                fp.write("".join(buffer).encode())
+                buffer.clear()
+                buffered = 0
+        if buffer:
+            fp.write("".join(buffer).encode())
+
+
+def dumps(
+    __obj: dict[str, Any],
+    *,
+    multiline_strings: bool = False,
+    workers: int | None = None,
+) -> str:
+    """Render `__obj` as TOML.
 
+    If `workers` is more than one, arrays of tables (including streamed ones) are
+    split into chunks of AOT_CHUNK_SIZE tables, which are rendered in parallel over
+    a pool of that many processes. The output is identical to serial rendering."""
+    with _executor(workers) as executor:
+        ctx = Context(multiline_strings, InlineTableCache.new(), {}, executor)
+        return "".join(gen_table_chunks(__obj, ctx, name=""))
 
-def dumps(__obj: dict[str, Any], *, multiline_strings: bool = False) -> str:
-    ctx = Context(multiline_strings, {})
-    return "".join(gen_table_chunks(__obj, ctx, name=""))
+
+def dumps_bytes(
+    __obj: dict[str, Any],
+    *,
+    multiline_strings: bool = False,
+    workers: int | None = None,
+) -> bytes:
+    """As `dumps`, but returns UTF-8 encoded bytes.
+
+    The output is encoded as it is rendered, DEFAULT_BUFFER_SIZE characters at a
+    time (see `dump`), so the whole TOML is never held as a `str`."""
+    buffer = io.BytesIO()
+    _dump_buffered(__obj, buffer, multiline_strings, DEFAULT_BUFFER_SIZE, workers)
+    return buffer.getvalue()
+
+
+def _executor(workers: int | None) -> ContextManager[Executor | None]:
+    if workers is not None and workers > 1:
+        return ProcessPoolExecutor(max_workers=workers)
+    return nullcontext()
 
 
 class Context(NamedTuple):
     allow_multiline: bool
-    # cache rendered inline tables (mapping from object id to rendered inline table)
-    inline_table_cache: dict[int, str]
+    # cache rendered inline tables
+    inline_table_cache: InlineTableCache
+    # cache of whether tables are too long to render inline (mapping from object id)
+    too_long_cache: dict[int, bool]
+    # process pool for rendering arrays of tables in parallel, if any
+    executor: Executor | None = None
 
 
 def gen_table_chunks(
@@ -90,11 +205,23 @@ def gen_table_chunks(
     tables: list[tuple[str, Any, bool]] = []  # => [(key, value, inside_aot)]
     for k, v in table.items():
         if isinstance(v, dict) and (
-            len(json.dumps(v)) > MAX_LINE_LENGTH or name in ["subject", "visit"]
+            is_too_long_for_inline(v, ctx) or name in ["subject", "visit"]
         ):
             tables.append((k, v, False))
+        elif isinstance(v, Iterator):
+            # streamed array of tables, rendered as each table is produced; an
+            # empty stream is written as an empty array, as an empty list is
+            first = next(v, None)
+            if first is None:
+                literals.append((k, []))
+            else:
+                tables.append((k, chain([first], v), True))
         elif is_aot(v) and not all(is_suitable_inline_table(t, ctx) for t in v):
-            tables.extend((k, t, True) for t in v)
+            if ctx.executor is not None:
+                # rendered in parallel, as for a streamed array of tables
+                tables.append((k, iter(v), True))
+            else:
+                tables.extend((k, t, True) for t in v)
         else:
             literals.append((k, v))
 
@@ -108,13 +235,53 @@ def gen_table_chunks(
             yield f"{format_key_part(k)} = {format_literal(v, ctx)}\n"
 
     for k, v, in_aot in tables:
-        if yielded:
-            yield "\n"
-        else:
-            yielded = True
         key_part = format_key_part(k)
         display_name = f"{name}.{key_part}" if name else key_part
-        yield from gen_table_chunks(v, ctx, name=display_name, inside_aot=in_aot)
+        streamed = isinstance(v, Iterator)
+        if streamed and ctx.executor is not None:
+            for rendered in gen_aot_chunks_parallel(v, ctx, name=display_name):
+                if yielded:
+                    yield "\n"
+                else:
+                    yielded = True
+                yield rendered
+            continue
+        for t in v if streamed else (v,):
+            if yielded:
+                yield "\n"
+            else:
+                yielded = True
+            yield from gen_table_chunks(t, ctx, name=display_name, inside_aot=in_aot)
+            if streamed:
+                # streamed tables may be freed once rendered and their ids reused
+                ctx.too_long_cache.clear()
+
+
+def gen_aot_chunks_parallel(
+    tables: Iterator[dict], ctx: Context, *, name: str
+) -> Generator[str, None, None]:
+    """Render an array of tables in chunks of AOT_CHUNK_SIZE tables over
+    `ctx.executor`, yielding the rendered chunks in order. At most
+    AOT_MAX_PENDING_CHUNKS chunks are queued at a time, so streamed tables are
+    still only consumed as the output is written."""
+    assert ctx.executor is not None
+    pending: deque[Future[str]] = deque()
+    while chunk := list(islice(tables, AOT_CHUNK_SIZE)):
+        pending.append(
+            ctx.executor.submit(render_aot_chunk, chunk, name, ctx.allow_multiline)
+        )
+        if len(pending) >= AOT_MAX_PENDING_CHUNKS:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def render_aot_chunk(tables: list[dict], name: str, allow_multiline: bool) -> str:
+    """Render consecutive tables of the array of tables `name`, as in serial mode."""
+    ctx = Context(allow_multiline, InlineTableCache.new(), {})
+    return "\n".join(
+        "".join(gen_table_chunks(t, ctx, name=name, inside_aot=True)) for t in tables
+    )
 
 
 def format_literal(obj: object, ctx: Context, *, nest_level: int = 0) -> str:
@@ -147,24 +314,63 @@ def format_decimal(obj: Decimal) -> str:
     return str(obj)
 
 
+class InlineTableCache(NamedTuple):
+    """
+    Rendered inline tables.
+
+    Tables with only scalar values are cached by content, so identical tables
+    (e.g. `{ function = "attribute_status_fill" }`) are only rendered once per
+    dump, and the oldest are dropped once there are `maxsize`. Tables containing
+    tables or arrays are cached by id, with a reference to the table so its id
+    can't be reused by another object while it is cached, and the cache is
+    emptied once there are `maxsize`.
+    """
+
+    by_id: dict[int, tuple[dict, str]]
+    by_content: OrderedDict[Hashable, str]
+    maxsize: int = INLINE_TABLE_CACHE_SIZE
+
+    @classmethod
+    def new(cls, maxsize: int = INLINE_TABLE_CACHE_SIZE) -> InlineTableCache:
+        return cls({}, OrderedDict(), maxsize)
+
+
 def format_inline_table(obj: dict, ctx: Context) -> str:
     # check cache first
-    obj_id = id(obj)
-    if obj_id in ctx.inline_table_cache:
-        return ctx.inline_table_cache[obj_id]
-
-    if not obj:
-        rendered = "{}"
+    cache = ctx.inline_table_cache
+    entry = cache.by_id.get(id(obj))
+    if entry is not None and entry[0] is obj:
+        return entry[1]
+
+    if any(isinstance(v, (dict, list, tuple)) for v in obj.values()):
+        # nested tables or arrays are only cached by object, their contents are
+        # cached when rendered
+        key = rendered = None
     else:
-        rendered = (
-            "{ "
-            + ", ".join(
-                f"{format_key_part(k)} = {format_literal(v, ctx)}"
-                for k, v in obj.items()
+        # values are paired with their types, so e.g. `1`, `1.0` and `True` differ
+        key = (tuple(obj.items()), tuple(map(type, obj.values())))
+        rendered = cache.by_content.get(key)
+
+    if rendered is None:
+        if not obj:
+            rendered = "{}"
+        else:
+            rendered = (
+                "{ "
+                + ", ".join(
+                    f"{format_key_part(k)} = {format_literal(v, ctx)}"
+                    for k, v in obj.items()
+                )
+                + " }"
             )
-            + " }"
-        )
-    ctx.inline_table_cache[obj_id] = rendered
+        if key is None:
+            if len(cache.by_id) >= cache.maxsize:
+                cache.by_id.clear()
+            cache.by_id[id(obj)] = (obj, rendered)
+        else:
+            cache.by_content[key] = rendered
+            if len(cache.by_content) > cache.maxsize:
+                cache.by_content.popitem(last=False)
     return rendered
 
 
@@ -183,6 +389,7 @@ def format_inline_array(obj: tuple | list, ctx: Context, nest_level: int) -> str
     )
 
 
+@lru_cache(maxsize=INLINE_TABLE_CACHE_SIZE)
 def format_key_part(part: str) -> str:
     if part and BARE_KEY_CHARS.issuperset(part):
         return part
@@ -192,31 +399,51 @@ def format_key_part(part: str) -> str:
 def format_string(s: str, *, allow_multiline: bool) -> str:
     do_multiline = allow_multiline and "\n" in s
     if do_multiline:
-        result = '"""\n'
         s = s.replace("\r\n", "\n")
-    else:
-        result = '"'
-
-    pos = seq_start = 0
-    while True:
-        try:
-            char = s[pos]
-        except IndexError:
-            result += s[seq_start:pos]
-            if do_multiline:
-                return result + '"""'
-            return result + '"'
-        if char in ILLEGAL_BASIC_STR_CHARS:
-            result += s[seq_start:pos]
-            if char in COMPACT_ESCAPES:
-                if do_multiline and char == "\n":
-                    result += "\n"
-                else:
-                    result += COMPACT_ESCAPES[char]
-            else:
-                result += "\\u" + hex(ord(char))[2:].rjust(4, "0")
-            seq_start = pos + 1
-        pos += 1
+        return '"""\n' + s.translate(MULTILINE_BASIC_STR_ESCAPES) + '"""'
+    if ILLEGAL_BASIC_STR_RE.search(s) is None:
+        return '"' + s + '"'
+    return '"' + s.translate(BASIC_STR_ESCAPES) + '"'
+
+
+def json_length(obj: Any, limit: int) -> int:
+    """Length of `json.dumps(obj)`, or, once that is known to be more than `limit`,
+    some length greater than `limit` (without serialising the rest of `obj`)."""
+    if isinstance(obj, str):
+        return len(encode_basestring_ascii(obj))
+    if isinstance(obj, dict):
+        if not obj:
+            return 2
+        # braces and ", " separators, then ": " between each key and value
+        length = 2 * len(obj)
+        for k, v in obj.items():
+            key = k if isinstance(k, str) else json.dumps(k)
+            length += len(encode_basestring_ascii(key)) + 2
+            if length > limit:
+                return length
+            length += json_length(v, limit - length)
+            if length > limit:
+                return length
+        return length
+    if isinstance(obj, ARRAY_TYPES):
+        if not obj:
+            return 2
+        length = 2 * len(obj)
+        for item in obj:
+            length += json_length(item, limit - length)
+            if length > limit:
+                return length
+        return length
+    return len(json.dumps(obj))
+
+
+def is_too_long_for_inline(obj: dict, ctx: Context) -> bool:
+    """Decides if a table is too long to be rendered inline, i.e. if its JSON
+    representation is longer than MAX_LINE_LENGTH."""
+    obj_id = id(obj)
+    if obj_id not in ctx.too_long_cache:
+        ctx.too_long_cache[obj_id] = json_length(obj, MAX_LINE_LENGTH) > MAX_LINE_LENGTH
+    return ctx.too_long_cache[obj_id]
 
 
 def is_aot(obj: Any) -> bool:
@@ -0,0 +1,326 @@
+"""
+Validate a long table CSV or NDJSON file against the ISARIC long schema.
+
+The file is streamed in chunks of rows, which are validated in parallel over a
+pool of worker processes, each of which loads the long schema once (see
+`frame_validation.long_frame_validator`). Only a bounded report is kept: the
+number of failed checks per attribute, and a capped sample of the failing rows,
+so memory use depends on the chunk size and number of workers, not the file size.
+
+    python schemas/validate_long.py long.csv --version v1.5.0 --workers 8
+"""
+
+import argparse
+import json
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator
+
+import pandas as pd
+
+from schemas.frame_validation import LongFrameValidator, long_frame_validator
+
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_MAX_SAMPLES = 100
+# Chunks queued for each worker at once, bounding the rows held in memory
+PENDING_CHUNKS_PER_WORKER = 2
+# Counts key for rows with a missing attribute, or one without a rule
+MISSING_ATTRIBUTE = "(missing)"
+UNKNOWN_ATTRIBUTE = "(unknown)"
+
+
+class ValidationReport:
+    """
+    Bounded summary of the violations in a long table: the number of rows, the
+    number of invalid rows, the number of each failed check by attribute, and
+    the first `max_samples` invalid rows with their violations.
+
+    Checks failed by rows whose attribute isn't in the schema are counted
+    together under UNKNOWN_ATTRIBUTE, so the counts are bounded by the number of
+    attributes in the schema, whatever the attributes in the table.
+    """
+
+    def __init__(self, max_samples: int = DEFAULT_MAX_SAMPLES):
+        self.max_samples = max_samples
+        self.rows = 0
+        self.invalid_rows = 0
+        # attribute -> "field.check" -> count
+        self.counts: dict[str, dict[str, int]] = {}
+        self.samples: list[dict[str, Any]] = []
+
+    def add(self, frame: pd.DataFrame, violations: pd.DataFrame, first_row: int = 0):
+        """Add the `violations` of `frame`, whose first row is row `first_row`."""
+        self.rows += len(frame)
+        self.invalid_rows += violations["row"].nunique()
+
+        # e.g. "value_num.maximum", or "attribute" for attributes without a rule
+        checks = violations["check"].where(
+            violations["field"].isna(), violations["field"] + "." + violations["check"]
+        )
+        unknown = violations["row"].isin(
+            violations["row"][violations["check"] == "attribute"]
+        )
+        attributes = violations["attribute"].map(
+            lambda a: MISSING_ATTRIBUTE if pd.isna(a) else str(a)
+        )
+        attributes = attributes.where(~unknown, UNKNOWN_ATTRIBUTE)
+        for (attribute, check), n in checks.groupby(attributes).value_counts().items():
+            by_check = self.counts.setdefault(attribute, {})
+            by_check[check] = by_check.get(check, 0) + int(n)
+
+        for row, row_checks in checks.groupby(violations["row"]):
+            if len(self.samples) >= self.max_samples:
+                break
+            data = frame.iloc[[row]].to_json(orient="records")
+            self.samples.append(
+                {
+                    "row": first_row + int(row),
+                    "data": json.loads(data)[0],
+                    "violations": row_checks.to_list(),
+                }
+            )
+
+    def merge(self, other: "ValidationReport"):
+        """Add the counts and samples of `other`, for rows after those of this report."""
+        self.rows += other.rows
+        self.invalid_rows += other.invalid_rows
+        for attribute, by_check in other.counts.items():
+            counts = self.counts.setdefault(attribute, {})
+            for key, n in by_check.items():
+                counts[key] = counts.get(key, 0) + n
+        self.samples += other.samples[: self.max_samples - len(self.samples)]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "invalid_rows": self.invalid_rows,
+            "counts": {
+                a: dict(sorted(c.items())) for a, c in sorted(self.counts.items())
+            },
+            "samples": self.samples,
+        }
+
+
+def coerce_csv_types(frame: pd.DataFrame, base_schema: dict) -> pd.DataFrame:
+    """
+    Convert the text columns read from CSV which the schema requires to be numbers
+    (e.g. `value_num`) to numbers, leaving values which aren't numbers as text so
+    they are reported. Empty cells are missing.
+    """
+    for field, prop in base_schema.get("properties", {}).items():
+        types = prop.get("type", [])
+        types = types if isinstance(types, list) else [types]
+        if field not in frame.columns or "string" in types:
+            continue
+        if {"number", "integer"} & set(types):
+            text = frame[field]
+            numbers = pd.to_numeric(text, errors="coerce")
+            if numbers.notna().sum() == text.notna().sum():
+                frame[field] = numbers
+            else:
+                frame[field] = numbers.astype(object).where(numbers.notna(), text)
+    return frame
+
+
+def read_chunks(
+    path: str | Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    format: str | None = None,
+    base_schema: dict | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Stream the long table at `path` in DataFrames of `chunk_size` rows.
+
+    `format` is "csv" or "ndjson" (default: from the file suffix, ".ndjson" or
+    ".jsonl" for NDJSON). CSV cells are read as text (only empty cells are
+    missing, so e.g. "NA" is kept), then converted to numbers
+    where `base_schema` requires numbers (see `coerce_csv_types`); NDJSON values
+    keep their JSON types. An empty file has no chunks.
+    """
+    if format is None:
+        format = "ndjson" if Path(path).suffix in [".ndjson", ".jsonl"] else "csv"
+    if format == "ndjson":
+        reader = pd.read_json(
+            path,
+            lines=True,
+            chunksize=chunk_size,
+            dtype=False,
+            convert_dates=False,
+        )
+        with reader:
+            yield from reader
+    elif format == "csv":
+        try:
+            reader = pd.read_csv(
+                path,
+                dtype=str,
+                keep_default_na=False,
+                na_values=[""],
+                chunksize=chunk_size,
+            )
+        except pd.errors.EmptyDataError:
+            # an empty file, without even a header
+            return
+        with reader:
+            for chunk in reader:
+                yield coerce_csv_types(chunk, base_schema or {})
+    else:
+        raise ValueError(f"Unknown format {format!r}, expected 'csv' or 'ndjson'")
+
+
+# Validator for the schema being checked, set once per worker by `_init_worker`
+_worker_validator: LongFrameValidator | None = None
+
+
+def _init_worker(
+    version: str,
+    schema_path: str | None,
+    cache_dir: str | None,
+    check_formats: bool,
+):
+    global _worker_validator
+    _worker_validator = long_frame_validator(
+        version, schema_path, cache_dir, check_formats=check_formats
+    )
+
+
+def _validate_chunk(
+    frame: pd.DataFrame, first_row: int, max_samples: int
+) -> ValidationReport:
+    report = ValidationReport(max_samples)
+    report.add(frame, _worker_validator.validate(frame), first_row)
+    return report
+
+
+def validate_long_table(
+    path: str | Path,
+    version: str | None,
+    schema_path: str | Path | None = None,
+    format: str | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    max_samples: int = DEFAULT_MAX_SAMPLES,
+    cache_dir: str | Path | None = None,
+    check_formats: bool = False,
+) -> ValidationReport:
+    """
+    Validate the long table at `path` against the long schema of ARC `version` (or
+    at `schema_path`), returning a `ValidationReport`.
+
+    The file is read in chunks of `chunk_size` rows (see `read_chunks`). If
+    `workers` is more than one, chunks are validated in parallel over that many
+    processes, with at most PENDING_CHUNKS_PER_WORKER chunks per worker queued at
+    once. The report is the same whatever the number of workers.
+    """
+    schema_path = str(schema_path) if schema_path is not None else None
+    cache_dir = str(cache_dir) if cache_dir is not None else None
+    # Also checks the schema, and caches it in `cache_dir`, before starting workers
+    validator = long_frame_validator(
+        version, schema_path, cache_dir, check_formats=check_formats
+    )
+    chunks = read_chunks(path, chunk_size, format, validator.base)
+    report = ValidationReport(max_samples)
+    first_row = 0
+
+    if workers <= 1:
+        for chunk in chunks:
+            report.add(chunk, validator.validate(chunk), first_row)
+            first_row += len(chunk)
+        return report
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(version, schema_path, cache_dir, check_formats),
+    ) as executor:
+        pending = deque()
+        for chunk in chunks:
+            if len(pending) >= workers * PENDING_CHUNKS_PER_WORKER:
+                report.merge(pending.popleft().result())
+            pending.append(
+                executor.submit(_validate_chunk, chunk, first_row, max_samples)
+            )
+            first_row += len(chunk)
+        while pending:
+            report.merge(pending.popleft().result())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate a long table CSV or NDJSON file against the long schema."
+    )
+    parser.add_argument("path", help="Long table file (.csv, or .ndjson/.jsonl)")
+    schema = parser.add_mutually_exclusive_group(required=True)
+    schema.add_argument(
+        "--version",
+        help="ARC version of the schema (schemas/arc_{version}_isaric_long.schema.json)",
+    )
+    schema.add_argument("--schema-path", help="Path to the long schema")
+    parser.add_argument(
+        "--format",
+        choices=["csv", "ndjson"],
+        default=None,
+        help="File format (default: from the file suffix)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help=f"Rows validated at a time by each worker (default: {DEFAULT_CHUNK_SIZE})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--max-samples",
+        type=int,
+        default=DEFAULT_MAX_SAMPLES,
+        help=f"Invalid rows to include in the report (default: {DEFAULT_MAX_SAMPLES})",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Directory to cache the checked schema in (see long_schema_validator)",
+    )
+    parser.add_argument(
+        "--check-formats",
+        action="store_true",
+        help="Also check date, date-time and time formats",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="File to write the JSON report to (default: stdout)",
+    )
+    args = parser.parse_args()
+
+    report = validate_long_table(
+        args.path,
+        args.version,
+        schema_path=args.schema_path,
+        format=args.format,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        max_samples=args.max_samples,
+        cache_dir=args.cache_dir,
+        check_formats=args.check_formats,
+    )
+    if args.output is None:
+        json.dump(report.to_dict(), sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report.to_dict(), f, indent=2)
+    print(f"{report.invalid_rows} of {report.rows} rows are invalid", file=sys.stderr)
+    if report.invalid_rows:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
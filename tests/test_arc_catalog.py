@@ -0,0 +1,114 @@
+"""
+Unit tests for the ARC catalog index.
+"""
+
+import pandas as pd
+import pytest
+
+from schemas.arc_catalog import ArcCatalog, PrefixIndex
+
+
+@pytest.fixture
+def arc():
+    return pd.DataFrame(
+        {
+            "Variable": ["demog_sex", "demog_height", "comor_list", "daily_temp"],
+            "Type": ["radio", "number", "multi_list", "number"],
+            "Form": ["presentation", "presentation", "presentation", "daily"],
+            "List": [None, None, "conditions_Comorbidities", None],
+            "Answer Options": ["1, Male|2, Female", None, None, None],
+        }
+    )
+
+
+class TestArcCatalog:
+    """Tests for the ArcCatalog class."""
+
+    @pytest.mark.medium
+    def test_get_column_value(self, arc):
+        """Check a single column value is looked up by variable."""
+        catalog = ArcCatalog(arc)
+        assert catalog.get("daily_temp", "Form") == "daily"
+        assert catalog.get("demog_sex", "Answer Options") == "1, Male|2, Female"
+
+    @pytest.mark.medium
+    def test_row(self, arc):
+        """Check the full row is returned as a dictionary."""
+        catalog = ArcCatalog(arc)
+        assert catalog.row("demog_height") == {
+            "Variable": "demog_height",
+            "Type": "number",
+            "Form": "presentation",
+            "List": None,
+            "Answer Options": None,
+        }
+
+    @pytest.mark.medium
+    def test_unknown_variable_raises(self, arc):
+        """Check an unknown variable raises a KeyError."""
+        catalog = ArcCatalog(arc)
+        with pytest.raises(KeyError, match="not_a_var"):
+            catalog.get("not_a_var", "Form")
+
+    @pytest.mark.medium
+    def test_unknown_column_raises(self, arc):
+        """Check an unknown column raises a KeyError."""
+        catalog = ArcCatalog(arc)
+        with pytest.raises(KeyError, match="Minimum"):
+            catalog.get("demog_sex", "Minimum")
+
+    @pytest.mark.medium
+    def test_list_grouping_preserves_arc_order(self, arc):
+        """Check the List grouping keeps ARC row order and skips NaNs."""
+        arc.loc[3, "List"] = "conditions_Comorbidities"
+        catalog = ArcCatalog(arc)
+        assert catalog.by_list == {
+            "conditions_Comorbidities": ["comor_list", "daily_temp"]
+        }
+
+    @pytest.mark.medium
+    def test_duplicate_variables_rejected(self, arc):
+        """Check duplicate variable names are rejected."""
+        with pytest.raises(ValueError, match="duplicate"):
+            ArcCatalog(pd.concat([arc, arc.iloc[[0]]]))
+
+    @pytest.mark.high
+    def test_arc_csv(self):
+        """Check the catalog builds from the shipped ARC file."""
+        catalog = ArcCatalog.from_csv("ARC.csv")
+        assert len(catalog) == len(pd.read_csv("ARC.csv"))
+        assert catalog.get("medi_dose", "Form") == "medication"
+
+
+class TestPrefixIndex:
+    """Tests for the PrefixIndex class."""
+
+    variables = ["labs_ph", "labs_phos_units", "labs_phos", "lab", "labs_phos_mgdl"]
+
+    @pytest.mark.medium
+    def test_with_prefix_keeps_original_order(self):
+        """Check matches are returned in the order the variables were given."""
+        index = PrefixIndex(self.variables)
+        assert index.with_prefix("labs_phos_") == ["labs_phos_units", "labs_phos_mgdl"]
+        assert index.with_prefix("labs_ph") == [
+            "labs_ph",
+            "labs_phos_units",
+            "labs_phos",
+            "labs_phos_mgdl",
+        ]
+
+    @pytest.mark.medium
+    def test_no_matches(self):
+        """Check an unmatched prefix returns an empty list."""
+        assert PrefixIndex(self.variables).with_prefix("labs_x") == []
+        assert PrefixIndex([]).with_prefix("labs_") == []
+
+    @pytest.mark.high
+    def test_matches_str_startswith_on_arc(self):
+        """Check the index agrees with pandas str.startswith for every ARC unit field."""
+        arc = pd.read_csv("ARC.csv")
+        index = PrefixIndex(arc["Variable"])
+        for var in arc.loc[arc.Variable.str.endswith("_units"), "Variable"]:
+            prefix = var.removesuffix("units")
+            expected = arc.loc[arc.Variable.str.startswith(prefix), "Variable"]
+            assert index.with_prefix(prefix) == expected.to_list()
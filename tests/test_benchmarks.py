@@ -0,0 +1,65 @@
+"""
+Tests for the synthetic ARC scaling used by the generation benchmarks.
+"""
+
+import pandas as pd
+import pytest
+
+from benchmarks.bench_generation import (
+    HARD_CODED_FIELDS,
+    compare,
+    scale_arc,
+    scaled_registry_entries,
+)
+from schemas.draft_parser import build_parser
+from units.utils import default_registry
+
+
+@pytest.fixture(scope="module")
+def arc():
+    return pd.read_csv("ARC.csv")
+
+
+@pytest.mark.low
+def test_scale_arc_preserves_mix(arc):
+    """Check each copy has unique names and the same types, lists and presets."""
+    scaled = scale_arc(arc, 3)
+    copyable = arc[~arc.Variable.isin(HARD_CODED_FIELDS)]
+
+    assert len(scaled) == len(arc) + 2 * len(copyable)
+    assert scaled.Variable.is_unique
+    x3 = scaled[scaled.Variable.str.startswith("x3_")]
+    assert x3.Variable.str.removeprefix("x3_").to_list() == copyable.Variable.to_list()
+    for col in ["Type", "Form", "List", "preset_ARChetype Disease CRF_Mpox"]:
+        assert x3[col].fillna("").to_list() == copyable[col].fillna("").to_list()
+
+
+@pytest.mark.low
+def test_scaled_parser_builds(arc, monkeypatch):
+    """Check the unit fields in the copies resolve with the scaled registry."""
+    registry = default_registry()
+    monkeypatch.setattr(
+        registry,
+        "conversion_entries",
+        {**registry.conversion_entries, **scaled_registry_entries(registry, 2)},
+    )
+    single = build_parser("test", arc)
+    double = build_parser("test", scale_arc(arc, 2))
+
+    attributes = {rule["attribute"] for rule in double["long"]}
+    assert "x2_demog_height_cm" in attributes
+    assert len(double["long"]) > 1.9 * len(single["long"])
+
+
+@pytest.mark.low
+def test_compare():
+    """Check ratios are reported for stages and scales present in both runs."""
+
+    def results(seconds, memory):
+        stats = {"median_s": seconds, "peak_memory_mb": memory}
+        return {"results": [{"scale": 1, "stages": {"generate_parser": stats}}]}
+
+    (line,) = compare(results(2.0, 10.0), results(1.0, 15.0))
+    assert "generate_parser" in line
+    assert "time  0.50x" in line
+    assert "memory  1.50x" in line
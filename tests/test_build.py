@@ -0,0 +1,32 @@
+"""
+Tests for the combined schema and parser build.
+"""
+
+import pytest
+
+from schemas.build import build_all
+from schemas.draft_parser import generate_parser
+from schemas.isaric_schema import generate_long_schema
+
+
+@pytest.mark.high
+@pytest.mark.parametrize("parallel", [True, False])
+def test_build_all_matches_separate_runs(tmp_path, parallel):
+    """Check the combined build writes the same files as running each generator."""
+    generate_long_schema("test", output_path=tmp_path / "schema.json")
+    generate_parser("test", filename=str(tmp_path / "parser"))
+
+    timings = build_all(
+        "test",
+        schema_path=tmp_path / "built_schema.json",
+        parser_filename=str(tmp_path / "built_parser"),
+        parallel=parallel,
+    )
+
+    assert set(timings) == {"load", "schema", "parser"}
+    assert (tmp_path / "built_schema.json").read_bytes() == (
+        tmp_path / "schema.json"
+    ).read_bytes()
+    assert (tmp_path / "built_parser.toml").read_bytes() == (
+        tmp_path / "parser.toml"
+    ).read_bytes()
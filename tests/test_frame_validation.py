@@ -0,0 +1,128 @@
+"""
+Unit tests for the vectorized long table validator.
+"""
+
+import json
+
+import jsonschema
+import pandas as pd
+import pytest
+
+from schemas.frame_validation import (
+    LongFrameValidator,
+    long_frame_validator,
+    matches_format,
+)
+from schemas.isaric_schema import long_schema_validator
+from tests.test_schema_generation import example_rows
+
+SCHEMA_PATH = "schemas/arc_v1.5.0_isaric_long.schema.json"
+
+
+def row(attribute, **fields):
+    return {
+        "subjid": "1",
+        "dataset_id": "test",
+        "phase": "presentation",
+        "attribute": attribute,
+        "attribute_status": "VAL",
+        **fields,
+    }
+
+
+@pytest.fixture(scope="module")
+def validator():
+    return long_frame_validator("v1.5.0")
+
+
+@pytest.mark.high
+def test_matches_jsonschema(validator):
+    """Check rows have violations exactly when jsonschema finds them invalid."""
+    with open(SCHEMA_PATH) as f:
+        rules = json.load(f)["oneOf"]
+    rows = [r for rule in rules[::5] for r in example_rows(rule)]
+    rows += [
+        row("labs_baseexcess", value_num="3"),
+        row("labs_baseexcess", value_num=True),
+        row("labs_baseexcess", value_num=3, extra_column="x"),
+        row("labs_baseexcess", value_num=3, subjid=1, phase="unknown"),
+        row("labs_baseexcess", value_num=3, date="2020-01"),
+        row("labs_baseexcess", value_num=3, date=2020),
+        row(7),
+        {"attribute": "labs_baseexcess", "value_num": 3},
+    ]
+
+    expected = [long_schema_validator("v1.5.0").is_valid(r) for r in rows]
+    assert validator.is_valid(pd.DataFrame(rows)).to_list() == expected
+
+
+@pytest.mark.medium
+def test_violations(validator):
+    """Check each failed check is reported against its row, field and keyword."""
+    frame = pd.DataFrame(
+        [
+            row("labs_baseexcess", value_num=3),
+            row("labs_baseexcess", value_num=30),
+            row("demog_height_cm", attribute_unit="in"),
+            row("not_an_attribute"),
+        ],
+        index=[10, 11, 12, 13],
+    )
+    violations = validator.validate(frame)
+    assert violations.to_dict("records") == [
+        {
+            "row": 1,
+            "attribute": "labs_baseexcess",
+            "field": "value_num",
+            "check": "maximum",
+        },
+        {
+            "row": 2,
+            "attribute": "demog_height_cm",
+            "field": "attribute_unit",
+            "check": "const",
+        },
+        {
+            "row": 2,
+            "attribute": "demog_height_cm",
+            "field": "value_num",
+            "check": "required",
+        },
+        {
+            "row": 3,
+            "attribute": "not_an_attribute",
+            "field": None,
+            "check": "attribute",
+        },
+    ]
+    assert validator.is_valid(frame).to_list() == [True, False, False, False]
+
+
+@pytest.mark.high
+@pytest.mark.parametrize("rows", [1, 0])
+def test_no_violations(validator, rows):
+    """Check an all-valid or empty frame has no violations."""
+    frame = pd.DataFrame([row("labs_baseexcess", value_num=3)] * rows)
+    violations = validator.validate(frame)
+    assert violations.empty
+    assert list(violations.columns) == ["row", "attribute", "field", "check"]
+    assert validator.is_valid(frame).all()
+    assert len(validator.is_valid(frame)) == rows
+
+
+@pytest.mark.medium
+def test_date_format():
+    """Check dates are checked as by jsonschema's format checker."""
+    dates = ["2020-01-02", "2024-02-29", "2023-02-29", "2020-1-2", "2020-13-01", "x"]
+    checker = jsonschema.Draft7Validator.FORMAT_CHECKER
+    assert matches_format(pd.Series(dates), "date").to_list() == [
+        checker.conforms(date, "date") for date in dates
+    ]
+
+
+@pytest.mark.medium
+def test_unsupported_keyword():
+    """Check schemas using keywords the validator doesn't implement are rejected."""
+    rule = {"properties": {"value": {"type": "string", "maxLength": 3}}}
+    with pytest.raises(ValueError, match="maxLength"):
+        LongFrameValidator({"type": "object"}, [rule], {"attr": 0})
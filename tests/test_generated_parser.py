@@ -2,8 +2,13 @@
 Unit tests for schema draft parser functions.
 """
 
+import lzma
+import os
+import tomllib
+
 import adtl
 import pytest
+from adtl.parser import expand_refs
 import pandas as pd
 from unittest.mock import patch
 
@@ -20,9 +25,15 @@ from schemas.draft_parser import (
     numeric_attrs,
     generic_str_attrs,
     form_definitions,
+    share_list_values,
+    build_parser,
     generate_parser,
+    generate_all_presets,
+    preset_filename,
     missing_codes,
 )
+from schemas import parser_cache
+from schemas.parser_cache import FragmentCache
 
 
 @pytest.fixture
@@ -265,6 +276,16 @@ class TestAttrsWithEnums:
             "ref": "daily",
         }
 
+    @pytest.mark.medium
+    def test_column_mapping(self):
+        """Check a mapping of columns gives the same rules as a dataframe."""
+        columns = {
+            "Variable": ["test_var"],
+            "Answer Options": ["1, Yes|2, No"],
+            "Form": ["daily"],
+        }
+        assert attrs_with_enums(columns) == attrs_with_enums(pd.DataFrame(columns))
+
 
 class TestAttrsWithCheckboxes:
     """Tests for the attrs_with_checkboxes function."""
@@ -554,3 +575,161 @@ class TestParserGeneration:
         file = tmp_path / "test_parser"
         generate_parser("test", filename=file)
         adtl.validate_specification(f"{file}.toml")
+
+    @pytest.mark.medium
+    def test_preset_without_hard_coded_fields(self, tmp_path):
+        """
+        Check a preset parser can be generated when the preset doesn't include the
+        hard-coded `medi_units`/`demog_age_units` fields.
+        """
+        file = tmp_path / "test_parser"
+        generate_parser("test", filename=file, preset="preset_Score_mSOFA")
+        adtl.validate_specification(f"{file}.toml")
+
+    @pytest.mark.medium
+    def test_shared_values(self, tmp_path):
+        """
+        Check sharing the list value maps gives a smaller parser with the same rules
+        once adtl expands the references.
+        """
+        generate_parser("test", filename=tmp_path / "inline")
+        generate_parser("test", filename=tmp_path / "shared", shared_values=True)
+        adtl.validate_specification(str(tmp_path / "shared.toml"))
+
+        parsers = {}
+        for name in ["inline", "shared"]:
+            with open(tmp_path / f"{name}.toml", "rb") as f:
+                parsers[name] = tomllib.load(f)
+        inline, shared = parsers["inline"], parsers["shared"]
+        assert "values_conditions_Comorbidities" in shared["adtl"]["defs"]
+        assert any("ref" in rule.get("value", {}) for rule in shared["long"])
+        assert expand_refs(shared["long"], shared["adtl"]["defs"]) == expand_refs(
+            inline["long"], inline["adtl"]["defs"]
+        )
+        assert (tmp_path / "shared.toml").stat().st_size < (
+            tmp_path / "inline.toml"
+        ).stat().st_size
+
+    @pytest.mark.medium
+    def test_share_list_values_copies_rules(self):
+        """Check only matching value maps are replaced, without modifying the rules."""
+        values = {"1": "Option A", "2": "Option B"}
+        defs = {"values_test_List": {"values": dict(values)}}
+        rules = [
+            {"attribute": "var", "value": {"field": "var", "values": values}},
+            {"attribute": "var", "value": {"field": "var", "values": {"1": "Other"}}},
+        ]
+        shared = share_list_values(rules, "test_List", defs)
+        assert shared[0]["value"] == {"field": "var", "ref": "values_test_List"}
+        assert shared[1] is rules[1]
+        assert rules[0]["value"]["values"] is values
+
+
+class TestAllPresetsGeneration:
+    """Tests for generating the parsers for several presets in one run."""
+
+    presets = [
+        "preset_ARChetype Disease CRF_Covid",
+        "preset_Populations_Pregnancy",
+    ]
+
+    @pytest.mark.medium
+    def test_preset_filename(self):
+        """Check preset names are converted to filenames."""
+        assert (
+            preset_filename("v1.5.0", "preset_ARChetype Disease CRF_Mpox")
+            == "global_arc_v1.5.0_archetype_disease_crf_mpox_parser"
+        )
+
+    @pytest.mark.high
+    def test_matches_single_preset_generation(self, tmp_path):
+        """Check each preset file matches the output of a single-preset run."""
+        timings = generate_all_presets(
+            "test", output_dir=tmp_path, presets=self.presets, max_workers=2
+        )
+        assert list(timings) == self.presets
+
+        for preset in self.presets:
+            file = tmp_path / "single_parser"
+            generate_parser("test", filename=file, preset=preset)
+            generated = tmp_path / f"{preset_filename('test', preset)}.toml"
+            assert generated.read_bytes() == file.with_suffix(".toml").read_bytes()
+
+    @pytest.mark.medium
+    def test_compressed(self, tmp_path):
+        """Check compressed preset files decompress to the uncompressed parser."""
+        preset = self.presets[0]
+        generate_all_presets(
+            "test", output_dir=tmp_path, presets=[preset], compression="xz"
+        )
+        generate_parser("test", filename=tmp_path / "single_parser", preset=preset)
+
+        generated = tmp_path / f"{preset_filename('test', preset)}.toml.xz"
+        expected = (tmp_path / "single_parser.toml").read_bytes()
+        assert lzma.decompress(generated.read_bytes()) == expected
+
+
+class TestIncrementalGeneration:
+    """Tests for regenerating the parser with a per-variable fragment cache."""
+
+    @pytest.mark.high
+    def test_cached_generation_matches(self, tmp_path):
+        """
+        Check a parser generated from the fragment cache after an ARC change matches
+        a parser generated from scratch.
+        """
+        cache_dir = tmp_path / "cache"
+        generate_parser("test", filename=tmp_path / "first", cache_dir=cache_dir)
+        assert any((cache_dir / "parser_fragments").glob("*.json"))
+
+        arc = pd.read_csv("ARC.csv")
+        arc.loc[arc.Variable == "expo14_ancon_bite", "Answer Options"] = "1, Yes|0, No"
+        arc.loc[arc.Variable == "demog_height", "Form"] = "daily"
+        arc_path = tmp_path / "ARC.csv"
+        arc.to_csv(arc_path, index=False)
+
+        cached = FragmentCache(cache_dir)
+        parser = build_parser("test", arc, fragment_cache=cached)
+        # expo14_ancon_bite and the unit-specific fields of demog_height (_cm, _in)
+        assert cached.misses == 3
+
+        generate_parser("test", arc_path=arc_path, filename=tmp_path / "full")
+        with open(tmp_path / "full.toml", "rb") as f:
+            assert parser == tomllib.load(f)
+
+    @pytest.mark.high
+    def test_cache_invalidated_by_generator_change(self, tmp_path, monkeypatch):
+        """Check cached fragments aren't used after the generator code changes."""
+        cache = FragmentCache(tmp_path)
+        cache.put("key", [{"attribute": "var"}])
+        cache.save()
+        assert "key" in FragmentCache(tmp_path)
+
+        monkeypatch.setattr(
+            "schemas.parser_cache._generator_hash", lambda: "changed_generator"
+        )
+        assert "key" not in FragmentCache(tmp_path)
+
+    @pytest.mark.medium
+    def test_generator_files(self):
+        """Check the modules rules are built with are part of the generator hash."""
+        names = {path.name for path in parser_cache.GENERATOR_FILES}
+        assert {"draft_parser.py", "list_cache.py", "toml_writer.py"} <= names
+        assert all(path.exists() for path in parser_cache.GENERATOR_FILES)
+
+    @pytest.mark.medium
+    def test_fragments_written_on_put(self, tmp_path):
+        """Check fragments are written straight away, and the oldest dropped on save."""
+        cache = FragmentCache(tmp_path, max_entries=2)
+        for i in range(3):
+            cache.put(f"key_{i}", [{"attribute": f"var_{i}"}])
+            assert f"key_{i}" in FragmentCache(tmp_path)
+        for i in range(3):
+            os.utime(cache._fragment_path(f"key_{i}"), ns=(i, i))
+        # use the first fragment, so the second is the least recently used
+        assert cache.get("key_0") == [{"attribute": "var_0"}]
+
+        cache.save()
+        assert len(cache) == 2
+        assert "key_0" in cache
+        assert cache.hits == 1
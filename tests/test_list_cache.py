@@ -0,0 +1,117 @@
+"""
+Unit tests for the shared list file cache.
+"""
+
+import os
+import pathlib
+
+import pandas as pd
+import pytest
+
+from schemas.list_cache import ListCache, list_path
+
+LIST_FILES = sorted(x for x in pathlib.Path("Lists").rglob("*.csv"))
+LIST_NAMES = [f"{f.parent.stem}_{f.stem}" for f in LIST_FILES]
+
+
+def read_list_file_pandas(list_name, selected=False, preset=None):
+    """Reference implementation reading the list file with pandas on every call."""
+    df = pd.read_csv(list_path(list_name))
+    if preset and preset in df.columns:
+        df = df[df[preset] == 1]
+    elif selected:
+        df = df[(df["Selected"] == 1) | (df["Selected"] == "1")]
+    value_dict = pd.Series(df.iloc[:, 0].to_list(), index=df["Value"]).to_dict()
+    return {str(k): v.rstrip(" ") for k, v in value_dict.items()}
+
+
+@pytest.fixture
+def list_root(tmp_path):
+    (tmp_path / "test").mkdir()
+    (tmp_path / "test" / "Colours.csv").write_text(
+        "Colour,Selected,preset_Bright,Value\nRed ,1,1,1\nGrey,,,2\nYellow,1,1,3\n"
+    )
+    (tmp_path / "test" / "Shapes.csv").write_text("Shape,Selected,Value\nSquare,1,1\n")
+    return tmp_path
+
+
+@pytest.mark.high
+@pytest.mark.parametrize("list_name", LIST_NAMES)
+def test_matches_pandas_reader(list_name):
+    """Check every view of every list file matches a direct pandas read."""
+    table = ListCache().get(list_name)
+    presets = [c for c in table.presets if c.startswith("preset_")]
+
+    assert table.as_dict() == read_list_file_pandas(list_name)
+    assert table.as_dict(selected=True) == read_list_file_pandas(
+        list_name, selected=True
+    )
+    for preset in presets + ["preset_not_a_column"]:
+        assert table.as_dict(selected=True, preset=preset) == read_list_file_pandas(
+            list_name, selected=True, preset=preset
+        )
+
+
+class TestListCache:
+    """Tests for the ListCache class."""
+
+    @pytest.mark.medium
+    def test_file_read_once(self, list_root):
+        """Check repeated lookups are served from the cache."""
+        cache = ListCache(root=list_root)
+        first = cache.get("test_Colours")
+        assert cache.get("test_Colours") is first
+        assert cache.reads == 1
+        assert cache.hits == 1
+
+    @pytest.mark.medium
+    def test_views(self, list_root):
+        """Check the selected and preset views."""
+        table = ListCache(root=list_root).get("test_Colours")
+        assert table.as_dict() == {"1": "Red", "2": "Grey", "3": "Yellow"}
+        assert table.as_dict(selected=True) == {"1": "Red", "3": "Yellow"}
+        assert table.as_dict(preset="preset_Bright") == {"1": "Red", "3": "Yellow"}
+        assert table.enums == ("Red", "Grey", "Yellow")
+
+    @pytest.mark.medium
+    def test_returned_dicts_are_independent(self, list_root):
+        """Check mutating a returned dict doesn't affect the cache."""
+        table = ListCache(root=list_root).get("test_Colours")
+        table.as_dict()["4"] = "Blue"
+        assert "4" not in table.as_dict()
+
+    @pytest.mark.high
+    def test_invalidated_on_change(self, list_root):
+        """Check a modified file is re-read."""
+        cache = ListCache(root=list_root)
+        assert cache.get("test_Shapes").as_dict() == {"1": "Square"}
+
+        path = list_root / "test" / "Shapes.csv"
+        path.write_text("Shape,Selected,Value\nSquare,1,1\nCircle,1,2\n")
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        assert cache.get("test_Shapes").as_dict() == {"1": "Square", "2": "Circle"}
+        assert cache.reads == 2
+
+    @pytest.mark.medium
+    def test_touched_but_unchanged_file_keeps_table(self, list_root):
+        """Check a file with a new mtime but the same content keeps its table."""
+        cache = ListCache(root=list_root)
+        first = cache.get("test_Shapes")
+
+        path = list_root / "test" / "Shapes.csv"
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        assert cache.get("test_Shapes") is first
+
+    @pytest.mark.medium
+    def test_lru_eviction(self, list_root):
+        """Check the least recently used table is evicted above maxsize."""
+        cache = ListCache(root=list_root, maxsize=1)
+        cache.get("test_Colours")
+        cache.get("test_Shapes")
+        assert len(cache) == 1
+        assert "test_Shapes" in cache
+        assert "test_Colours" not in cache
@@ -0,0 +1,66 @@
+"""
+Unit tests for the precompiled binary parser artifact.
+"""
+
+import gzip
+import shutil
+import tomllib
+
+import pytest
+
+from schemas.draft_parser import generate_parser
+from schemas.parser_artifact import artifact_path, compile_parser, load_parser
+
+SHIPPED_PARSER = "schemas/global_arc_v1.5.0_parser.toml"
+
+
+@pytest.fixture
+def parser_path(tmp_path):
+    path = tmp_path / "parser.toml"
+    shutil.copy(SHIPPED_PARSER, path)
+    return path
+
+
+@pytest.mark.high
+def test_matches_toml(parser_path, monkeypatch):
+    """Check the artifact loads to the same parser as the TOML, without parsing it."""
+    with open(parser_path, "rb") as f:
+        expected = tomllib.load(f)
+    assert compile_parser(parser_path) == artifact_path(parser_path)
+
+    monkeypatch.setattr("schemas.parser_artifact._parse_toml", None)
+    assert load_parser(parser_path) == expected
+
+
+@pytest.mark.high
+def test_stale_artifact_ignored(parser_path):
+    """Check the TOML is parsed if it changed since the artifact was compiled."""
+    compile_parser(parser_path)
+    toml = parser_path.read_text().replace('name = "ARC-isaric"', 'name = "edited"')
+    parser_path.write_text(toml)
+
+    assert load_parser(parser_path)["adtl"]["name"] == "edited"
+
+
+@pytest.mark.medium
+def test_compressed(parser_path):
+    """Check artifacts can be compiled from, and fall back to, compressed parsers."""
+    with open(parser_path, "rb") as f:
+        expected = tomllib.load(f)
+    compressed = parser_path.with_name("parser.toml.gz")
+    compressed.write_bytes(gzip.compress(parser_path.read_bytes()))
+
+    assert load_parser(compressed) == expected
+    compile_parser(compressed)
+    assert load_parser(compressed) == expected
+
+
+@pytest.mark.medium
+def test_generate_parser_artifact(tmp_path):
+    """Check `generate_parser` writes an artifact matching the parser it writes."""
+    generate_parser("test", filename=str(tmp_path / "parser"), artifact=True)
+    with open(tmp_path / "parser.toml", "rb") as f:
+        expected = tomllib.load(f)
+
+    assert (tmp_path / "parser.toml.pkl").exists()
+    assert load_parser(tmp_path / "parser.toml") == expected
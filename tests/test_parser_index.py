@@ -0,0 +1,83 @@
+"""
+Unit tests for the lazy, attribute-indexed parser reader.
+"""
+
+import os
+import shutil
+import tomllib
+
+import pytest
+
+from schemas import toml_writer
+from schemas.parser_index import LazyParser
+
+SHIPPED_PARSER = "schemas/global_arc_v1.5.0_parser.toml"
+
+
+@pytest.fixture
+def parser_path(tmp_path):
+    path = tmp_path / "parser.toml"
+    shutil.copy(SHIPPED_PARSER, path)
+    return path
+
+
+def rules_by_attribute(parser):
+    rules = {}
+    for rule in parser["long"]:
+        rules.setdefault(rule["attribute"], []).append(rule)
+    return rules
+
+
+@pytest.mark.high
+def test_matches_full_parse(parser_path):
+    """Check every attribute's rules, and the header, match a full parse."""
+    with open(parser_path, "rb") as f:
+        full = tomllib.load(f)
+    expected = rules_by_attribute(full)
+
+    lazy = LazyParser(parser_path)
+    assert lazy.attributes == list(expected)
+    for attribute, rules in expected.items():
+        assert lazy.rules(attribute) == rules
+    assert lazy.header() == {"adtl": full["adtl"], "core": full["core"]}
+
+
+@pytest.mark.medium
+def test_index_cached(parser_path):
+    """Check the index is written next to the parser and reused."""
+    LazyParser(parser_path)
+    index_path = parser_path.with_name("parser.toml.index.json")
+    assert index_path.exists()
+
+    index_path.write_text(index_path.read_text().replace("inclu_disease", "cached"))
+    assert "cached" in LazyParser(parser_path)
+
+
+@pytest.mark.high
+def test_index_rebuilt_on_change(parser_path):
+    """Check a changed parser file is re-indexed."""
+    LazyParser(parser_path)
+    values = {str(i): f"Option {i}" for i in range(20)}
+    parser = {"long": [{"attribute": "only_var", "value": {"values": values}}]}
+    parser_path.write_text(toml_writer.dumps(parser))
+    stat = parser_path.stat()
+    os.utime(parser_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    lazy = LazyParser(parser_path)
+    assert lazy.attributes == ["only_var"]
+    assert lazy.rules("only_var") == parser["long"]
+
+
+@pytest.mark.medium
+def test_unwritable_index(parser_path):
+    """Check the reader works without writing the index."""
+    lazy = LazyParser(parser_path, write_index=False)
+    assert lazy.rules("demog_height_cm")[0]["attribute_unit"] == "cm"
+    assert not parser_path.with_name("parser.toml.index.json").exists()
+
+
+@pytest.mark.medium
+def test_unknown_attribute(parser_path):
+    """Check an attribute without rules raises a KeyError."""
+    with pytest.raises(KeyError, match="not_a_var"):
+        LazyParser(parser_path).rules("not_a_var")
@@ -0,0 +1,89 @@
+"""
+Tests for the generation profiling hooks.
+"""
+
+import json
+import time
+import tomllib
+import pytest
+
+from schemas.draft_parser import generate_parser
+from schemas.isaric_schema import generate_long_schema
+from schemas.profiling import NULL_PROFILER, Profiler
+
+
+class TestProfiler:
+    """Tests for the Profiler class."""
+
+    @pytest.mark.low
+    def test_nested_stages_are_exclusive(self):
+        """Check an outer stage isn't credited with the time of nested stages."""
+        profiler = Profiler()
+        with profiler.stage("outer"):
+            with profiler.stage("inner"):
+                time.sleep(0.05)
+        assert profiler.stages["inner"] >= 0.05
+        assert profiler.stages["outer"] < 0.05
+
+    @pytest.mark.low
+    def test_repeated_stages_accumulate(self):
+        """Check the times and counts of a repeated stage are summed."""
+        profiler = Profiler()
+        for _ in range(3):
+            with profiler.stage("build"):
+                profiler.count("rules", 2)
+        report = profiler.report()
+        assert list(report["stages_s"]) == ["build"]
+        assert report["counters"] == {"rules": 6}
+        json.dumps(report)
+
+    @pytest.mark.low
+    def test_null_profiler_records_nothing(self):
+        """Check the default profiler ignores stages and counts."""
+        with NULL_PROFILER.stage("build"):
+            NULL_PROFILER.count("rules")
+        assert NULL_PROFILER.stages == {}
+        assert NULL_PROFILER.counters == {}
+
+
+@pytest.mark.low
+def test_generate_parser_profile(tmp_path):
+    """Check the parser profile covers each stage and counts every long rule."""
+    reports = []
+    generate_parser(
+        "test",
+        filename=str(tmp_path / "parser"),
+        profile=reports.append,
+    )
+    (report,) = reports
+    with open(tmp_path / "parser.toml", "rb") as f:
+        parser = tomllib.load(f)
+
+    assert {"load_arc", "core_table", "attrs_with_units", "toml_dump"} <= set(
+        report["stages_s"]
+    )
+    rule_counts = {
+        k: v for k, v in report["counters"].items() if k.startswith("rules.")
+    }
+    assert sum(rule_counts.values()) == len(parser["long"])
+    assert (
+        report["counters"]["bytes_written"] == (tmp_path / "parser.toml").stat().st_size
+    )
+
+
+@pytest.mark.low
+def test_generate_long_schema_profile(tmp_path):
+    """Check the schema profile times each rule function and counts its rules."""
+    reports = []
+    output_path = tmp_path / "schema.json"
+    generate_long_schema("test", output_path=output_path, profile=reports.append)
+    (report,) = reports
+    with open(output_path) as f:
+        schema = json.load(f)
+
+    assert {"load_arc", "attrs_with_enums", "json_dump"} <= set(report["stages_s"])
+    rule_counts = {
+        k: v for k, v in report["counters"].items() if k.startswith("rules.")
+    }
+    assert sum(rule_counts.values()) == len(schema["oneOf"])
+    assert report["counters"]["bytes_written"] == output_path.stat().st_size
@@ -0,0 +1,121 @@
+"""
+Tests for the rule-level long schema diff.
+"""
+
+import json
+
+import pandas as pd
+import pytest
+
+from schemas.isaric_schema import generate_long_schema
+from schemas.schema_diff import (
+    SchemaDiff,
+    constraints,
+    diff_arc,
+    diff_schema_files,
+    diff_schemas,
+)
+
+
+@pytest.mark.high
+def test_diff_released_versions():
+    """Check the changed answer options between v1.4.0 and v1.5.0 are found."""
+    diff = diff_schema_files(
+        "schemas/arc_v1.4.0_isaric_long.schema.json",
+        "schemas/arc_v1.5.0_isaric_long.schema.json",
+    )
+    assert diff.changed_attributes == {"comor_orgtrans_organ", "expo14_house_sys"}
+    change = diff.changed["comor_orgtrans_organ"]["changed"]["/properties/value/enum"]
+    assert change["added"] == ["Cornea", "Other"]
+    assert change["removed"] == []
+    json.dumps(diff.to_dict())
+
+
+@pytest.mark.high
+def test_same_rules_in_other_forms(tmp_path):
+    """Check the dispatched schema with shared enums has the same rules as the oneOf."""
+    generate_long_schema(
+        "test",
+        output_path=tmp_path / "schema.json",
+        dispatch=True,
+        shared_enums=True,
+    )
+    diff = diff_schema_files(
+        "schemas/arc_v1.5.0_isaric_long.schema.json", tmp_path / "schema.json"
+    )
+    assert diff == SchemaDiff()
+
+
+@pytest.mark.medium
+def test_added_removed_and_base_changes():
+    """Check added and removed attributes, and changes to the shared properties."""
+    base = {"type": "object", "properties": {"attribute": {"type": "string"}}}
+    old = {
+        **base,
+        "oneOf": [
+            {"properties": {"attribute": {"enum": ["a", "b"]}}, "required": ["x"]}
+        ],
+    }
+    new = {
+        **base,
+        "oneOf": [
+            {"properties": {"attribute": {"const": "a"}}, "required": ["x"]},
+            {"properties": {"attribute": {"const": "c"}, "x": {"minimum": 1}}},
+        ],
+    }
+    diff = diff_schemas(old, new)
+    assert diff.added == {"c": {"/properties/x/minimum": 1}}
+    assert diff.removed == {"b": {"/required": ["x"]}}
+    assert diff.changed == {}
+    assert diff.base == {}
+
+    attributes = pd.Series(["a", "b", "c", "d"])
+    assert diff.needs_revalidation(attributes).to_list() == [False, True, True, False]
+
+    new["properties"] = {**base["properties"], "value": {"type": "string"}}
+    diff = diff_schemas(old, new)
+    assert diff.base == {"added": {"/properties/value/type": "string"}}
+    assert diff.needs_revalidation(attributes).all()
+
+
+@pytest.mark.medium
+def test_diff_arc(tmp_path):
+    """Check a changed ARC maximum is found for only that attribute."""
+    arc = pd.read_csv("ARC.csv")
+    arc.loc[arc["Variable"] == "readm_prev_num", "Maximum"] = 60
+    arc.to_csv(tmp_path / "ARC.csv", index=False)
+
+    diff = diff_arc("ARC.csv", tmp_path / "ARC.csv")
+    assert diff.changed == {
+        "readm_prev_num": {
+            "changed": {"/properties/value_num/maximum": {"old": 50.0, "new": 60.0}}
+        }
+    }
+
+
+@pytest.mark.medium
+def test_constraints_skip_annotations():
+    """Check descriptions and empty objects aren't constraints."""
+    schema = {
+        "description": "A row",
+        "properties": {"value": {"type": "string", "description": "The value"}},
+        "if": {},
+    }
+    assert constraints(schema) == {"/properties/value/type": "string"}
+
+
+@pytest.mark.medium
+def test_constraints_keep_annotation_named_properties():
+    """Check properties named like annotations are kept, but their annotations aren't."""
+    schema = {
+        "properties": {
+            "title": {"type": "string", "title": "Title"},
+            "description": {"type": "string", "description": "A description"},
+        },
+        "definitions": {"title": {"enum": ["a"]}},
+    }
+    assert constraints(schema) == {
+        "/properties/title/type": "string",
+        "/properties/description/type": "string",
+        "/definitions/title/enum": ["a"],
+    }
@@ -1,5 +1,14 @@
+import json
+
+import jsonschema
 import pytest
-from schemas.isaric_schema import generate_long_schema
+from schemas import isaric_schema
+from schemas.isaric_schema import (
+    dispatch_on_attribute,
+    generate_long_schema,
+    long_schema_validator,
+    share_enums,
+)
 
 
 @pytest.mark.critical
@@ -8,3 +17,164 @@ def test_generate_long_schema_runs(tmp_path):
     output = tmp_path / "arc_test_isaric_long.schema.json"
     generate_long_schema("test", output_path=output)
     assert output.exists()
+
+
+def example_rows(rule):
+    """A valid row for each attribute of `rule`, and invalid variants of it."""
+    name = rule["properties"]["attribute"]
+    properties = rule["properties"]
+    for attribute in [name["const"]] if "const" in name else name["enum"]:
+        row = {
+            "subjid": "1",
+            "dataset_id": "test",
+            "phase": "presentation",
+            "attribute": attribute,
+            "attribute_status": "VAL",
+        }
+        if "value" in properties:
+            row["value"] = properties["value"].get("enum", ["text"])[0]
+        if "value_num" in properties:
+            row["value_num"] = properties["value_num"].get("minimum", 1)
+        if "attribute_unit" in properties:
+            row["attribute_unit"] = properties["attribute_unit"].get("const", "unit")
+        yield row
+        yield {k: v for k, v in row.items() if k not in ["value", "value_num"]}
+        yield {**row, "value": "not an option", "value_num": "not a number"}
+        yield {**row, "attribute": attribute + "_unknown"}
+
+
+@pytest.mark.high
+def test_dispatch_matches_one_of(tmp_path):
+    """Check the attribute-dispatched schema accepts the same rows as the oneOf."""
+    generate_long_schema("test", output_path=tmp_path / "one_of.json")
+    generate_long_schema("test", output_path=tmp_path / "dispatch.json", dispatch=True)
+    with open(tmp_path / "one_of.json") as f:
+        one_of = json.load(f)
+    with open(tmp_path / "dispatch.json") as f:
+        dispatch = json.load(f)
+    assert "oneOf" not in dispatch
+
+    one_of_validator = jsonschema.Draft7Validator(one_of)
+    dispatch_validator = jsonschema.Draft7Validator(dispatch)
+    # A sample of the rules, as validating against the oneOf is slow
+    for rule in one_of["oneOf"][::20]:
+        for row in example_rows(rule):
+            assert dispatch_validator.is_valid(row) == one_of_validator.is_valid(row)
+
+
+@pytest.mark.medium
+def test_dispatch_duplicate_attributes():
+    """Check attributes with more than one rule can't be dispatched on."""
+    rules = [
+        {"properties": {"attribute": {"const": "demog_sex"}}},
+        {"properties": {"attribute": {"enum": ["demog_age", "demog_sex"]}}},
+    ]
+    with pytest.raises(ValueError, match="'demog_sex'"):
+        dispatch_on_attribute(rules)
+
+
+@pytest.mark.high
+def test_shared_enums_match_inline(tmp_path):
+    """Check the schema with shared, compact enums accepts the same rows."""
+    generate_long_schema("test", output_path=tmp_path / "inline.json")
+    generate_long_schema(
+        "test",
+        output_path=tmp_path / "shared.json",
+        shared_enums=True,
+        compact=True,
+    )
+    with open(tmp_path / "inline.json") as f:
+        inline = json.load(f)
+    with open(tmp_path / "shared.json") as f:
+        shared = json.load(f)
+    assert "\n" not in (tmp_path / "shared.json").read_text()
+    assert shared["definitions"]
+    jsonschema.Draft7Validator.check_schema(shared)
+
+    inline_validator = jsonschema.Draft7Validator(inline)
+    shared_validator = jsonschema.Draft7Validator(shared)
+    for rule in inline["oneOf"][::20]:
+        for row in example_rows(rule):
+            assert shared_validator.is_valid(row) == inline_validator.is_valid(row)
+
+
+@pytest.mark.medium
+def test_share_enums_only_repeated():
+    """Check only enums used by more than one rule are shared."""
+    yes_no = {"type": "string", "enum": ["Yes", "No"]}
+    rules = [
+        {"properties": {"attribute": {"enum": ["a", "b"]}, "value": yes_no}},
+        {"properties": {"attribute": {"const": "c"}, "value": dict(yes_no)}},
+        {"properties": {"attribute": {"const": "d"}, "value": {"enum": ["x"]}}},
+    ]
+    shared, definitions = share_enums(rules)
+    assert definitions == {"values_a": yes_no}
+    assert [rule["properties"]["value"] for rule in shared] == [
+        {"$ref": "#/definitions/values_a"},
+        {"$ref": "#/definitions/values_a"},
+        {"enum": ["x"]},
+    ]
+    assert rules[0]["properties"]["value"] is yes_no
+
+
+class TestLongSchemaValidator:
+    """Tests for the per-attribute long schema validator."""
+
+    @pytest.fixture(autouse=True)
+    def no_cached_validators(self, monkeypatch):
+        monkeypatch.setattr(isaric_schema, "_validators", {})
+
+    @pytest.mark.high
+    @pytest.mark.parametrize(
+        "dispatch, shared_enums", [(False, False), (True, False), (False, True)]
+    )
+    def test_matches_full_schema(self, tmp_path, dispatch, shared_enums):
+        """Check rows are accepted exactly when they match the whole schema."""
+        schema_path = tmp_path / "schema.json"
+        generate_long_schema(
+            "test",
+            output_path=schema_path,
+            dispatch=dispatch,
+            shared_enums=shared_enums,
+        )
+        with open(schema_path) as f:
+            schema = json.load(f)
+        with open("schemas/arc_v1.5.0_isaric_long.schema.json") as f:
+            rules = json.load(f)["oneOf"]
+
+        validator = long_schema_validator("test", schema_path=schema_path)
+        full_validator = jsonschema.Draft7Validator(schema)
+        for rule in rules[::20]:
+            for row in example_rows(rule):
+                assert validator.is_valid(row) == full_validator.is_valid(row)
+                assert validator.is_valid(row) == (
+                    next(validator.iter_errors(row), None) is None
+                )
+
+    @pytest.mark.medium
+    def test_cached_on_disk(self, tmp_path, monkeypatch):
+        """Check a second run uses the cached validator, without checking the schema."""
+        validator = long_schema_validator("v1.5.0", cache_dir=tmp_path)
+        (cache_file,) = tmp_path.glob("long_schema_*.json")
+
+        monkeypatch.setattr(isaric_schema, "_validators", {})
+        monkeypatch.setattr(jsonschema.Draft7Validator, "check_schema", pytest.fail)
+        cached = long_schema_validator("v1.5.0", cache_dir=tmp_path)
+        assert cached is not validator
+        assert cached.attributes == validator.attributes
+        assert long_schema_validator("v1.5.0", cache_dir=tmp_path) is cached
+
+    @pytest.mark.medium
+    def test_unknown_attribute(self):
+        """Check rows for attributes without a rule are invalid."""
+        validator = long_schema_validator("v1.5.0")
+        row = {
+            "subjid": "1",
+            "dataset_id": "test",
+            "phase": "presentation",
+            "attribute": "not_an_attribute",
+            "attribute_status": "VAL",
+        }
+        assert not validator.is_valid(row)
+        with pytest.raises(jsonschema.ValidationError, match="not_an_attribute"):
+            validator.validate(row)
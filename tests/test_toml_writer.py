@@ -0,0 +1,337 @@
+"""
+Unit tests for the TOML writer.
+"""
+
+import gzip
+import io
+import json
+import lzma
+import pathlib
+import tomllib
+from collections import OrderedDict, defaultdict
+
+import pytest
+
+from schemas import toml_writer
+
+SHIPPED_PARSERS = sorted(pathlib.Path("schemas").glob("global_arc_*_parser.toml"))
+
+LONG_RULES = [
+    {
+        "attribute": f"var_{i}",
+        "value": {"field": f"var_{i}", "values": {"1": "Yes", "2": "No"}},
+        "attribute_status": {
+            "field": f"var_{i}",
+            "apply": {"function": "attribute_status_fill"},
+        },
+        "ref": "presentation",
+    }
+    for i in range(5)
+]
+
+
+class TestStreamedArrayOfTables:
+    """Tests for writing an array of tables from an iterator."""
+
+    @pytest.mark.high
+    def test_matches_list(self):
+        """Check a generator renders identically to the equivalent list."""
+        expected = toml_writer.dumps({"adtl": {"name": "test"}, "long": LONG_RULES})
+        streamed = toml_writer.dumps(
+            {"adtl": {"name": "test"}, "long": (rule for rule in LONG_RULES)}
+        )
+        assert streamed == expected
+        assert tomllib.loads(streamed)["long"] == LONG_RULES
+
+    @pytest.mark.medium
+    def test_empty_stream(self):
+        """Check an empty generator is written as an empty array, like an empty list."""
+        expected = toml_writer.dumps({"adtl": {"name": "test"}, "long": []})
+        streamed = toml_writer.dumps({"adtl": {"name": "test"}, "long": iter([])})
+        assert streamed == expected
+        assert tomllib.loads(streamed)["long"] == []
+
+    @pytest.mark.medium
+    def test_freed_tables(self):
+        """
+        Check tables which are freed after rendering (so their ids can be reused)
+        render correctly.
+        """
+
+        def rules():
+            for rule in LONG_RULES:
+                # new objects each time, dropped once rendered
+                yield {
+                    k: (v.copy() if isinstance(v, dict) else v) for k, v in rule.items()
+                }
+
+        streamed = toml_writer.dumps({"long": rules()})
+        assert tomllib.loads(streamed)["long"] == LONG_RULES
+
+
+def format_string_reference(s, *, allow_multiline):
+    """The original character-by-character escaping, from tomli-w."""
+    do_multiline = allow_multiline and "\n" in s
+    if do_multiline:
+        result = '"""\n'
+        s = s.replace("\r\n", "\n")
+    else:
+        result = '"'
+
+    pos = seq_start = 0
+    while True:
+        try:
+            char = s[pos]
+        except IndexError:
+            result += s[seq_start:pos]
+            if do_multiline:
+                return result + '"""'
+            return result + '"'
+        if char in toml_writer.ILLEGAL_BASIC_STR_CHARS:
+            result += s[seq_start:pos]
+            if char in toml_writer.COMPACT_ESCAPES:
+                if do_multiline and char == "\n":
+                    result += "\n"
+                else:
+                    result += toml_writer.COMPACT_ESCAPES[char]
+            else:
+                result += "\\u" + hex(ord(char))[2:].rjust(4, "0")
+            seq_start = pos + 1
+        pos += 1
+
+
+class TestFormatString:
+    """Tests for string escaping."""
+
+    STRINGS = [
+        "",
+        "plain text",
+        'Say "yes" \\ no',
+        "".join(chr(i) for i in range(128)),
+        "line one\r\nline two\n\ttabbed\x7f",
+        "Côte d’Ivoire – ✓",
+    ]
+
+    @pytest.mark.high
+    @pytest.mark.parametrize("allow_multiline", [False, True])
+    @pytest.mark.parametrize("s", STRINGS)
+    def test_matches_reference(self, s, allow_multiline):
+        """Check escaping matches the original implementation."""
+        assert toml_writer.format_string(
+            s, allow_multiline=allow_multiline
+        ) == format_string_reference(s, allow_multiline=allow_multiline)
+
+    @pytest.mark.high
+    @pytest.mark.parametrize("path", SHIPPED_PARSERS, ids=lambda p: p.name)
+    def test_shipped_parsers_round_trip(self, path):
+        """Check re-dumping a shipped parser reproduces it byte for byte."""
+        with open(path, "rb") as f:
+            parser = tomllib.load(f)
+        assert toml_writer.dumps(parser) == path.read_text()
+
+
+def nested_tables(obj):
+    """Every dictionary and list within `obj`, including itself."""
+    if isinstance(obj, (dict, list)):
+        yield obj
+        for v in obj.values() if isinstance(obj, dict) else obj:
+            yield from nested_tables(v)
+
+
+class TestJsonLength:
+    """Tests for the bounded JSON length estimate used to decide table layout."""
+
+    VALUES = [
+        {},
+        [],
+        {"a": 1, "b": [1, 2.5, None, True, False], "c": {"d": "e"}},
+        {1: "int key", 2.5: "float key", None: "null key"},
+        {True: "bool key", False: "false key"},
+        {"escapes": '"quoted" \\ \n\t\x00\x7f', "unicode": "Côte d’Ivoire 😷"},
+        [[], {}, [{}], float("nan"), float("inf")],
+    ]
+
+    @pytest.mark.medium
+    @pytest.mark.parametrize("obj", VALUES)
+    def test_exact_below_limit(self, obj):
+        """Check the length is exact when within the limit."""
+        assert toml_writer.json_length(obj, 1000) == len(json.dumps(obj))
+
+    @pytest.mark.medium
+    @pytest.mark.parametrize("limit", [0, 1, 5, 20, 50])
+    @pytest.mark.parametrize("obj", VALUES)
+    def test_exceeds_limit(self, obj, limit):
+        """Check the length is only above the limit when json.dumps is too."""
+        assert (toml_writer.json_length(obj, limit) > limit) == (
+            len(json.dumps(obj)) > limit
+        )
+
+    @pytest.mark.high
+    @pytest.mark.parametrize("path", SHIPPED_PARSERS, ids=lambda p: p.name)
+    def test_shipped_parsers(self, path):
+        """Check every table in the shipped parsers is laid out as with json.dumps."""
+        with open(path, "rb") as f:
+            parser = tomllib.load(f)
+        limit = toml_writer.MAX_LINE_LENGTH
+        for obj in nested_tables(parser):
+            assert (toml_writer.json_length(obj, limit) > limit) == (
+                len(json.dumps(obj)) > limit
+            )
+
+
+class TestInlineTableCache:
+    """Tests for the inline table rendering cache."""
+
+    def render(self, table, maxsize=toml_writer.INLINE_TABLE_CACHE_SIZE):
+        ctx = toml_writer.Context(False, toml_writer.InlineTableCache.new(maxsize), {})
+        return "".join(toml_writer.gen_table_chunks(table, ctx, name="")), ctx
+
+    @pytest.mark.medium
+    def test_identical_tables_rendered_once(self):
+        """Check equal tables in different objects share one cache entry."""
+        table = {
+            "rules": [
+                {"apply": {"function": "attribute_status_fill"}} for _ in range(50)
+            ]
+        }
+        rendered, ctx = self.render(table)
+        assert len(ctx.inline_table_cache.by_content) == 1
+        assert tomllib.loads(rendered) == table
+
+    @pytest.mark.medium
+    def test_values_of_different_types_not_shared(self):
+        """Check tables which compare equal but render differently aren't shared."""
+        table = {"a": {"x": True}, "b": {"x": 1}, "c": {"x": 1.0}}
+        rendered, _ = self.render(table)
+        assert rendered == "a = { x = true }\nb = { x = 1 }\nc = { x = 1.0 }\n"
+
+    @pytest.mark.medium
+    def test_nested_dict_subclasses(self):
+        """Check tables containing dict subclasses are rendered, not cached by content."""
+        nested = defaultdict(list, {"y": 2})
+        table = {"a": {"b": OrderedDict(x=1)}, "c": {"d": nested}}
+        rendered, _ = self.render(table)
+        assert rendered == "a = { b = { x = 1 } }\nc = { d = { y = 2 } }\n"
+        assert toml_writer.dumps({"a": {"b": OrderedDict(x=1)}}) == (
+            "a = { b = { x = 1 } }\n"
+        )
+
+    @pytest.mark.medium
+    def test_size_cap(self):
+        """Check the cache is bounded and output is unaffected by evictions."""
+        table = {"rules": [{"value": {"n": i % 5}} for i in range(20)]}
+        rendered, ctx = self.render(table, maxsize=2)
+        assert len(ctx.inline_table_cache.by_content) <= 2
+        assert len(ctx.inline_table_cache.by_id) <= 2
+        assert rendered == self.render(table)[0]
+        assert tomllib.loads(rendered) == table
+
+
+class CountingWriter(io.BytesIO):
+    """Binary file which counts calls to `write`."""
+
+    writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+class TestDump:
+    """Tests for writing TOML to a file."""
+
+    TABLE = {"adtl": {"name": "test"}, "long": LONG_RULES}
+
+    @pytest.mark.high
+    @pytest.mark.parametrize("buffer_size", [1, 100, toml_writer.DEFAULT_BUFFER_SIZE])
+    def test_buffered_matches_dumps(self, buffer_size):
+        """Check the file contents don't depend on the buffer size."""
+        f = CountingWriter()
+        toml_writer.dump(self.TABLE, f, buffer_size=buffer_size)
+        assert f.getvalue() == toml_writer.dumps(self.TABLE).encode()
+
+    @pytest.mark.medium
+    def test_buffered_writes(self):
+        """Check output is written in one call when it fits in the buffer."""
+        f = CountingWriter()
+        toml_writer.dump(self.TABLE, f)
+        assert f.writes == 1
+
+    @pytest.mark.medium
+    def test_dumps_bytes(self):
+        """Check dumps_bytes is the UTF-8 encoding of dumps."""
+        table = {"label": "Côte d’Ivoire"}
+        assert toml_writer.dumps_bytes(table) == toml_writer.dumps(table).encode()
+
+    @pytest.mark.medium
+    def test_dumps_bytes_buffered(self, monkeypatch):
+        """Check dumps_bytes encodes as it renders, without building the full str."""
+        expected = toml_writer.dumps(self.TABLE).encode()
+
+        def dumps(*args, **kwargs):
+            raise AssertionError("dumps_bytes called dumps")
+
+        monkeypatch.setattr(toml_writer, "dumps", dumps)
+        assert toml_writer.dumps_bytes(self.TABLE) == expected
+
+    @pytest.mark.medium
+    @pytest.mark.parametrize(
+        "compression,decompress", [("gzip", gzip.decompress), ("xz", lzma.decompress)]
+    )
+    def test_compressed(self, compression, decompress):
+        """Check compressed output decompresses to the uncompressed TOML."""
+        f = io.BytesIO()
+        toml_writer.dump(self.TABLE, f, compression=compression)
+        assert decompress(f.getvalue()) == toml_writer.dumps_bytes(self.TABLE)
+        assert not f.closed
+
+    @pytest.mark.medium
+    def test_gzip_reproducible(self):
+        """Check gzip output doesn't include a timestamp."""
+        outputs = set()
+        for _ in range(2):
+            f = io.BytesIO()
+            toml_writer.dump(self.TABLE, f, compression="gzip")
+            outputs.add(f.getvalue())
+        assert len(outputs) == 1
+
+    @pytest.mark.medium
+    def test_unknown_compression(self):
+        """Check an unsupported compression format raises a ValueError."""
+        with pytest.raises(ValueError, match="zip"):
+            toml_writer.dump(self.TABLE, io.BytesIO(), compression="zip")
+
+
+class TestParallelRendering:
+    """Tests for rendering arrays of tables over a process pool."""
+
+    @pytest.fixture(autouse=True)
+    def small_chunks(self, monkeypatch):
+        monkeypatch.setattr(toml_writer, "AOT_CHUNK_SIZE", 2)
+        monkeypatch.setattr(toml_writer, "AOT_MAX_PENDING_CHUNKS", 2)
+
+    @pytest.mark.high
+    def test_matches_serial(self):
+        """Check lists and streamed arrays of tables render as in serial mode."""
+        table = {"adtl": {"name": "test"}, "long": LONG_RULES}
+        expected = toml_writer.dumps(table)
+        assert toml_writer.dumps(table, workers=2) == expected
+        streamed = {"adtl": {"name": "test"}, "long": iter(LONG_RULES)}
+        assert toml_writer.dumps(streamed, workers=2) == expected
+
+    @pytest.mark.medium
+    def test_dump(self):
+        """Check parallel rendering through dump."""
+        table = {"long": LONG_RULES}
+        f = io.BytesIO()
+        toml_writer.dump(table, f, workers=2)
+        assert f.getvalue() == toml_writer.dumps_bytes(table)
+
+    @pytest.mark.high
+    @pytest.mark.parametrize("path", SHIPPED_PARSERS, ids=lambda p: p.name)
+    def test_shipped_parsers(self, path, monkeypatch):
+        """Check the shipped parsers are reproduced byte for byte."""
+        monkeypatch.setattr(toml_writer, "AOT_CHUNK_SIZE", 100)
+        with open(path, "rb") as f:
+            parser = tomllib.load(f)
+        assert toml_writer.dumps(parser, workers=2) == path.read_text()
@@ -1,9 +1,12 @@
+import json
 import pathlib
+import pickle
 import pytest
 import pandas as pd
 import numpy as np
 
-from units.utils import ConversionRegistry, UnitConverter
+import units.utils
+from units.utils import ConversionRegistry, UnitConverter, default_registry
 
 BASE_DIR = pathlib.Path(".")
 UNITS_DIR = pathlib.Path("units")
@@ -367,3 +370,88 @@ def test_valid_conversions_for_min_max():
             "Max values for unit-specific variables are not consistent with "
             f"the conversion functions for {invalid_max}. Fix ARC or conversion JSON."
         )
+
+
+@pytest.mark.high
+def test_registry_snapshot_matches_json(tmp_path):
+    """
+    The registry loaded from a cached snapshot must match the one validated and
+    loaded from the unit conversion JSON.
+    """
+    expected = ConversionRegistry().load_from_json(UNITS_PATH, SCHEMA_PATH)
+    first = ConversionRegistry().load_from_json_cached(
+        UNITS_PATH, SCHEMA_PATH, cache_dir=tmp_path
+    )
+    assert len(list(tmp_path.glob("unit_registry_*.pickle"))) == 1
+
+    cached = ConversionRegistry()
+    # validation is skipped when loading from the snapshot
+    cached.load_and_validate_json = None
+    cached.load_from_json_cached(UNITS_PATH, SCHEMA_PATH, cache_dir=tmp_path)
+
+    assert first.conversion_entries == expected.conversion_entries
+    assert cached.conversion_entries == expected.conversion_entries
+
+
+@pytest.mark.high
+def test_registry_snapshot_invalidated_on_change(tmp_path):
+    """A changed unit conversion JSON must not be served from an old snapshot."""
+    units_path = tmp_path / "unit_conversion.json"
+    units_path.write_text(UNITS_PATH.read_text())
+    ConversionRegistry().load_from_json_cached(
+        units_path, SCHEMA_PATH, cache_dir=tmp_path
+    )
+
+    first_entry = json.loads(UNITS_PATH.read_text())[:1]
+    units_path.write_text(json.dumps(first_entry))
+    registry = ConversionRegistry().load_from_json_cached(
+        units_path, SCHEMA_PATH, cache_dir=tmp_path
+    )
+    assert list(registry.conversion_entries) == [first_entry[0]["field_name"]]
+    # the other snapshot is kept, e.g. for another checkout sharing the cache
+    assert len(list(tmp_path.glob("unit_registry_*.pickle"))) == 2
+
+
+@pytest.mark.high
+def test_registry_snapshot_invalidated_by_format(tmp_path, monkeypatch):
+    """Snapshots written by another version of the registry code must not be used."""
+    ConversionRegistry().load_from_json_cached(
+        UNITS_PATH, SCHEMA_PATH, cache_dir=tmp_path
+    )
+    (old,) = tmp_path.glob("unit_registry_*.pickle")
+    old.write_bytes(pickle.dumps({"stale": None}))
+
+    monkeypatch.setattr(units.utils, "SNAPSHOT_FORMAT", units.utils.SNAPSHOT_FORMAT + 1)
+    registry = ConversionRegistry().load_from_json_cached(
+        UNITS_PATH, SCHEMA_PATH, cache_dir=tmp_path
+    )
+    assert "demog_height" in registry.conversion_entries
+    assert len(list(tmp_path.glob("unit_registry_*.pickle"))) == 2
+
+
+@pytest.mark.high
+def test_default_registry_not_cached_by_default(tmp_path, monkeypatch):
+    """No snapshot is written unless ARC_CACHE_DIR is set."""
+    monkeypatch.delenv("ARC_CACHE_DIR", raising=False)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    default_registry.cache_clear()
+    try:
+        assert "demog_height" in default_registry().conversion_entries
+    finally:
+        default_registry.cache_clear()
+    assert list(tmp_path.rglob("*")) == []
+
+
+@pytest.mark.high
+def test_default_registry_outside_repo_root(tmp_path, monkeypatch):
+    """The default registry must load independently of the working directory."""
+    monkeypatch.setenv("ARC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    default_registry.cache_clear()
+    try:
+        registry = default_registry()
+        assert "demog_height" in registry.conversion_entries
+        assert default_registry() is registry
+    finally:
+        default_registry.cache_clear()
@@ -0,0 +1,177 @@
+"""
+Unit tests for chunked, multi-process validation of long table files.
+"""
+
+import json
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from schemas.frame_validation import long_frame_validator
+from schemas.validate_long import (
+    UNKNOWN_ATTRIBUTE,
+    ValidationReport,
+    read_chunks,
+    validate_long_table,
+)
+from tests.test_schema_generation import example_rows
+
+SCHEMA_PATH = "schemas/arc_v1.5.0_isaric_long.schema.json"
+
+
+@pytest.fixture(scope="module")
+def rows():
+    with open(SCHEMA_PATH) as f:
+        rules = json.load(f)["oneOf"]
+    return [r for rule in rules[::10] for r in example_rows(rule)]
+
+
+@pytest.fixture(scope="module")
+def long_files(rows, tmp_path_factory):
+    directory = tmp_path_factory.mktemp("long")
+    pd.DataFrame(rows).to_csv(directory / "long.csv", index=False)
+    with open(directory / "long.ndjson", "w") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+    return directory
+
+
+@pytest.mark.high
+@pytest.mark.parametrize("filename", ["long.csv", "long.ndjson"])
+def test_matches_frame_validation(rows, long_files, filename):
+    """Check the rows reported invalid are those invalid in the whole table."""
+    report = validate_long_table(
+        long_files / filename, "v1.5.0", chunk_size=100, max_samples=len(rows)
+    )
+    valid = long_frame_validator("v1.5.0").is_valid(pd.DataFrame(rows))
+
+    assert report.rows == len(rows)
+    assert report.invalid_rows == (~valid).sum()
+    assert [s["row"] for s in report.samples] == list(valid.index[~valid])
+
+
+@pytest.mark.high
+def test_workers_match_serial(long_files):
+    """Check validating in parallel gives the same report as validating serially."""
+    path = long_files / "long.csv"
+    serial = validate_long_table(path, "v1.5.0", chunk_size=100, max_samples=5)
+    parallel = validate_long_table(
+        path, "v1.5.0", chunk_size=100, max_samples=5, workers=2
+    )
+    assert parallel.to_dict() == serial.to_dict()
+    assert len(serial.samples) == 5
+
+
+@pytest.fixture(scope="module")
+def valid_rows(rows):
+    valid = long_frame_validator("v1.5.0").is_valid(pd.DataFrame(rows))
+    return [r for r, v in zip(rows, valid) if v]
+
+
+@pytest.mark.high
+@pytest.mark.parametrize("workers", [1, 2])
+def test_all_valid_file(valid_rows, tmp_path, workers):
+    """Check a file with no invalid rows, and so chunks without violations, passes."""
+    path = tmp_path / "long.csv"
+    pd.DataFrame(valid_rows).to_csv(path, index=False)
+    report = validate_long_table(path, "v1.5.0", chunk_size=10, workers=workers)
+    assert report.rows == len(valid_rows)
+    assert report.invalid_rows == 0
+    assert report.counts == {}
+    assert report.samples == []
+
+    result = subprocess.run(
+        [sys.executable, "-m", "schemas.validate_long", path, "--version", "v1.5.0"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0
+    assert json.loads(result.stdout)["invalid_rows"] == 0
+
+
+@pytest.mark.high
+def test_valid_and_invalid_chunks(rows, valid_rows, tmp_path):
+    """Check chunks without violations are counted alongside invalid chunks."""
+    all_rows = valid_rows[:20] + rows[:20] + valid_rows[:20]
+    path = tmp_path / "long.csv"
+    pd.DataFrame(all_rows).to_csv(path, index=False)
+    report = validate_long_table(
+        path, "v1.5.0", chunk_size=10, workers=2, max_samples=len(all_rows)
+    )
+    valid = long_frame_validator("v1.5.0").is_valid(pd.DataFrame(all_rows))
+
+    assert report.rows == len(all_rows)
+    assert report.invalid_rows == (~valid).sum() > 0
+    assert [s["row"] for s in report.samples] == list(valid.index[~valid])
+
+
+@pytest.mark.high
+@pytest.mark.parametrize("content", ["", "subjid,attribute\n"])
+def test_empty_file(tmp_path, content):
+    """Check empty files, with or without a header, have no invalid rows."""
+    path = tmp_path / "long.csv"
+    path.write_text(content)
+    report = validate_long_table(path, "v1.5.0", workers=2)
+    assert report.rows == 0
+    assert report.invalid_rows == 0
+
+
+@pytest.mark.medium
+def test_unknown_attributes_counted_together():
+    """Check the counts don't grow with the number of unknown attributes."""
+    frame = pd.DataFrame(
+        {"attribute": [f"unknown_{i}" for i in range(50)], "value": "x"}
+    )
+    report = ValidationReport()
+    report.add(frame, long_frame_validator("v1.5.0").validate(frame))
+    assert list(report.counts) == [UNKNOWN_ATTRIBUTE]
+    assert report.counts[UNKNOWN_ATTRIBUTE]["attribute"] == 50
+    assert report.invalid_rows == 50
+
+
+@pytest.mark.medium
+def test_report_merge():
+    """Check merged reports sum their counts and keep the earliest samples."""
+    frame = pd.DataFrame({"attribute": ["a", "b"]})
+    violations = pd.DataFrame(
+        {
+            "row": [0, 0, 1],
+            "attribute": ["a", "a", "b"],
+            "field": ["value", "value", None],
+            "check": ["type", "enum", "attribute"],
+        }
+    )
+    report = ValidationReport(max_samples=3)
+    for first_row in [0, 2]:
+        chunk_report = ValidationReport(max_samples=3)
+        chunk_report.add(frame, violations, first_row)
+        report.merge(chunk_report)
+
+    assert report.to_dict()["counts"] == {
+        "a": {"value.enum": 2, "value.type": 2},
+        UNKNOWN_ATTRIBUTE: {"attribute": 2},
+    }
+    assert report.invalid_rows == 4
+    assert [s["row"] for s in report.samples] == [0, 1, 2]
+    assert report.samples[0]["violations"] == ["value.type", "value.enum"]
+
+
+@pytest.mark.medium
+def test_csv_types(tmp_path):
+    """Check CSV numbers are converted where the schema expects them, and only there."""
+    path = tmp_path / "long.csv"
+    path.write_text("value,value_num,duration\nNA,1.5,2\n1,abc,\n")
+    base = {
+        "properties": {
+            "value": {"type": ["string", "null"]},
+            "value_num": {"type": ["number", "null"]},
+            "duration": {"type": ["integer", "null"]},
+        }
+    }
+    (chunk,) = read_chunks(path, base_schema=base)
+    assert chunk["value"].to_list() == ["NA", "1"]
+    assert chunk["value_num"].to_list() == [1.5, "abc"]
+    assert chunk["duration"].iloc[0] == 2
+    assert pd.isna(chunk["duration"].iloc[1])
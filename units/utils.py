@@ -6,9 +6,16 @@ This is for one-way unit conversions based on the ARC unit_conversion JSON file.
 """
 
 from dataclasses import dataclass, field
+from functools import cache
+from importlib.resources import files
 from pathlib import Path
 from typing import Union, Optional, List, Dict, Self
 
+import hashlib
+import os
+import pickle
+import tempfile
+
 import pandas as pd
 import numpy as np
 import json
@@ -16,6 +23,9 @@ from jsonschema import Draft7Validator
 
 Numeric = Union[float, int]
 
+# Version of the pickled registry snapshots, bump if their contents change
+SNAPSHOT_FORMAT = 1
+
 
 class ValidationError(Exception):
     pass
@@ -291,6 +301,49 @@ class ConversionRegistry:
         }
         return self
 
+    def load_from_json_cached(
+        self,
+        path: Union[str, Path],
+        schema_path: Union[str, Path],
+        cache_dir: Optional[Union[str, Path]] = None,
+    ) -> Self:
+        """
+        As `load_from_json`, but reuses a pickled snapshot of the validated registry
+        from `cache_dir` (default: `registry_cache_dir()`) if one exists for the same
+        JSON and schema content and registry code, skipping schema validation. The
+        snapshot is written on the first load; if there is no cache directory, or
+        it isn't writable, the registry is loaded without it.
+        """
+        cache_dir = Path(cache_dir) if cache_dir else registry_cache_dir()
+        if cache_dir is None:
+            return self.load_from_json(path, schema_path)
+
+        # snapshots hold instances of the classes in this module
+        digest = hashlib.sha256(str(SNAPSHOT_FORMAT).encode())
+        digest.update(Path(__file__).read_bytes())
+        digest.update(Path(path).read_bytes())
+        digest.update(Path(schema_path).read_bytes())
+        snapshot = cache_dir / f"unit_registry_{digest.hexdigest()}.pickle"
+
+        try:
+            with snapshot.open("rb") as f:
+                self.conversion_entries = pickle.load(f)
+            return self
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+
+        self.load_from_json(path, schema_path)
+
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(self.conversion_entries, f)
+            os.replace(tmp, snapshot)
+        except OSError:
+            pass
+        return self
+
     def get_rule(
         self,
         field_name: str,
@@ -345,6 +398,30 @@ class ConversionRegistry:
         return unit.unit_value
 
 
+def registry_cache_dir() -> Optional[Path]:
+    """
+    Directory for cached registry snapshots: `$ARC_CACHE_DIR`, or None (no
+    snapshots) if it isn't set.
+    """
+    if cache_dir := os.environ.get("ARC_CACHE_DIR"):
+        return Path(cache_dir)
+    return None
+
+
+@cache
+def default_registry() -> ConversionRegistry:
+    """
+    Process-wide registry loaded from the `unit_conversion.json` file shipped with
+    this package. It is loaded on first use, independently of the working
+    directory. If `$ARC_CACHE_DIR` is set, a validated snapshot is kept there
+    (see `ConversionRegistry.load_from_json_cached`).
+    """
+    package = files("units")
+    return ConversionRegistry().load_from_json_cached(
+        package / "unit_conversion.json", package / "unit_conversion.schema.json"
+    )
+
+
 @dataclass
 class UnitConverter:
     """Uses the registry class to perform unit conversions."""